@@ -0,0 +1,62 @@
+"""
+Бенчмарки системы проверки.
+
+    python -m bench --sizes 100,1000,10000 --output bench-results.json
+    python -m bench --sizes 100,1000 --baseline bench-results.json --threshold 0.25
+
+С --baseline сравнивает прогон с эталоном и завершается с кодом 1,
+если какой-либо случай стал медленнее больше чем на threshold.
+"""
+
+import argparse
+import sys
+from bench.corpus import CorpusSpec
+from bench.runner import DEFAULT_THRESHOLD, compare, load_results, run, save_results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Бенчмарки проверки на плагиат')
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='размеры корпусов через запятую (до 100000)')
+    parser.add_argument('--only', default='', help='только эти случаи, через запятую')
+    parser.add_argument('--http-max-size', type=int, default=10000,
+                        help='наибольший корпус для случаев на БД сервера (индекс и HTTP)')
+    parser.add_argument('--repeat', type=int, default=5, help='число замеров')
+    parser.add_argument('--mean-length', type=int, default=CorpusSpec.mean_length)
+    parser.add_argument('--vocabulary', type=int, default=CorpusSpec.vocabulary)
+    parser.add_argument('--plagiarism-rate', type=float, default=CorpusSpec.plagiarism_rate)
+    parser.add_argument('--seed', type=int, default=CorpusSpec.seed)
+    parser.add_argument('--output', help='куда записать результаты (JSON)')
+    parser.add_argument('--baseline', help='эталон для сравнения (JSON)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='допустимое относительное замедление')
+    args = parser.parse_args(argv)
+
+    spec = CorpusSpec(
+        mean_length=args.mean_length,
+        vocabulary=args.vocabulary,
+        plagiarism_rate=args.plagiarism_rate,
+        seed=args.seed
+    )
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    only = [name for name in args.only.split(',') if name]
+
+    results = run(sizes, spec, only=only, http_max_size=args.http_max_size,
+                  repeat=args.repeat, log=print)
+    if args.output:
+        save_results(args.output, results, spec)
+        print(f'Результаты записаны в {args.output}')
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for item in regressions:
+            print(f"РЕГРЕССИЯ {item['name']} (size={item['size']}): "
+                  f"{item['baseline'] * 1000:.3f} -> {item['current'] * 1000:.3f} ms (x{item['ratio']})")
+        if regressions:
+            return 1
+        print('Регрессий нет')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Генератор синтетических корпусов для бенчмарков.
+Корпус полностью определяется параметрами CorpusSpec (включая seed):
+словарь из слогов, частоты слов по закону Ципфа, длины документов
+с логнормальным разбросом и вставки фрагментов из более ранних
+документов (заимствования).
+"""
+
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import List, Tuple
+from core.domain import Document
+
+_SYLLABLES = (
+    'ба', 'ва', 'га', 'да', 'жа', 'за', 'ка', 'ла', 'ма', 'на', 'па', 'ра', 'са', 'та',
+    'бо', 'во', 'го', 'до', 'ко', 'ло', 'мо', 'но', 'по', 'ро', 'со', 'то', 'хо', 'чо',
+    'би', 'ви', 'ди', 'ки', 'ли', 'ми', 'ни', 'пи', 'ри', 'си', 'ти', 'ше', 'те', 'не',
+    'ру', 'ку', 'му', 'ту', 'лу', 'ну', 'ер', 'ен', 'ов', 'ин', 'ал', 'ос', 'ук', 'ый'
+)
+
+# Время создания первого документа корпуса (остальные - через минуту)
+_EPOCH = datetime(2024, 1, 1)
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """Параметры синтетического корпуса"""
+    documents: int = 1000
+    mean_length: int = 300          # средняя длина документа в словах
+    length_spread: float = 0.5      # сигма логнормального распределения длин
+    vocabulary: int = 20000
+    zipf_exponent: float = 1.1
+    plagiarism_rate: float = 0.2    # доля документов со вставленным фрагментом
+    passage_length: int = 40        # длина вставки в словах
+    seed: int = 42
+
+
+def make_vocabulary(size: int, rng: random.Random) -> Tuple[str, ...]:
+    """Уникальные слова из 2-4 слогов"""
+    words = {}
+    while len(words) < size:
+        word = ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        words[word] = None
+    return tuple(words)
+
+
+def _document_length(spec: CorpusSpec, rng: random.Random) -> int:
+    mu = math.log(spec.mean_length) - spec.length_spread ** 2 / 2
+    return max(spec.passage_length, int(rng.lognormvariate(mu, spec.length_spread)))
+
+
+class _WordSource:
+    """Слова словаря с частотами по закону Ципфа (словарь зависит только от seed)"""
+
+    def __init__(self, spec: CorpusSpec, rng: random.Random):
+        self.rng = rng
+        self.words = make_vocabulary(spec.vocabulary, random.Random(spec.seed))
+        self.cumulative = tuple(accumulate(1 / rank ** spec.zipf_exponent
+                                           for rank in range(1, spec.vocabulary + 1)))
+
+    def take(self, count: int) -> List[str]:
+        return self.rng.choices(self.words, cum_weights=self.cumulative, k=count)
+
+
+def _sentences(words: List[str], rng: random.Random) -> str:
+    """Слова в предложения с заглавной буквой и точкой"""
+    parts, start = [], 0
+    while start < len(words):
+        end = start + rng.randint(6, 18)
+        sentence = ' '.join(words[start:end])
+        parts.append(sentence[:1].upper() + sentence[1:] + '.')
+        start = end
+    return ' '.join(parts)
+
+
+def _borrow(texts: List[List[str]], length: int, rng: random.Random) -> List[str]:
+    source = rng.choice(texts)
+    start = rng.randint(0, max(0, len(source) - length))
+    return source[start:start + length]
+
+
+def generate_corpus(spec: CorpusSpec) -> Tuple[Document, ...]:
+    """
+    Детерминированный корпус документов.
+
+    Example:
+        corpus = generate_corpus(CorpusSpec(documents=100, seed=1))
+        corpus == generate_corpus(CorpusSpec(documents=100, seed=1))  # True
+    """
+    rng = random.Random(spec.seed)
+    source = _WordSource(spec, rng)
+    texts: List[List[str]] = []
+    documents = []
+
+    for i in range(spec.documents):
+        words = source.take(_document_length(spec, rng))
+        if texts and rng.random() < spec.plagiarism_rate:
+            position = rng.randint(0, len(words))
+            words[position:position] = _borrow(texts, spec.passage_length, rng)
+        texts.append(words)
+        documents.append(Document(
+            id=str(i + 1),
+            title=' '.join(source.take(3)).capitalize(),
+            author=f'Автор {rng.randint(1, max(1, spec.documents // 10))}',
+            text=_sentences(words, rng),
+            ts=(_EPOCH + timedelta(minutes=i)).isoformat()
+        ))
+
+    return tuple(documents)
+
+
+def generate_submissions(
+    corpus: Tuple[Document, ...],
+    spec: CorpusSpec,
+    count: int = 10,
+    borrowed_share: float = 0.3
+) -> Tuple[str, ...]:
+    """
+    Проверяемые тексты: свежие слова плюс фрагменты документов корпуса
+    (borrowed_share - доля заимствованных слов).
+    """
+    rng = random.Random(spec.seed + 1)
+    source = _WordSource(spec, rng)
+    texts = [doc.text.split() for doc in corpus]
+    submissions = []
+
+    for _ in range(count):
+        length = _document_length(spec, rng)
+        borrowed = int(length * borrowed_share)
+        words = source.take(length - borrowed)
+        while borrowed > 0 and texts:
+            passage = _borrow(texts, min(spec.passage_length, borrowed), rng)
+            position = rng.randint(0, len(words))
+            words[position:position] = passage
+            borrowed -= len(passage) or borrowed
+        submissions.append(' '.join(words))
+
+    return tuple(submissions)
@@ -0,0 +1,282 @@
+"""
+Запуск бенчмарков и сравнение с сохранённым эталоном.
+Каждый случай - функция без аргументов; число вызовов в одном замере
+подбирается так, чтобы замер длился не меньше min_time, результат -
+медиана и лучшее время одного вызова по repeat замерам.
+"""
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from core.domain import Document, Submission
+from core.lazy import progressive_check, search_documents
+from core.memo import check_submission_cached, clear_cache
+from core.transforms import jaccard, ngrams, normalize, tokenize
+from bench.corpus import CorpusSpec, generate_corpus, generate_submissions
+
+# Относительное замедление, которое считается регрессией
+DEFAULT_THRESHOLD = 0.2
+
+Cases = Dict[str, Callable[[], object]]
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    """Время одного вызова случая на корпусе размера size"""
+    name: str
+    size: int
+    calls: int
+    median: float
+    best: float
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.name, self.size
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.05,
+            max_time: float = 30.0) -> Tuple[int, float, float]:
+    """
+    Замерить функцию: (вызовов в замере, медиана, лучшее) в секундах
+    на вызов. Медленные случаи (дольше max_time) замеряются один раз.
+    """
+    started = time.perf_counter()
+    fn()
+    first = time.perf_counter() - started
+    if first >= max_time:
+        return 1, first, first
+
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    repeat = max(1, min(repeat, int(max_time / max(first * number, 1e-9))))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - started) / number)
+    timings.sort()
+    return number, timings[len(timings) // 2], timings[0]
+
+
+def _consume(iterator: Iterable) -> None:
+    deque(iterator, maxlen=0)
+
+
+def text_cases(submissions: Tuple[str, ...], n: int = 3) -> Cases:
+    """Функции обработки одного текста (не зависят от размера корпуса)"""
+    text, other = submissions[0], submissions[-1]
+    normalized = normalize(text)
+    tokens = tokenize(normalized)
+    grams = frozenset(ngrams(tokens, n))
+    other_grams = frozenset(ngrams(tokenize(normalize(other)), n))
+    return {
+        'normalize': lambda: normalize(text),
+        'tokenize': lambda: tokenize(normalized),
+        'ngrams': lambda: ngrams(tokens, n),
+        'jaccard': lambda: jaccard(grams, other_grams),
+    }
+
+
+def corpus_cases(corpus: Tuple[Document, ...], submissions: Tuple[str, ...], n: int = 3) -> Cases:
+    """Проверка и поиск по всему корпусу"""
+    submission = Submission(id='bench', user_id='bench', text=submissions[0], ts='')
+    query = ' '.join(submissions[0].split()[:2])
+
+    def cold_check():
+        clear_cache()
+        return check_submission_cached(submission, corpus, n)
+
+    return {
+        'check_submission_cached': lambda: check_submission_cached(submission, corpus, n),
+        'check_submission_cached_cold': cold_check,
+        'progressive_check': lambda: _consume(progressive_check(submission.text, corpus, n)),
+        'search_documents': lambda: _consume(search_documents(corpus, query)),
+    }
+
+
+@contextmanager
+def server_database(corpus: Tuple[Document, ...]) -> Iterator[object]:
+    """
+    Временная БД сервера с корпусом (возвращает модуль server).
+    Документы вставляются напрямую в SQL и индексируются, как при
+    загрузке, до замеров. Журнал событий отключён.
+    """
+    import server
+    from core.index import index_document
+    from core.search import init_search_schema
+
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    previous_db = server.DB_FILE
+    server.DB_FILE = os.path.join(workdir, 'bench.db')
+    server.app.config['TESTING'] = True
+    server.app.config['EVENT_LOG_ENABLED'] = False
+    server.init_db()
+
+    conn = server.get_db()
+    user_id = conn.execute("SELECT id FROM users WHERE username = 'user'").fetchone()[0]
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM documents').fetchone()[0]
+    conn.executemany(
+        'INSERT INTO documents (user_id, title, text, created_at, preview, length) VALUES (?, ?, ?, ?, ?, ?)',
+        ((user_id, doc.title, doc.text, doc.ts, server.document_preview(doc.text), len(doc.text))
+         for doc in corpus)
+    )
+    rows = conn.execute('SELECT id, text FROM documents WHERE id > ?', (last_id,)).fetchall()
+    for doc_id, text in rows:
+        index_document(conn, doc_id, text)
+    conn.commit()
+    init_search_schema(conn)
+    conn.close()
+
+    try:
+        yield server
+    finally:
+        # Пул создаётся на путь БД, поэтому для следующего корпуса - новый
+        server.event_bus.flush()
+        server.get_db_pool().close_all()
+        server._db_pool = None
+        server.DB_FILE = previous_db
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def index_cases(server, submissions: Tuple[str, ...], n: int = 3) -> Cases:
+    """
+    Проверка, как на сервере: кандидаты из индекса SQLite (load_candidates)
+    и оценка check_submission_cached по их отпечаткам; с порогом -
+    префиксная фильтрация.
+    """
+    submission = Submission(id='bench', user_id='bench', text=submissions[0], ts='')
+
+    def indexed_check(threshold: float = 0.0):
+        conn = server.get_db()
+        try:
+            documents, scoring, _, _ = server.load_candidates(
+                conn, n, submission.text, threshold=threshold
+            )
+        finally:
+            conn.close()
+        return check_submission_cached(submission, documents, n, **scoring)
+
+    return {
+        'indexed_check': indexed_check,
+        'indexed_check_threshold': lambda: indexed_check(0.5),
+    }
+
+
+def http_cases(server, submissions: Tuple[str, ...], n: int = 3) -> Cases:
+    """Эндпоинты через тестовый клиент Flask"""
+    client = server.app.test_client()
+    client.post('/api/login', json={'username': 'user', 'password': 'user123'})
+    query = submissions[0].split()[0]
+
+    def check_stream():
+        response = client.post('/api/plagiarism/check', json={'text': submissions[0], 'n': n},
+                               buffered=False)
+        _consume(response.iter_encoded())
+        response.close()
+
+    return {
+        'http_check_stream': check_stream,
+        'http_documents_page': lambda: client.get('/api/documents?page_size=20').get_data(),
+        'http_search': lambda: client.get(f'/api/search/documents?q={query}').get_data(),
+    }
+
+
+def run(
+    sizes: Iterable[int],
+    spec: CorpusSpec = CorpusSpec(),
+    only: Optional[Iterable[str]] = None,
+    http_max_size: int = 10000,
+    repeat: int = 5,
+    log: Callable[[str], None] = lambda line: None
+) -> List[BenchResult]:
+    """
+    Прогнать бенчмарки на корпусах заданных размеров.
+    Обработка одного текста замеряется один раз (на первом размере),
+    случаи на БД сервера (индекс и HTTP-эндпоинты) - на корпусах
+    не больше http_max_size.
+    """
+    selected = set(only) if only else None
+    results = []
+
+    def bench(cases: Cases, size: int) -> None:
+        for name, fn in cases.items():
+            if selected is not None and name not in selected:
+                continue
+            calls, median, best = measure(fn, repeat)
+            result = BenchResult(name, size, calls, median, best)
+            results.append(result)
+            log(f'{name:32} {size:>8} {median * 1000:12.3f} ms')
+
+    for index, size in enumerate(sizes):
+        size_spec = replace(spec, documents=size)
+        corpus = generate_corpus(size_spec)
+        submissions = generate_submissions(corpus, size_spec)
+        if index == 0:
+            bench(text_cases(submissions), 0)
+        bench(corpus_cases(corpus, submissions), size)
+        wants_index = selected is None or any(name.startswith('indexed_') for name in selected)
+        wants_http = selected is None or any(name.startswith('http_') for name in selected)
+        if size <= http_max_size and (wants_index or wants_http):
+            with server_database(corpus) as server:
+                if wants_index:
+                    bench(index_cases(server, submissions), size)
+                if wants_http:
+                    bench(http_cases(server, submissions), size)
+
+    return results
+
+
+def save_results(path: str, results: List[BenchResult], spec: CorpusSpec) -> None:
+    """Записать результаты в JSON (эталон для следующих прогонов)"""
+    data = {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'spec': asdict(spec),
+        'results': [asdict(result) for result in results],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> List[BenchResult]:
+    """Прочитать результаты из JSON"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return [BenchResult(**result) for result in data['results']]
+
+
+def compare(
+    current: List[BenchResult],
+    baseline: List[BenchResult],
+    threshold: float = DEFAULT_THRESHOLD
+) -> List[Dict]:
+    """
+    Сравнить прогон с эталоном по медианам.
+    Возвращает регрессии: случаи, ставшие медленнее более чем на threshold.
+    """
+    previous = {result.key: result for result in baseline}
+    regressions = []
+    for result in current:
+        before = previous.get(result.key)
+        if before is None or before.median <= 0:
+            continue
+        ratio = result.median / before.median
+        if ratio > 1 + threshold:
+            regressions.append({
+                'name': result.name,
+                'size': result.size,
+                'baseline': before.median,
+                'current': result.median,
+                'ratio': round(ratio, 3)
+            })
+    return regressions
@@ -0,0 +1,244 @@
+"""
+Кластеры почти-дубликатов по всему корпусу.
+Пары документов со схожестью не ниже порога находятся самосоединением
+через индекс n-грамм (префиксная фильтрация, core.index.query_prefix)
+и объединяются в кластеры (система непересекающихся множеств).
+
+В таблице clusters хранятся только документы из кластеров размером
+от двух; id кластера - наименьший id документа в нём. Каждый документ
+сравнивается только с более ранними, поэтому новый документ
+присоединяется к кластерам одним запросом, без пересборки:
+результат совпадает с полной сборкой.
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from core.db import SQL_CHUNK
+from core.index import ensure_fingerprints, load_fingerprints, query_prefix
+from core.lazy import batch_process
+from core.transforms import Hashes, jaccard_hashes
+
+
+def init_cluster_schema(conn: sqlite3.Connection) -> None:
+    """Создать таблицы кластеров"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clusters (
+            doc_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER NOT NULL,
+            FOREIGN KEY (doc_id) REFERENCES documents(id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_clusters_cluster ON clusters(cluster_id)')
+    # Параметры последней сборки: по ним присоединяются новые документы
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cluster_settings (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            n INTEGER NOT NULL,
+            threshold REAL NOT NULL,
+            built_at TEXT NOT NULL
+        )
+    ''')
+
+
+class UnionFind:
+    """
+    Система непересекающихся множеств (объединение по размеру,
+    сжатие путей).
+
+    Example:
+        uf = UnionFind()
+        uf.union(1, 2); uf.union(3, 2)
+        uf.groups()  # {1: [1, 2, 3]}
+    """
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+        self.size: Dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        parent = self.parent.setdefault(item, item)
+        if parent == item:
+            self.size.setdefault(item, 1)
+            return item
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int) -> int:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a
+
+    def groups(self) -> Dict[int, List[int]]:
+        """Множества из двух и более элементов: {наименьший элемент: элементы}"""
+        members: Dict[int, List[int]] = {}
+        for item in self.parent:
+            members.setdefault(self.find(item), []).append(item)
+        return {
+            min(items): sorted(items)
+            for items in members.values() if len(items) > 1
+        }
+
+
+def similar_earlier_documents(
+    conn: sqlite3.Connection,
+    n: int,
+    doc_id: int,
+    hashes: Hashes,
+    threshold: float
+) -> Tuple[int, ...]:
+    """Более ранние документы со схожестью не ниже threshold (точная проверка)"""
+    probe = frozenset(hashes)
+    candidates = query_prefix(conn, n, hashes, threshold, exclude_doc_id=doc_id)
+    return tuple(sorted(
+        int(other) for other, fp in candidates.items()
+        if int(other) < doc_id and jaccard_hashes(probe, fp.hashes) >= threshold
+    ))
+
+
+def get_cluster_settings(conn: sqlite3.Connection) -> Optional[Tuple[int, float]]:
+    """(n, threshold) последней сборки или None, если кластеры не строились"""
+    row = conn.execute('SELECT n, threshold FROM cluster_settings WHERE id = 1').fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def build_clusters(
+    conn: sqlite3.Connection,
+    n: int,
+    threshold: float,
+    report: Callable[[float, str], None] = lambda progress, stage: None
+) -> Dict[str, int]:
+    """
+    Полная сборка кластеров (фоновая задача): каждый документ сравнивается
+    с более ранними через индекс, пары объединяются в кластеры, таблица
+    перезаписывается одной транзакцией. Документы, загруженные во время
+    сборки, присоединяются после неё.
+    """
+    ensure_fingerprints(conn, n)
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM documents').fetchone()[0]
+    doc_ids = tuple(row[0] for row in conn.execute(
+        'SELECT doc_id FROM fingerprints WHERE n = ? AND doc_id <= ? ORDER BY doc_id',
+        (n, last_id)
+    ))
+
+    uf = UnionFind()
+    pairs = 0
+    for index, doc_id in enumerate(doc_ids):
+        fp = load_fingerprints(conn, n, doc_ids=(doc_id,))[str(doc_id)]
+        for other in similar_earlier_documents(conn, n, doc_id, fp.hashes, threshold):
+            uf.union(other, doc_id)
+            pairs += 1
+        if index % 100 == 0:
+            report(index / max(len(doc_ids), 1) * 0.9, 'pairs')
+
+    report(0.9, 'saving')
+    groups = uf.groups()
+    conn.execute('DELETE FROM clusters')
+    conn.executemany(
+        'INSERT INTO clusters (doc_id, cluster_id) VALUES (?, ?)',
+        ((doc_id, cluster_id) for cluster_id, members in groups.items() for doc_id in members)
+    )
+    conn.execute('''
+        INSERT OR REPLACE INTO cluster_settings (id, n, threshold, built_at)
+        VALUES (1, ?, ?, ?)
+    ''', (n, threshold, datetime.utcnow().isoformat() + 'Z'))
+
+    late = tuple(row[0] for row in conn.execute(
+        'SELECT id FROM documents WHERE id > ? ORDER BY id', (last_id,)
+    ))
+    for doc_id in late:
+        assign_document(conn, doc_id)
+    conn.commit()
+
+    return {
+        'documents': len(doc_ids) + len(late),
+        'pairs': pairs,
+        'clusters': len(groups),
+        'clustered_documents': sum(len(members) for members in groups.values()),
+    }
+
+
+def assign_document(conn: sqlite3.Connection, doc_id: int) -> Optional[int]:
+    """
+    Присоединить новый документ к кластерам (без commit). Кластеры всех
+    похожих более ранних документов сливаются в один. Возвращает id
+    кластера документа или None (кластеры не строились или пары нет).
+    """
+    settings = get_cluster_settings(conn)
+    if settings is None:
+        return None
+    n, threshold = settings
+
+    fp = load_fingerprints(conn, n, doc_ids=(doc_id,)).get(str(doc_id))
+    if fp is None:
+        return None
+    similar = similar_earlier_documents(conn, n, int(doc_id), fp.hashes, threshold)
+    if not similar:
+        return None
+
+    current: Dict[int, int] = {}
+    for chunk in batch_process(similar, SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        current.update(conn.execute(
+            f'SELECT doc_id, cluster_id FROM clusters WHERE doc_id IN ({placeholders})', chunk
+        ))
+    # Документ без кластера - кластер из одного себя (id кластера = id документа)
+    merged = {current.get(other, other) for other in similar}
+    cluster_id = min(merged)
+    for chunk in batch_process(tuple(sorted(merged - {cluster_id})), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        conn.execute(
+            f'UPDATE clusters SET cluster_id = ? WHERE cluster_id IN ({placeholders})',
+            (cluster_id, *chunk)
+        )
+    conn.executemany(
+        'INSERT OR REPLACE INTO clusters (doc_id, cluster_id) VALUES (?, ?)',
+        ((member, cluster_id) for member in (*similar, int(doc_id)) if member not in current)
+    )
+    return cluster_id
+
+
+def load_clusters(
+    conn: sqlite3.Connection,
+    min_size: int = 2,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> Tuple[Tuple[int, Tuple[int, ...]], ...]:
+    """Кластеры по убыванию размера: ((id кластера, id документов), ...)"""
+    sizes = conn.execute('''
+        SELECT cluster_id, COUNT(*) AS size FROM clusters
+        GROUP BY cluster_id HAVING size >= ?
+        ORDER BY size DESC, cluster_id
+        LIMIT ? OFFSET ?
+    ''', (min_size, -1 if limit is None else limit, offset)).fetchall()
+    if not sizes:
+        return tuple()
+
+    members: Dict[int, List[int]] = {}
+    cluster_ids = tuple(row[0] for row in sizes)
+    for chunk in batch_process(cluster_ids, SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        for doc_id, cluster_id in conn.execute(
+            f'SELECT doc_id, cluster_id FROM clusters WHERE cluster_id IN ({placeholders}) ORDER BY doc_id',
+            chunk
+        ):
+            members.setdefault(cluster_id, []).append(doc_id)
+    return tuple((cluster_id, tuple(members[cluster_id])) for cluster_id in cluster_ids)
+
+
+def count_clusters(conn: sqlite3.Connection, min_size: int = 2) -> int:
+    """Число кластеров не меньше min_size"""
+    return conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT cluster_id FROM clusters GROUP BY cluster_id HAVING COUNT(*) >= ?
+        )
+    ''', (min_size,)).fetchone()[0]
@@ -0,0 +1,200 @@
+"""
+Пул соединений SQLite.
+Соединения открываются один раз, настраиваются (WAL, synchronous,
+mmap, кэш страниц, кэш подготовленных выражений) и переиспользуются
+между запросами: close() возвращает соединение в пул, а не закрывает его.
+
+Ошибки "database is locked", пережившие busy_timeout, повторяются
+с экспоненциальной задержкой; число повторов и время ожидания
+попадают в статистику пула.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+# Ограничение на число параметров в одном SQL-запросе (IN (...) по частям)
+SQL_CHUNK = 500
+
+# Настройки соединения по умолчанию
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    'synchronous': 'NORMAL',       # в режиме WAL безопасно и без fsync на каждый commit
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,      # отрицательное значение - в КиБ
+    'temp_store': 'MEMORY',
+}
+
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+class PooledCursor(sqlite3.Cursor):
+    """Курсор с повтором выражений при блокировке БД"""
+
+    def execute(self, sql, parameters=()):
+        return self.connection._retry(lambda: super(PooledCursor, self).execute(sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.connection._retry(
+            lambda: super(PooledCursor, self).executemany(sql, seq_of_parameters)
+        )
+
+
+class PooledConnection(sqlite3.Connection):
+    """Соединение пула: close() возвращает его в пул"""
+
+    _pool: Optional['ConnectionPool'] = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or PooledCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return self._retry(super().commit)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def _retry(self, action: Callable[[], Any]) -> Any:
+        if self._pool is None:
+            return action()
+        return self._pool.retry_locked(action)
+
+
+class ConnectionPool:
+    """
+    Пул соединений к одной БД.
+
+    Example:
+        pool = ConnectionPool('plagiarism.db', max_idle=8)
+        conn = pool.connect()
+        ...
+        conn.close()  # соединение вернулось в пул
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_idle: int = 8,
+        busy_timeout_ms: int = 5000,
+        cached_statements: int = 256,
+        pragmas: Optional[Dict[str, Any]] = None,
+        lock_retries: int = 3,
+        retry_delay: float = 0.05
+    ):
+        self.path = path
+        self.max_idle = max_idle
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.lock_retries = lock_retries
+        self.retry_delay = retry_delay
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'lock_retries': 0,
+            'lock_errors': 0,
+            'lock_wait_seconds': 0.0,
+        }
+
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            factory=PooledConnection,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode = WAL')
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn._pool = self
+        return conn
+
+    def connect(self) -> PooledConnection:
+        """Взять соединение из пула (или открыть новое)"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats['reused' if conn is not None else 'opened'] += 1
+            self._stats['in_use'] += 1
+
+        if conn is None:
+            conn = self._open()
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        """Вернуть соединение: незавершённая транзакция откатывается"""
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            keep = len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append(conn)
+                self._stats['released'] += 1
+            else:
+                self._stats['discarded'] += 1
+
+        if not keep:
+            conn._pool = None
+            conn.close()
+
+    def retry_locked(self, action: Callable[[], Any]) -> Any:
+        """Выполнить действие, повторяя его при блокировке БД"""
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return action()
+            except sqlite3.OperationalError as error:
+                if not _is_locked(error):
+                    raise
+                if attempt == self.lock_retries:
+                    with self._lock:
+                        self._stats['lock_errors'] += 1
+                    raise
+                delay = self.retry_delay * (2 ** attempt)
+                with self._lock:
+                    self._stats['lock_retries'] += 1
+                    self._stats['lock_wait_seconds'] += delay
+                time.sleep(delay)
+
+    def close_all(self) -> None:
+        """Закрыть все простаивающие соединения"""
+        with self._lock:
+            idle = tuple(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            conn._pool = None
+            conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика пула"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        requests = stats['opened'] + stats['reused']
+        stats['reuse_rate'] = stats['reused'] / requests if requests > 0 else 0.0
+        stats['lock_wait_seconds'] = round(stats['lock_wait_seconds'], 3)
+        stats['max_idle'] = self.max_idle
+        stats['pragmas'] = dict(self.pragmas, busy_timeout=self.busy_timeout_ms,
+                                cached_statements=self.cached_statements)
+        return stats
@@ -3,7 +3,7 @@
 Все классы используют @dataclass(frozen=True) для иммутабельности.
 """
 from dataclasses import dataclass
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Sequence, Tuple
 
 
 @dataclass(frozen=True)
@@ -47,7 +47,45 @@ class Ngram:
     id: str
     doc_id: str
     values: Tuple[str, ...]
-    hash: int  # хэш для быстрого сравнения
+    hash: int  # hash_ngram(values) - элемент массивов хэшей n-грамм (core.transforms)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Отпечаток документа: множество хэшей n-грамм для заданного n"""
+    doc_id: str
+    n: int
+    token_count: int
+    ngram_count: int  # всего n-грамм, включая повторы
+    unique_count: int  # размер множества n-грамм
+    hashes: Sequence[int]  # отсортированный array('Q'); пуст, если загружены только размеры
+
+
+@dataclass(frozen=True)
+class MinHashParams:
+    """Параметры MinHash/LSH: длина сигнатуры и разбиение на полосы"""
+    num_perm: int = 128
+    bands: int = 32
+    rows: int = 4  # bands * rows <= num_perm
+    seed: int = 1
+
+    def __post_init__(self):
+        if min(self.num_perm, self.bands, self.rows) < 1:
+            raise ValueError("num_perm, bands и rows должны быть положительными")
+        if self.bands * self.rows > self.num_perm:
+            raise ValueError("bands * rows больше длины сигнатуры (num_perm)")
+
+    @property
+    def key(self) -> str:
+        """Ключ конфигурации для хранения сигнатур и корзин в БД"""
+        return f"{self.num_perm}:{self.bands}x{self.rows}:{self.seed}"
+
+    @staticmethod
+    def from_key(key: str) -> 'MinHashParams':
+        """Восстановить параметры из ключа конфигурации"""
+        num_perm, shape, seed = key.split(':')
+        bands, rows = shape.split('x')
+        return MinHashParams(int(num_perm), int(bands), int(rows), int(seed))
 
 
 @dataclass(frozen=True)
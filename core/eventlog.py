@@ -0,0 +1,191 @@
+"""
+Журнал событий в SQLite (только добавление).
+publish не ждёт записи: события копятся в памяти, фоновый поток
+пишет их пачками одной транзакцией (group commit). Старые записи
+удаляются по числу и возрасту. При старте последние события
+читаются из журнала и проигрываются в витрины мониторинга.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from core.events import Event
+
+
+class EventLog:
+    """
+    Журнал событий с фоновой пакетной записью.
+
+    Example:
+        log = EventLog('plagiarism.db')
+        event_bus.replay(log.read_recent(1000))
+        event_bus.subscribe('ALERT', log.append)
+        ...
+        log.close()
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_events: int = 100000,
+        max_age_days: Optional[int] = 30,
+        max_pending: int = 10000,
+        retention_interval: float = 60.0
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.max_age_days = max_age_days
+        self.retention_interval = retention_interval
+
+        self._pending: deque = deque(maxlen=max_pending)
+        self._changed = threading.Condition()
+        self._closed = False
+        self._processed = 0
+        self._last_retention = 0.0
+        self._stats = {
+            'appended': 0,
+            'written': 0,
+            'batches': 0,
+            'dropped': 0,
+            'errors': 0,
+            'last_batch_ms': 0.0,
+        }
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS event_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_event_log_ts ON event_log(ts)')
+        self._conn.commit()
+
+        self._thread = threading.Thread(target=self._flusher, name='event-log', daemon=True)
+        self._thread.start()
+
+    def append(self, event: Event) -> None:
+        """Поставить событие в очередь на запись (обработчик шины)"""
+        with self._changed:
+            if len(self._pending) == self._pending.maxlen:
+                self._stats['dropped'] += 1
+            self._pending.append(event)
+            self._stats['appended'] += 1
+            # Будим поток на первом событии (начало окна группировки)
+            # и при наборе полной пачки
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._changed.notify_all()
+
+    def _flusher(self) -> None:
+        while True:
+            with self._changed:
+                # Простой без событий ничего не стоит: ждём первое событие,
+                # затем до flush_interval копим пачку
+                while not self._pending and not self._closed:
+                    self._changed.wait(self.retention_interval)
+                    if time.monotonic() - self._last_retention >= self.retention_interval:
+                        break
+                if self._pending and len(self._pending) < self.batch_size and not self._closed:
+                    self._changed.wait(self.flush_interval)
+                batch = tuple(self._pending)
+                self._pending.clear()
+                closed = self._closed
+
+            if batch:
+                self._write(batch)
+                with self._changed:
+                    self._processed += len(batch)
+                    self._changed.notify_all()
+            if time.monotonic() - self._last_retention >= self.retention_interval:
+                self._apply_retention()
+            if closed:
+                return
+
+    def _write(self, batch: Tuple[Event, ...]) -> None:
+        started = time.perf_counter()
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO event_log (name, ts, payload) VALUES (?, ?, ?)',
+                    ((e.name, e.ts, json.dumps(e.payload, ensure_ascii=False, default=str))
+                     for e in batch)
+                )
+        except sqlite3.Error as e:
+            with self._changed:
+                self._stats['errors'] += 1
+            print(f"Error writing event log: {e}")
+            return
+
+        with self._changed:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _apply_retention(self) -> None:
+        """Удалить записи сверх max_events и старше max_age_days"""
+        self._last_retention = time.monotonic()
+        try:
+            with self._conn:
+                self._conn.execute(
+                    'DELETE FROM event_log WHERE id <= (SELECT MAX(id) FROM event_log) - ?',
+                    (self.max_events,)
+                )
+                if self.max_age_days is not None:
+                    cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+                    self._conn.execute('DELETE FROM event_log WHERE ts < ?',
+                                       (cutoff.isoformat() + 'Z',))
+        except sqlite3.Error as e:
+            print(f"Error applying event log retention: {e}")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться записи всего, что уже поставлено в очередь"""
+        with self._changed:
+            target = self._stats['appended'] - self._stats['dropped']
+            self._changed.notify_all()
+            return self._changed.wait_for(
+                lambda: self._processed >= target or not self._thread.is_alive(),
+                timeout
+            )
+
+    def read_recent(self, limit: int = 1000) -> Tuple[Event, ...]:
+        """Последние limit событий журнала в порядке записи"""
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute(
+                'SELECT name, ts, payload FROM event_log ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return tuple(
+            Event(name=name, ts=ts, payload=json.loads(payload))
+            for name, ts, payload in reversed(rows)
+        )
+
+    def close(self) -> None:
+        """Записать оставшиеся события и остановить поток"""
+        with self._changed:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join(timeout=10)
+        self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счётчики журнала"""
+        with self._changed:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
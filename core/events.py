@@ -1,11 +1,26 @@
 """
 Система событий для реального времени.
 Работает только с реальными событиями.
+
+По умолчанию обработчики вызываются синхронно в потоке publish.
+В асинхронном режиме (start_async) publish только кладёт событие
+в ограниченную очередь, а обработчики вызывают рабочие потоки шины.
 """
 
-from typing import Callable, Dict, List, Any
+import queue
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, List, Any, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
+from core.metrics import EVENT_HANDLER_SECONDS
+
+# Политики переполнения очереди асинхронной шины
+BACKPRESSURE_BLOCK = 'block'              # publish ждёт свободного места
+BACKPRESSURE_DROP_OLDEST = 'drop_oldest'  # вытесняется самое старое событие
+BACKPRESSURE_DROP_NEW = 'drop_new'        # новое событие отбрасывается
+BACKPRESSURE_POLICIES = (BACKPRESSURE_BLOCK, BACKPRESSURE_DROP_OLDEST, BACKPRESSURE_DROP_NEW)
 
 
 @dataclass(frozen=True)
@@ -16,46 +31,116 @@ class Event:
     payload: Dict[str, Any]
 
 
+# Порог витрины подозрительных совпадений, поддерживаемой инкрементально
+SUSPICIOUS_THRESHOLD = 0.7
+SUSPICIOUS_LIMIT = 20
+
+
 @dataclass
 class MonitoringData:
-    """Данные для мониторинга"""
-    submissions: List[Dict] = field(default_factory=list)
-    check_results: List[Dict] = field(default_factory=list)
-    alerts: List[Dict] = field(default_factory=list)
+    """
+    Данные для мониторинга.
+    Списки - кольцевые буферы (новые записи слева, старые вытесняются).
+    Витрина подозрительных совпадений (порог SUSPICIOUS_THRESHOLD)
+    обновляется при каждой записи: по одному элементу на doc_id,
+    результат проверки важнее алерта, более новый - важнее старого.
+    """
+    submissions: Deque[Dict] = None
+    check_results: Deque[Dict] = None
+    alerts: Deque[Dict] = None
     max_entries: int = 100
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    suspicious: 'OrderedDict[str, Dict]' = field(default_factory=OrderedDict, repr=False)
+    
+    def __post_init__(self):
+        self.submissions = deque(self.submissions or (), maxlen=self.max_entries)
+        self.check_results = deque(self.check_results or (), maxlen=self.max_entries)
+        self.alerts = deque(self.alerts or (), maxlen=self.max_entries)
     
     def add_submission(self, data: Dict):
-        self.submissions.insert(0, data)
-        if len(self.submissions) > self.max_entries:
-            self.submissions = self.submissions[:self.max_entries]
+        with self.lock:
+            self.submissions.appendleft(data)
     
     def add_check_result(self, data: Dict):
-        self.check_results.insert(0, data)
-        if len(self.check_results) > self.max_entries:
-            self.check_results = self.check_results[:self.max_entries]
+        with self.lock:
+            self.check_results.appendleft(data)
+            if data.get('similarity', 0) >= SUSPICIOUS_THRESHOLD:
+                self._mark_suspicious(data)
     
     def add_alert(self, data: Dict):
-        self.alerts.insert(0, data)
-        if len(self.alerts) > self.max_entries:
-            self.alerts = self.alerts[:self.max_entries]
+        with self.lock:
+            self.alerts.appendleft(data)
+            current = self.suspicious.get(data.get('doc_id'))
+            if current is None or current.get('type') == 'alert':
+                self._mark_suspicious(data)
+    
+    def _mark_suspicious(self, data: Dict) -> None:
+        doc_id = data.get('doc_id')
+        self.suspicious.pop(doc_id, None)
+        self.suspicious[doc_id] = data
+        if len(self.suspicious) > self.max_entries:
+            self.suspicious.popitem(last=False)
+    
+    def recent(self, entries: Deque[Dict], limit: int) -> List[Dict]:
+        """Первые limit записей буфера (новые первыми)"""
+        with self.lock:
+            return list(islice(entries, limit))
+    
+    def top_suspicious(self, limit: int = SUSPICIOUS_LIMIT) -> List[Dict]:
+        """Последние limit подозрительных документов (новые первыми)"""
+        with self.lock:
+            return list(islice(reversed(self.suspicious.values()), limit))
 
 
 class EventBus:
     """
     Шина событий для реактивного программирования.
+    Публикация потокобезопасна; в асинхронном режиме publish не ждёт
+    обработчиков (кроме политики block при заполненной очереди).
     """
     
     def __init__(self):
         self._subscribers: Dict[str, List[Callable[[Event], None]]] = {}
-        self._event_history: List[Event] = []
+        self._lock = threading.Lock()
         self.monitoring_data = MonitoringData()
-        self._max_history = 200
+        # История - кольцевой буфер; по имени события - индекс из пар
+        # (номер, событие), устаревшие номера отсекаются при чтении
+        self._history_size = 200
+        self._event_history: Deque[Event] = deque(maxlen=self._history_size)
+        self._history_by_name: Dict[str, Deque[Tuple[int, Event]]] = {}
+        self._history_seq = 0
+        
+        # Асинхронный режим. Очередь меняется под _lock; _enqueuing -
+        # публикации, взявшие очередь и ещё не положившие в неё событие
+        self._queue = None
+        self._workers: List[threading.Thread] = []
+        self._enqueuing = 0
+        self._enqueued = threading.Condition(self._lock)
+        self._backpressure = BACKPRESSURE_BLOCK
+        self._stats = {'published': 0, 'dispatched': 0, 'dropped': 0, 'handler_errors': 0}
+    
+    @property
+    def _max_history(self) -> int:
+        return self._history_size
+    
+    @_max_history.setter
+    def _max_history(self, size: int) -> None:
+        with self._lock:
+            self._history_size = size
+            self._event_history = deque(self._event_history, maxlen=size)
+            self._history_by_name = {
+                name: deque(items, maxlen=size)
+                for name, items in self._history_by_name.items()
+            }
     
     def subscribe(self, event_name: str, handler: Callable[[Event], None]) -> None:
-        """Подписаться на событие"""
-        if event_name not in self._subscribers:
-            self._subscribers[event_name] = []
-        self._subscribers[event_name].append(handler)
+        """Подписаться на событие (повторная подписка того же обработчика игнорируется)"""
+        with self._lock:
+            handlers = self._subscribers.get(event_name, [])
+            if handler in handlers:
+                return
+            # Новый список: потоки, уже взявшие старый, дорабатывают по нему
+            self._subscribers[event_name] = handlers + [handler]
     
     def publish(self, event_name: str, payload: Dict[str, Any]) -> None:
         """Опубликовать событие"""
@@ -65,27 +150,248 @@ class EventBus:
             payload=payload
         )
         
-        # Сохраняем в историю
-        self._event_history.append(event)
-        if len(self._event_history) > self._max_history:
-            self._event_history.pop(0)
+        self._record(event)
+        
+        with self._lock:
+            events = self._queue
+            if events is not None:
+                self._enqueuing += 1
+        
+        if events is None:
+            self._dispatch(event)
+            return
+        try:
+            self._enqueue(events, event)
+        finally:
+            with self._lock:
+                self._enqueuing -= 1
+                if not self._enqueuing:
+                    self._enqueued.notify_all()
+    
+    def replay(self, events: Iterable[Event]) -> None:
+        """
+        Проиграть сохранённые события (например, из журнала при старте):
+        они попадают в историю и синхронно передаются подписчикам.
+        """
+        for event in events:
+            self._record(event)
+            self._dispatch(event)
+    
+    def _record(self, event: Event) -> None:
+        """Сохранить событие в историю"""
+        with self._lock:
+            self._history_seq += 1
+            self._event_history.append(event)
+            by_name = self._history_by_name.get(event.name)
+            if by_name is None:
+                by_name = self._history_by_name[event.name] = deque(maxlen=self._history_size)
+            by_name.append((self._history_seq, event))
+            self._stats['published'] += 1
+    
+    def _enqueue(self, events: queue.Queue, event: Event) -> None:
+        if self._backpressure == BACKPRESSURE_BLOCK:
+            events.put(event)
+            return
         
-        # Вызываем подписчиков
-        handlers = self._subscribers.get(event_name, [])
+        while True:
+            try:
+                events.put_nowait(event)
+                return
+            except queue.Full:
+                if self._backpressure == BACKPRESSURE_DROP_NEW:
+                    self._count('dropped')
+                    return
+            # drop_oldest: освобождаем место и пробуем снова
+            try:
+                events.get_nowait()
+                events.task_done()
+                self._count('dropped')
+            except queue.Empty:
+                pass
+    
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+    
+    def _dispatch(self, event: Event) -> None:
+        """Вызвать подписчиков события"""
+        handlers = self._subscribers.get(event.name, [])
         for handler in handlers:
             try:
-                handler(event)
+                with EVENT_HANDLER_SECONDS.time(event.name):
+                    handler(event)
             except Exception as e:
+                self._count('handler_errors')
                 print(f"Error in event handler {handler.__name__}: {e}")
+        self._count('dispatched')
     
-    def get_history(self, event_name: str = None, limit: int = 50) -> List[Event]:
-        """Получить историю событий"""
-        history = self._event_history
+    def _worker(self, events: queue.Queue) -> None:
+        while True:
+            event = events.get()
+            try:
+                if event is None:
+                    return
+                self._dispatch(event)
+            finally:
+                events.task_done()
+    
+    def start_async(
+        self,
+        workers: int = 1,
+        max_queue: int = 10000,
+        backpressure: str = BACKPRESSURE_BLOCK
+    ) -> None:
+        """
+        Включить асинхронную доставку.
+        С одним рабочим потоком обработчики получают события в порядке
+        публикации; с несколькими порядок не гарантируется.
+        """
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f'Неизвестная политика: {backpressure}')
+        if self._queue is not None:
+            self.stop_async()
         
-        if event_name:
-            history = [e for e in history if e.name == event_name]
+        events = queue.Queue(maxsize=max_queue)
+        threads = [
+            threading.Thread(target=self._worker, args=(events,),
+                             name=f'event-bus-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        with self._lock:
+            self._backpressure = backpressure
+            self._queue = events
+            self._workers = threads
+    
+    def stop_async(self, timeout: float = 5.0) -> None:
+        """Доставить оставшиеся события и вернуться к синхронному режиму"""
+        with self._lock:
+            events, workers = self._queue, self._workers
+            if events is None:
+                return
+            self._queue = None
+            self._workers = []
+            # Новые публикации уже синхронные; взявшие очередь докладывают
+            # события до сигналов остановки, иначе события потеряются
+            self._enqueued.wait_for(lambda: not self._enqueuing, timeout)
+        for _ in workers:
+            events.put(None)
+        for thread in workers:
+            thread.join(timeout)
+    
+    def flush(self) -> None:
+        """Дождаться обработки всех событий, уже стоящих в очереди"""
+        events = self._queue
+        if events is not None:
+            events.join()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Счётчики шины и состояние очереди"""
+        with self._lock:
+            stats = dict(self._stats)
+            events, workers = self._queue, self._workers
+        stats['async'] = events is not None
+        stats['workers'] = len(workers)
+        stats['backpressure'] = self._backpressure
+        stats['queue_depth'] = events.qsize() if events is not None else 0
+        return stats
+    
+    def get_history(self, event_name: str = None, limit: int = 50) -> List[Event]:
+        """Получить историю событий (последние limit, старые первыми)"""
+        with self._lock:
+            if not event_name:
+                recent = list(islice(reversed(self._event_history), limit))
+            else:
+                # События старше общей истории уже вытеснены
+                oldest = self._history_seq - len(self._event_history) + 1
+                recent = []
+                for seq, event in reversed(self._history_by_name.get(event_name, ())):
+                    if seq < oldest or len(recent) >= limit:
+                        break
+                    recent.append(event)
         
-        return history[-limit:]
+        recent.reverse()
+        return recent
+
+
+class EventFanout:
+    """
+    Раздача событий подключённым клиентам (SSE).
+    Каждый клиент получает свою ограниченную очередь; медленный клиент
+    теряет самые старые события, не задерживая остальных. События
+    нумеруются, последние replay_size хранятся для докачки после
+    переподключения (Last-Event-ID).
+    
+    Example:
+        fanout = EventFanout()
+        event_bus.subscribe('ALERT', fanout.push)
+        client, backlog, complete = fanout.connect(last_event_id=41)
+        seq, event = client.get(timeout=15)
+    """
+    
+    def __init__(self, max_client_queue: int = 100, replay_size: int = 500):
+        self.max_client_queue = max_client_queue
+        self._replay: 'deque' = deque(maxlen=replay_size)
+        self._clients: List[queue.Queue] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._dropped = 0
+    
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+    
+    def push(self, event: Event) -> None:
+        """Разослать событие всем клиентам (обработчик шины)"""
+        with self._lock:
+            self._seq += 1
+            item = (self._seq, event)
+            self._replay.append(item)
+            for client in self._clients:
+                while True:
+                    try:
+                        client.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            client.get_nowait()
+                            self._dropped += 1
+                        except queue.Empty:
+                            pass
+    
+    def connect(self, last_event_id: int = None):
+        """
+        Подключить клиента.
+        Возвращает (очередь, пропущенные события, complete): complete=False,
+        если часть событий после last_event_id уже вытеснена и клиенту
+        нужно заново загрузить состояние.
+        """
+        client = queue.Queue(maxsize=self.max_client_queue)
+        with self._lock:
+            self._clients.append(client)
+            if last_event_id is None:
+                return client, (), True
+            backlog = tuple(item for item in self._replay if item[0] > last_event_id)
+            oldest = self._replay[0][0] if self._replay else self._seq + 1
+            complete = last_event_id <= self._seq and oldest <= last_event_id + 1
+            return client, backlog, complete
+    
+    def disconnect(self, client: queue.Queue) -> None:
+        """Отключить клиента"""
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Число клиентов, номер последнего события, потерянные события"""
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'last_event_id': self._seq,
+                'replay_size': len(self._replay),
+                'dropped': self._dropped
+            }
 
 
 # Глобальная шина событий
@@ -104,7 +410,7 @@ def handle_text_submitted(event: Event) -> None:
         'username': event.payload.get('username', 'Unknown'),
         'full_name': event.payload.get('full_name', 'Unknown'),
         'timestamp': event.ts,
-        'text_length': len(event.payload.get('text', ''))
+        'text_length': event.payload.get('text_length', len(event.payload.get('text', '')))
     }
     event_bus.monitoring_data.add_submission(submission_data)
 
@@ -173,24 +479,37 @@ def setup_event_handlers():
 
 def get_recent_submissions(limit: int = 10) -> List[Dict]:
     """Витрина: последние загруженные тексты"""
-    return event_bus.monitoring_data.submissions[:limit]
+    data = event_bus.monitoring_data
+    return data.recent(data.submissions, limit)
 
 
 def get_check_results(limit: int = 20) -> List[Dict]:
     """Витрина: результаты проверок"""
-    return event_bus.monitoring_data.check_results[:limit]
+    data = event_bus.monitoring_data
+    return data.recent(data.check_results, limit)
 
 
 def get_suspicious_matches(threshold: float = 0.7) -> List[Dict]:
-    """Витрина: подозрительные совпадения"""
+    """
+    Витрина: подозрительные совпадения.
+    Для стандартного порога берётся готовая витрина MonitoringData,
+    для других порогов - перебор буферов проверок и алертов.
+    """
+    if threshold == SUSPICIOUS_THRESHOLD:
+        return event_bus.monitoring_data.top_suspicious(SUSPICIOUS_LIMIT)
+    
+    with event_bus.monitoring_data.lock:
+        check_results = list(event_bus.monitoring_data.check_results)
+        alerts = list(event_bus.monitoring_data.alerts)
+    
     # Берем из check_results с высокой схожестью
     suspicious_checks = [
-        check for check in event_bus.monitoring_data.check_results
+        check for check in check_results
         if check.get('similarity', 0) >= threshold
     ]
     
     # Добавляем алерты
-    all_suspicious = suspicious_checks + event_bus.monitoring_data.alerts
+    all_suspicious = suspicious_checks + alerts
     
     # Убираем дубликаты по doc_id и сортируем по времени
     seen_docs = set()
@@ -210,6 +529,7 @@ def get_suspicious_matches(threshold: float = 0.7) -> List[Dict]:
 
 def get_activity_stats() -> Dict:
     """Статистика активности системы"""
+    history = event_bus.get_history(limit=1)
     total_events = len(event_bus._event_history)
     
     return {
@@ -217,7 +537,7 @@ def get_activity_stats() -> Dict:
         'submissions': len(event_bus.monitoring_data.submissions),
         'checks': len(event_bus.monitoring_data.check_results),
         'alerts': len(event_bus.monitoring_data.alerts),
-        'last_activity': event_bus._event_history[-1].ts if event_bus._event_history else None
+        'last_activity': history[-1].ts if history else None
     }
 
 
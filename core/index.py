@@ -0,0 +1,763 @@
+"""
+Персистентный индекс отпечатков документов.
+Хэши n-грамм считаются один раз при загрузке документа и хранятся в SQLite,
+проверки читают готовые отпечатки вместо повторной токенизации текстов.
+
+Инвертированный индекс (postings) хранит для каждого хэша n-граммы список
+документов, где она встречается: кандидаты для проверки - только документы
+с хотя бы одной общей n-граммой.
+
+Для проверок с порогом схожести t кандидаты ищутся префиксной фильтрацией
+(как в AllPairs/PPJoin): n-граммы текста упорядочиваются по редкости
+(таблица ngram_df - число документов с n-граммой), и в postings ищутся
+только самые редкие из них - документ со схожестью не ниже t обязан
+содержать хотя бы одну n-грамму префикса. Кандидаты дополнительно
+отсекаются по числу n-грамм (фильтр длины) и проверяются точно.
+
+Для очень больших корпусов есть приближённый режим: MinHash-сигнатуры
+фиксированной длины и LSH-корзины по полосам сигнатуры. Кандидаты ищутся
+точечными запросами в корзины, независимо от частоты n-грамм.
+
+Тексты документов хранятся и как последовательности id токенов словаря
+(core.vocab): отпечатки для нового размера n и winnowing достраиваются
+по id, без повторной токенизации корпуса.
+
+Режим winnowing (как в MOSS) хранит только выбранные отпечатки - минимум
+хэша k-грамм в каждом окне - вместе с позицией в токенах. Индекс в разы
+меньше postings, а позиции позволяют показать совпавшие фрагменты.
+"""
+
+import math
+import sqlite3
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from core.db import SQL_CHUNK
+from core.domain import Fingerprint, MinHashParams
+from core.metrics import stage_timer
+from core.transforms import (
+    HashArray,
+    TokenIds,
+    hash_array,
+    text_hash_array,
+    id_hash_array,
+    id_ngram_hashes,
+    minhash_signature,
+    minhash_similarity,
+    lsh_bands,
+    rolling_ngram_hashes,
+    winnow,
+    jaccard_from_counts
+)
+from core.lazy import batch_process
+from core.vocab import (
+    init_vocab_schema,
+    store_document_tokens,
+    ensure_document_tokens,
+    unpack_token_ids,
+    load_token_hashes
+)
+
+# Размеры n-грамм, для которых отпечаток строится сразу при загрузке.
+# Остальные размеры достраиваются при первой проверке с таким n.
+DEFAULT_NGRAM_SIZES: Tuple[int, ...] = (3,)
+
+
+def init_index_schema(conn: sqlite3.Connection) -> None:
+    """Создать таблицы индекса"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            doc_id INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            token_count INTEGER NOT NULL,
+            ngram_count INTEGER NOT NULL,
+            unique_count INTEGER NOT NULL,
+            hashes BLOB NOT NULL,
+            PRIMARY KEY (doc_id, n),
+            FOREIGN KEY (doc_id) REFERENCES documents(id)
+        )
+    ''')
+
+    has_postings = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'postings'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS postings (
+            n INTEGER NOT NULL,
+            hash INTEGER NOT NULL,
+            doc_id INTEGER NOT NULL,
+            PRIMARY KEY (n, hash, doc_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id, n)'
+    )
+
+    # Документная частота n-грамм (глобальный порядок по редкости для
+    # префиксной фильтрации); поддерживается вместе с postings
+    has_df = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ngram_df'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ngram_df (
+            n INTEGER NOT NULL,
+            hash INTEGER NOT NULL,
+            df INTEGER NOT NULL,
+            PRIMARY KEY (n, hash)
+        ) WITHOUT ROWID
+    ''')
+
+    # Реестры полностью проиндексированных размеров n и конфигураций MinHash:
+    # новые документы индексируются для всех зарегистрированных вариантов,
+    # поэтому проверка полноты индекса не требует сканирования корпуса
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS index_sizes (
+            n INTEGER PRIMARY KEY
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS minhash_configs (
+            n INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            PRIMARY KEY (n, params)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS minhash_signatures (
+            doc_id INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            PRIMARY KEY (doc_id, n, params)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            n INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            doc_id INTEGER NOT NULL,
+            PRIMARY KEY (n, params, band, bucket, doc_id)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS winnow_configs (
+            k INTEGER NOT NULL,
+            window INTEGER NOT NULL,
+            PRIMARY KEY (k, window)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS winnow_fingerprints (
+            k INTEGER NOT NULL,
+            window INTEGER NOT NULL,
+            hash INTEGER NOT NULL,
+            doc_id INTEGER NOT NULL,
+            pos INTEGER NOT NULL,
+            PRIMARY KEY (k, window, hash, doc_id, pos)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS winnow_sizes (
+            doc_id INTEGER NOT NULL,
+            k INTEGER NOT NULL,
+            window INTEGER NOT NULL,
+            unique_count INTEGER NOT NULL,
+            PRIMARY KEY (doc_id, k, window)
+        )
+    ''')
+
+    init_vocab_schema(conn)
+
+    # Отпечатки, сохранённые до появления postings
+    if not has_postings:
+        rows = conn.execute('SELECT doc_id, n, hashes FROM fingerprints').fetchall()
+        for doc_id, n, blob in rows:
+            _save_postings(conn, doc_id, n, unpack_hashes(blob))
+    elif not has_df:
+        conn.execute('''
+            INSERT INTO ngram_df (n, hash, df)
+            SELECT n, hash, COUNT(*) FROM postings GROUP BY n, hash
+        ''')
+
+
+def pack_hashes(hashes: Iterable[int]) -> bytes:
+    """Упаковать хэши в BLOB (отсортированный массив uint64)"""
+    if isinstance(hashes, array) and hashes.typecode == 'Q':
+        # Массивы хэшей n-грамм всегда отсортированы (ngram_hash_array)
+        return hashes.tobytes()
+    return hash_array(hashes).tobytes()
+
+
+def unpack_hashes(blob: bytes) -> HashArray:
+    """Распаковать BLOB в отсортированный массив хэшей (без копирования в множество)"""
+    packed = array('Q')
+    packed.frombytes(blob)
+    return packed
+
+
+def fingerprint_text(doc_id: str, text: str, n: int = 3) -> Fingerprint:
+    """
+    Построить отпечаток текста.
+
+    Example:
+        fp = fingerprint_text("42", "Съешь же ещё этих мягких булок", n=3)
+        # fp.token_count == 6, fp.ngram_count == 4
+    """
+    with stage_timer('text_hashes', hot=True):
+        token_count, hashes, ngram_count = text_hash_array(text, n)
+    return Fingerprint(
+        doc_id=str(doc_id),
+        n=n,
+        token_count=token_count,
+        ngram_count=ngram_count,
+        unique_count=len(hashes),
+        hashes=hashes
+    )
+
+
+def fingerprint_ids(
+    doc_id: str,
+    token_ids: TokenIds,
+    token_hashes: Sequence[int],
+    n: int = 3
+) -> Fingerprint:
+    """
+    Построить отпечаток по id токенов документа.
+    token_hashes[id] - хэш токена (load_token_hashes или encode_text).
+    """
+    with stage_timer('id_hashes', hot=True):
+        token_count, hashes, ngram_count = id_hash_array(token_ids, token_hashes, n)
+    return Fingerprint(
+        doc_id=str(doc_id),
+        n=n,
+        token_count=token_count,
+        ngram_count=ngram_count,
+        unique_count=len(hashes),
+        hashes=hashes
+    )
+
+
+def _save_postings(
+    conn: sqlite3.Connection,
+    doc_id: int,
+    n: int,
+    hashes: Iterable[int]
+) -> None:
+    conn.execute('''
+        UPDATE ngram_df SET df = df - 1
+        WHERE n = ? AND hash IN (SELECT hash FROM postings WHERE doc_id = ? AND n = ?)
+    ''', (n, doc_id, n))
+    conn.execute('DELETE FROM postings WHERE doc_id = ? AND n = ?', (doc_id, n))
+    conn.executemany(
+        'INSERT INTO postings (n, hash, doc_id) VALUES (?, ?, ?)',
+        ((n, h, doc_id) for h in hashes)
+    )
+    conn.executemany('''
+        INSERT INTO ngram_df (n, hash, df) VALUES (?, ?, 1)
+        ON CONFLICT (n, hash) DO UPDATE SET df = df + 1
+    ''', ((n, h) for h in hashes))
+
+
+def save_fingerprint(conn: sqlite3.Connection, fp: Fingerprint) -> None:
+    """Сохранить отпечаток и его postings (commit выполняет вызывающий код)"""
+    conn.execute('''
+        INSERT OR REPLACE INTO fingerprints
+            (doc_id, n, token_count, ngram_count, unique_count, hashes)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (int(fp.doc_id), fp.n, fp.token_count, fp.ngram_count,
+          fp.unique_count, pack_hashes(fp.hashes)))
+    _save_postings(conn, int(fp.doc_id), fp.n, fp.hashes)
+
+
+def index_document(
+    conn: sqlite3.Connection,
+    doc_id: int,
+    text: str,
+    sizes: Optional[Tuple[int, ...]] = None
+) -> None:
+    """
+    Проиндексировать новый документ: отпечатки для всех размеров из sizes
+    (по умолчанию - все зарегистрированные в индексе) и MinHash-сигнатуры
+    для всех зарегистрированных конфигураций. Текст токенизируется
+    один раз: словарь пополняется, отпечатки строятся по id.
+    """
+    if sizes is None:
+        sizes = tuple(sorted(set(DEFAULT_NGRAM_SIZES) | set(
+            row[0] for row in conn.execute('SELECT n FROM index_sizes')
+        )))
+    configs = conn.execute('SELECT n, params FROM minhash_configs').fetchall()
+    winnow_configs = conn.execute('SELECT k, window FROM winnow_configs').fetchall()
+
+    token_ids, token_hashes = store_document_tokens(conn, doc_id, text)
+    for n in sizes:
+        fp = fingerprint_ids(str(doc_id), token_ids, token_hashes, n)
+        save_fingerprint(conn, fp)
+        for config_n, key in configs:
+            if config_n == n:
+                save_minhash(conn, doc_id, n, fp.hashes, MinHashParams.from_key(key))
+
+    for k, window in winnow_configs:
+        save_winnow(conn, doc_id, k, window, winnow_ids(token_ids, token_hashes, k, window))
+
+
+def ensure_fingerprints(conn: sqlite3.Connection, n: int) -> int:
+    """
+    Достроить отпечатки для документов, у которых их нет для данного n
+    (документы, загруженные до появления индекса, или новый размер n-грамм).
+    Возвращает число проиндексированных документов.
+    """
+    if conn.execute('SELECT 1 FROM index_sizes WHERE n = ?', (n,)).fetchone():
+        return 0
+
+    # Регистрация открывает пишущую транзакцию до выборки, поэтому
+    # параллельная загрузка не может проскочить между выборкой и commit
+    conn.execute('INSERT OR IGNORE INTO index_sizes (n) VALUES (?)', (n,))
+    ensure_document_tokens(conn)
+    rows = conn.execute('''
+        SELECT t.doc_id, t.token_ids
+        FROM document_tokens t
+        LEFT JOIN fingerprints f ON f.doc_id = t.doc_id AND f.n = ?
+        WHERE f.doc_id IS NULL
+    ''', (n,)).fetchall()
+
+    if rows:
+        token_hashes = load_token_hashes(conn)
+        for doc_id, blob in rows:
+            save_fingerprint(conn, fingerprint_ids(str(doc_id), unpack_token_ids(blob), token_hashes, n))
+
+    conn.commit()
+    return len(rows)
+
+
+def load_fingerprints(
+    conn: sqlite3.Connection,
+    n: int,
+    exclude_doc_id: Optional[int] = None,
+    doc_ids: Optional[Iterable[str]] = None,
+    with_hashes: bool = True,
+    unique_range: Optional[Tuple[int, int]] = None
+) -> Dict[str, Fingerprint]:
+    """
+    Загрузить отпечатки документов для данного n.
+
+    Args:
+        doc_ids: Ограничить выборку этими документами (None - все)
+        with_hashes: False - только счётчики, без распаковки хэшей
+        unique_range: Только документы с числом уникальных n-грамм
+            в этих границах (включительно)
+    """
+    columns = 'doc_id, token_count, ngram_count, unique_count' + (
+        ', hashes' if with_hashes else ''
+    )
+    exclude = exclude_doc_id if exclude_doc_id is not None else -1
+    where = 'n = ? AND doc_id != ?'
+    params: Tuple = (n, exclude)
+    if unique_range is not None:
+        where += ' AND unique_count BETWEEN ? AND ?'
+        params += tuple(unique_range)
+
+    if doc_ids is None:
+        rows = conn.execute(
+            f'SELECT {columns} FROM fingerprints WHERE {where}', params
+        ).fetchall()
+    else:
+        rows = []
+        for chunk in batch_process(tuple(int(d) for d in doc_ids), SQL_CHUNK):
+            placeholders = ','.join('?' * len(chunk))
+            rows.extend(conn.execute(
+                f'SELECT {columns} FROM fingerprints '
+                f'WHERE {where} AND doc_id IN ({placeholders})',
+                (*params, *chunk)
+            ).fetchall())
+
+    return {
+        str(row[0]): Fingerprint(
+            doc_id=str(row[0]),
+            n=n,
+            token_count=row[1],
+            ngram_count=row[2],
+            unique_count=row[3],
+            hashes=unpack_hashes(row[4]) if with_hashes else array('Q')
+        )
+        for row in rows
+    }
+
+
+def query_overlaps(
+    conn: sqlite3.Connection,
+    n: int,
+    hashes: Iterable[int],
+    exclude_doc_id: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Число общих n-грамм с каждым документом по инвертированному индексу.
+    Документы без общих n-грамм в результат не попадают, поэтому стоимость
+    запроса определяется числом совпавших postings, а не размером корпуса.
+
+    Example:
+        overlaps = query_overlaps(conn, 3, fp.hashes)
+        # {'12': 40, '31': 2}
+    """
+    counts: Counter = Counter()
+    for chunk in batch_process(tuple(hashes), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT doc_id, COUNT(*) FROM postings '
+            f'WHERE n = ? AND hash IN ({placeholders}) GROUP BY doc_id',
+            (n, *chunk)
+        ).fetchall()
+        for doc_id, count in rows:
+            counts[str(doc_id)] += count
+
+    if exclude_doc_id is not None:
+        counts.pop(str(exclude_doc_id), None)
+    return dict(counts)
+
+
+def query_overlaps_batch(
+    conn: sqlite3.Connection,
+    n: int,
+    hash_sets: Sequence[Iterable[int]],
+    exclude_doc_ids: Optional[Sequence[Optional[int]]] = None
+) -> Tuple[Dict[str, int], ...]:
+    """
+    query_overlaps для нескольких текстов за один проход по postings:
+    каждая n-грамма читается один раз, даже если встречается во многих
+    текстах. exclude_doc_ids[i] - документ, исключаемый для i-го текста.
+
+    Example:
+        first, second = query_overlaps_batch(conn, 3, (fp1.hashes, fp2.hashes))
+    """
+    owners: Dict[int, list] = {}
+    for index, hashes in enumerate(hash_sets):
+        for h in hashes:
+            owners.setdefault(h, []).append(index)
+
+    counts = tuple(Counter() for _ in hash_sets)
+    for chunk in batch_process(tuple(owners), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT hash, doc_id FROM postings WHERE n = ? AND hash IN ({placeholders}) '
+            f'ORDER BY hash',
+            (n, *chunk)
+        )
+        # Документы одной n-граммы добавляются в счётчики всех её текстов
+        for h, group in groupby(rows, key=itemgetter(0)):
+            doc_ids = [str(doc_id) for _, doc_id in group]
+            for index in owners[h]:
+                counts[index].update(doc_ids)
+
+    for index, exclude in enumerate(exclude_doc_ids or ()):
+        if exclude is not None:
+            counts[index].pop(str(exclude), None)
+    return tuple(dict(c) for c in counts)
+
+
+def prefix_length(size: int, threshold: float) -> int:
+    """
+    Длина префикса множества из size n-грамм для порога threshold.
+    J(A, B) >= t требует |A & B| >= t * |A|, поэтому документ, не
+    содержащий ни одной из первых size - ceil(t * size) + 1 n-грамм
+    (в любом фиксированном порядке), порог пройти не может.
+    """
+    # Допуск на ошибку округления: фильтр может быть только мягче
+    required = max(1, math.ceil(threshold * size - 1e-9))
+    return max(0, size - required + 1)
+
+
+def length_bounds(size: int, threshold: float) -> Tuple[int, int]:
+    """Фильтр длины: J(A, B) >= t возможно только при t|A| <= |B| <= |A|/t"""
+    return (
+        max(0, math.ceil(threshold * size - 1e-9)),
+        math.floor(size / threshold + 1e-9)
+    )
+
+
+def load_document_frequencies(
+    conn: sqlite3.Connection,
+    n: int,
+    hashes: Iterable[int]
+) -> Dict[int, int]:
+    """Число документов с каждой n-граммой (отсутствующие - не встречаются)"""
+    frequencies = {}
+    for chunk in batch_process(tuple(hashes), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        frequencies.update(conn.execute(
+            f'SELECT hash, df FROM ngram_df WHERE n = ? AND hash IN ({placeholders})',
+            (n, *chunk)
+        ))
+    return frequencies
+
+
+def query_prefix(
+    conn: sqlite3.Connection,
+    n: int,
+    hashes: Sequence[int],
+    threshold: float,
+    exclude_doc_id: Optional[int] = None
+) -> Dict[str, Fingerprint]:
+    """
+    Кандидаты со схожестью, возможно не ниже threshold (0 < threshold <= 1):
+    документы, содержащие хотя бы одну n-грамму префикса (самые редкие
+    n-граммы текста) и проходящие фильтр длины. Возвращаются их отпечатки
+    с хэшами для точной проверки; все документы с J >= threshold среди
+    них гарантированно есть.
+
+    Example:
+        fps = query_prefix(conn, 3, fp.hashes, 0.8)
+        # {'12': Fingerprint(...)} - проверить jaccard_hashes(fp.hashes, ...)
+    """
+    if not hashes:
+        return {}
+
+    with stage_timer('prefix_filter'):
+        frequencies = load_document_frequencies(conn, n, hashes)
+        ordered = sorted(hashes, key=lambda h: (frequencies.get(h, 0), h))
+        # n-граммы, которых нет в корпусе, занимают место в префиксе
+        # бесплатно: по ним кандидатов нет
+        prefix = tuple(
+            h for h in ordered[:prefix_length(len(hashes), threshold)]
+            if h in frequencies
+        )
+
+        candidates = set()
+        for chunk in batch_process(prefix, SQL_CHUNK):
+            placeholders = ','.join('?' * len(chunk))
+            candidates.update(row[0] for row in conn.execute(
+                f'SELECT DISTINCT doc_id FROM postings '
+                f'WHERE n = ? AND hash IN ({placeholders})',
+                (n, *chunk)
+            ))
+
+    return load_fingerprints(
+        conn, n, exclude_doc_id, doc_ids=candidates,
+        unique_range=length_bounds(len(hashes), threshold)
+    )
+
+
+def save_minhash(
+    conn: sqlite3.Connection,
+    doc_id: int,
+    n: int,
+    hashes: Iterable[int],
+    params: MinHashParams
+) -> Tuple[int, ...]:
+    """Сохранить MinHash-сигнатуру документа и его LSH-корзины"""
+    signature = minhash_signature(hashes, params.num_perm, params.seed)
+    conn.execute('''
+        INSERT OR REPLACE INTO minhash_signatures (doc_id, n, params, signature)
+        VALUES (?, ?, ?, ?)
+    ''', (int(doc_id), n, params.key, array('Q', signature).tobytes()))
+    conn.execute(
+        'DELETE FROM lsh_buckets WHERE doc_id = ? AND n = ? AND params = ?',
+        (int(doc_id), n, params.key)
+    )
+    conn.executemany('''
+        INSERT INTO lsh_buckets (n, params, band, bucket, doc_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (n, params.key, band, bucket, int(doc_id))
+        for band, bucket in enumerate(lsh_bands(signature, params.bands, params.rows))
+    ))
+    return signature
+
+
+def ensure_minhash(conn: sqlite3.Connection, n: int, params: MinHashParams) -> int:
+    """
+    Достроить сигнатуры для документов без них (для данных n и параметров).
+    Сигнатуры считаются из сохранённых отпечатков, тексты не читаются.
+    """
+    if conn.execute(
+        'SELECT 1 FROM minhash_configs WHERE n = ? AND params = ?', (n, params.key)
+    ).fetchone():
+        return 0
+
+    ensure_fingerprints(conn, n)
+    conn.execute(
+        'INSERT OR IGNORE INTO minhash_configs (n, params) VALUES (?, ?)',
+        (n, params.key)
+    )
+    rows = conn.execute('''
+        SELECT f.doc_id, f.hashes
+        FROM fingerprints f
+        LEFT JOIN minhash_signatures m
+            ON m.doc_id = f.doc_id AND m.n = f.n AND m.params = ?
+        WHERE f.n = ? AND m.doc_id IS NULL
+    ''', (params.key, n)).fetchall()
+
+    for doc_id, blob in rows:
+        save_minhash(conn, doc_id, n, unpack_hashes(blob), params)
+
+    conn.commit()
+    return len(rows)
+
+
+def query_lsh(
+    conn: sqlite3.Connection,
+    n: int,
+    hashes: Iterable[int],
+    params: MinHashParams,
+    exclude_doc_id: Optional[int] = None
+) -> Dict[str, float]:
+    """
+    Найти кандидатов через LSH-корзины и оценить их схожесть по сигнатурам.
+    Документ становится кандидатом, если совпал хотя бы в одной полосе;
+    вероятность этого для схожести s равна 1 - (1 - s^rows)^bands.
+
+    Returns:
+        doc_id -> оценка коэффициента Жаккара
+    """
+    signature = minhash_signature(hashes, params.num_perm, params.seed)
+    buckets = lsh_bands(signature, params.bands, params.rows)
+
+    placeholders = ','.join(['(?, ?)'] * len(buckets))
+    rows = conn.execute(f'''
+        SELECT DISTINCT b.doc_id, m.signature
+        FROM lsh_buckets b
+        JOIN minhash_signatures m
+            ON m.doc_id = b.doc_id AND m.n = b.n AND m.params = b.params
+        WHERE b.n = ? AND b.params = ? AND (b.band, b.bucket) IN (VALUES {placeholders})
+    ''', (n, params.key, *(v for pair in enumerate(buckets) for v in pair))).fetchall()
+
+    estimates = {}
+    for doc_id, blob in rows:
+        if exclude_doc_id is not None and doc_id == int(exclude_doc_id):
+            continue
+        doc_signature = array('Q')
+        doc_signature.frombytes(blob)
+        estimates[str(doc_id)] = minhash_similarity(signature, tuple(doc_signature))
+    return estimates
+
+
+def winnow_text_tokens(
+    tokens: Tuple[str, ...],
+    k: int,
+    window: int
+) -> Tuple[Tuple[int, int], ...]:
+    """Отпечатки winnowing для последовательности токенов: (hash, позиция)"""
+    return winnow(rolling_ngram_hashes(tokens, k), window)
+
+
+def winnow_ids(
+    token_ids: TokenIds,
+    token_hashes: Sequence[int],
+    k: int,
+    window: int
+) -> Tuple[Tuple[int, int], ...]:
+    """Отпечатки winnowing по id токенов (совпадают с winnow_text_tokens)"""
+    return winnow(tuple(id_ngram_hashes(token_ids, token_hashes, k)), window)
+
+
+def save_winnow(
+    conn: sqlite3.Connection,
+    doc_id: int,
+    k: int,
+    window: int,
+    selected: Tuple[Tuple[int, int], ...]
+) -> None:
+    """Сохранить выбранные отпечатки документа с позициями"""
+    conn.execute(
+        'DELETE FROM winnow_fingerprints WHERE doc_id = ? AND k = ? AND window = ?',
+        (int(doc_id), k, window)
+    )
+    conn.executemany('''
+        INSERT OR IGNORE INTO winnow_fingerprints (k, window, hash, doc_id, pos)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((k, window, h, int(doc_id), pos) for h, pos in selected))
+    conn.execute('''
+        INSERT OR REPLACE INTO winnow_sizes (doc_id, k, window, unique_count)
+        VALUES (?, ?, ?, ?)
+    ''', (int(doc_id), k, window, len(set(h for h, _ in selected))))
+
+
+def ensure_winnow(conn: sqlite3.Connection, k: int, window: int) -> int:
+    """
+    Зарегистрировать конфигурацию winnowing и достроить отпечатки
+    для всех документов. Позиции считаются по сохранённым id токенов.
+    """
+    if conn.execute(
+        'SELECT 1 FROM winnow_configs WHERE k = ? AND window = ?', (k, window)
+    ).fetchone():
+        return 0
+
+    conn.execute(
+        'INSERT OR IGNORE INTO winnow_configs (k, window) VALUES (?, ?)', (k, window)
+    )
+    ensure_document_tokens(conn)
+    rows = conn.execute('''
+        SELECT t.doc_id, t.token_ids
+        FROM document_tokens t
+        LEFT JOIN winnow_sizes w ON w.doc_id = t.doc_id AND w.k = ? AND w.window = ?
+        WHERE w.doc_id IS NULL
+    ''', (k, window)).fetchall()
+
+    if rows:
+        token_hashes = load_token_hashes(conn)
+        for doc_id, blob in rows:
+            save_winnow(conn, doc_id, k, window,
+                        winnow_ids(unpack_token_ids(blob), token_hashes, k, window))
+
+    conn.commit()
+    return len(rows)
+
+
+def query_winnow(
+    conn: sqlite3.Connection,
+    k: int,
+    window: int,
+    selected: Tuple[Tuple[int, int], ...],
+    exclude_doc_id: Optional[int] = None
+) -> Dict[str, Tuple[float, Tuple[Tuple[int, int], ...]]]:
+    """
+    Найти документы с общими отпечатками winnowing.
+
+    Returns:
+        doc_id -> (Жаккар по множествам отпечатков,
+                   пары позиций (в запросе, в документе) совпавших k-грамм)
+    """
+    positions: Dict[int, list] = {}
+    for h, pos in selected:
+        positions.setdefault(h, []).append(pos)
+
+    pairs: Dict[str, list] = {}
+    shared: Dict[str, set] = {}
+    for chunk in batch_process(tuple(positions), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT hash, doc_id, pos FROM winnow_fingerprints '
+            f'WHERE k = ? AND window = ? AND hash IN ({placeholders})',
+            (k, window, *chunk)
+        ).fetchall()
+        for h, doc_id, doc_pos in rows:
+            if exclude_doc_id is not None and doc_id == int(exclude_doc_id):
+                continue
+            key = str(doc_id)
+            shared.setdefault(key, set()).add(h)
+            pairs.setdefault(key, []).extend((pos, doc_pos) for pos in positions[h])
+
+    if not shared:
+        return {}
+
+    sizes = {}
+    for chunk in batch_process(tuple(int(d) for d in shared), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        sizes.update(
+            (str(doc_id), count) for doc_id, count in conn.execute(
+                f'SELECT doc_id, unique_count FROM winnow_sizes '
+                f'WHERE k = ? AND window = ? AND doc_id IN ({placeholders})',
+                (k, window, *chunk)
+            )
+        )
+
+    return {
+        doc_id: (
+            jaccard_from_counts(len(hashes), len(positions), sizes.get(doc_id, len(hashes))),
+            tuple(pairs[doc_id])
+        )
+        for doc_id, hashes in shared.items()
+    }
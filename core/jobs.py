@@ -0,0 +1,193 @@
+"""
+Фоновые задачи (проверки на плагиат).
+Задача ставится в ограниченную очередь и сразу получает id;
+её выполняет пул рабочих потоков. Статус, прогресс и результат
+доступны по id, а ожидающие клиенты будятся при каждом изменении.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+
+class JobQueueFull(Exception):
+    """Очередь задач переполнена"""
+
+
+@dataclass
+class Job:
+    """Фоновая задача"""
+    id: str
+    kind: str
+    owner_id: Optional[str] = None
+    status: str = JOB_QUEUED
+    progress: float = 0.0
+    stage: str = ''
+    result: Any = None
+    error: Optional[str] = None
+    submitted_at: str = field(default_factory=lambda: datetime.utcnow().isoformat() + 'Z')
+    version: int = 0
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        wait = (self.started_at or time.monotonic()) - self.queued_at
+        run = (self.finished_at or time.monotonic()) - self.started_at if self.started_at else 0.0
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'stage': self.stage,
+            'result': self.result,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'wait_seconds': round(wait, 3),
+            'run_seconds': round(run, 3),
+        }
+
+
+class JobQueue:
+    """
+    Ограниченная очередь задач с пулом рабочих потоков.
+
+    Функция задачи получает первым аргументом report(progress, stage)
+    для обновления прогресса; её результат становится результатом задачи,
+    исключение - ошибкой.
+
+    Example:
+        jobs = JobQueue(workers=2, max_queue=100)
+        job = jobs.submit('check', run_check, doc_id)
+        jobs.get(job.id).status  # 'queued' / 'running' / 'done' / 'failed'
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 100, max_finished: int = 1000):
+        self.workers = workers
+        self.max_finished = max_finished
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._changed = threading.Condition()
+        self._threads = []
+        self._started = False
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'run_total': 0.0,
+            'run_max': 0.0,
+        }
+
+    def _start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, owner_id: Optional[str] = None) -> Job:
+        """Поставить задачу в очередь; JobQueueFull - если мест нет"""
+        job = Job(id=uuid.uuid4().hex, kind=kind, owner_id=owner_id)
+
+        with self._changed:
+            self._start()
+            try:
+                self._queue.put_nowait((job, fn, args))
+            except queue.Full:
+                self._stats['rejected'] += 1
+                raise JobQueueFull(f'Очередь задач заполнена ({self._queue.maxsize})')
+            self._jobs[job.id] = job
+            self._stats['submitted'] += 1
+            self._trim()
+        return job
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _update(self, job: Job, **changes) -> None:
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._changed.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            job, fn, args = self._queue.get()
+            started = time.monotonic()
+            self._update(job, status=JOB_RUNNING, started_at=started)
+
+            def report(progress: float, stage: str = '') -> None:
+                self._update(job, progress=progress, stage=stage)
+
+            try:
+                result = fn(report, *args)
+            except Exception as e:
+                self._update(job, status=JOB_FAILED, error=str(e), finished_at=time.monotonic())
+            else:
+                self._update(job, status=JOB_DONE, progress=1.0, stage='', result=result,
+                             finished_at=time.monotonic())
+
+            with self._changed:
+                wait = started - job.queued_at
+                run = job.finished_at - started
+                self._stats['completed' if job.status == JOB_DONE else 'failed'] += 1
+                self._stats['wait_total'] += wait
+                self._stats['wait_max'] = max(self._stats['wait_max'], wait)
+                self._stats['run_total'] += run
+                self._stats['run_max'] = max(self._stats['run_max'], run)
+            self._queue.task_done()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Задача по id (None - неизвестна или уже вытеснена)"""
+        with self._changed:
+            return self._jobs.get(job_id)
+
+    def wait_for_change(self, job: Job, version: int, timeout: float = None) -> bool:
+        """Дождаться изменения задачи после версии version; False - по таймауту"""
+        with self._changed:
+            return self._changed.wait_for(lambda: job.version != version, timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очереди, число задач и время ожидания/выполнения"""
+        with self._changed:
+            stats = dict(self._stats)
+            running = sum(1 for job in self._jobs.values() if job.status == JOB_RUNNING)
+        finished = stats['completed'] + stats['failed']
+        return {
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'running': running,
+            'submitted': stats['submitted'],
+            'rejected': stats['rejected'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'avg_wait_seconds': round(stats['wait_total'] / finished, 4) if finished else 0.0,
+            'max_wait_seconds': round(stats['wait_max'], 4),
+            'avg_run_seconds': round(stats['run_total'] / finished, 4) if finished else 0.0,
+            'max_run_seconds': round(stats['run_max'], 4),
+        }
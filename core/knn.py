@@ -0,0 +1,245 @@
+"""
+Граф k ближайших соседей документов.
+Для каждого документа хранятся k самых похожих документов корпуса
+(точный Жаккар по n-граммам) со схожестью. Граф строится фоновой
+задачей за проходы по инвертированному индексу пачками документов
+и обновляется при загрузке: новый документ получает своих соседей
+и попадает в списки тех документов, для которых он ближе их k-го
+соседа. Обход "похожих" документов и просмотр связей в кластерах -
+чтение нескольких строк по первичному ключу вместо сканирования корпуса.
+
+Порядок соседей: по убыванию схожести, при равенстве - меньший id;
+инкрементальные обновления дают тот же граф, что и полная сборка.
+"""
+
+import heapq
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from core.db import SQL_CHUNK
+from core.index import (
+    ensure_fingerprints,
+    load_fingerprints,
+    query_overlaps,
+    query_overlaps_batch
+)
+from core.lazy import batch_process
+from core.transforms import jaccard_from_counts
+
+# Число документов в одном проходе по postings при сборке
+KNN_BUILD_BATCH = 64
+
+Neighbours = Tuple[Tuple[str, float], ...]
+
+
+def init_knn_schema(conn: sqlite3.Connection) -> None:
+    """Создать таблицы графа соседей"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS document_neighbours (
+            doc_id INTEGER NOT NULL,
+            neighbour_id INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            PRIMARY KEY (doc_id, neighbour_id)
+        ) WITHOUT ROWID
+    ''')
+    # Параметры последней сборки: по ним обновляется граф при загрузке
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS knn_settings (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            n INTEGER NOT NULL,
+            k INTEGER NOT NULL,
+            built_at TEXT NOT NULL
+        )
+    ''')
+
+
+def get_knn_settings(conn: sqlite3.Connection) -> Optional[Tuple[int, int]]:
+    """(n, k) последней сборки или None, если граф не строился"""
+    row = conn.execute('SELECT n, k FROM knn_settings WHERE id = 1').fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def top_neighbours(
+    overlaps: Mapping[str, int],
+    size: int,
+    sizes: Mapping[str, int],
+    k: int
+) -> Neighbours:
+    """k лучших соседей по числу общих n-грамм и размерам множеств"""
+    scored = (
+        (jaccard_from_counts(count, size, sizes[other]), -int(other))
+        for other, count in overlaps.items() if other in sizes
+    )
+    return tuple(
+        (str(-negative_id), similarity)
+        for similarity, negative_id in heapq.nlargest(k, scored)
+    )
+
+
+def _save_neighbours(conn: sqlite3.Connection, doc_id: int, neighbours: Neighbours) -> None:
+    conn.execute('DELETE FROM document_neighbours WHERE doc_id = ?', (int(doc_id),))
+    conn.executemany(
+        'INSERT INTO document_neighbours (doc_id, neighbour_id, similarity) VALUES (?, ?, ?)',
+        ((int(doc_id), int(other), similarity) for other, similarity in neighbours)
+    )
+
+
+def build_knn_graph(
+    conn: sqlite3.Connection,
+    n: int,
+    k: int,
+    report: Callable[[float, str], None] = lambda progress, stage: None,
+    batch_size: int = KNN_BUILD_BATCH
+) -> Dict[str, int]:
+    """
+    Полная сборка графа (фоновая задача). Общие n-граммы считаются
+    query_overlaps_batch для batch_size документов за проход, граф
+    перезаписывается одной транзакцией; документы, загруженные во время
+    сборки, добавляются после неё.
+    """
+    ensure_fingerprints(conn, n)
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM documents').fetchone()[0]
+    sizes = {
+        doc_id: fp.unique_count
+        for doc_id, fp in load_fingerprints(conn, n, with_hashes=False).items()
+        if int(doc_id) <= last_id
+    }
+    doc_ids = tuple(sorted(sizes, key=int))
+
+    graph: List[Tuple[str, Neighbours]] = []
+    for done, batch in enumerate(batch_process(doc_ids, batch_size)):
+        fingerprints = load_fingerprints(conn, n, doc_ids=batch)
+        overlaps = query_overlaps_batch(
+            conn, n, [fingerprints[doc_id].hashes for doc_id in batch], [int(d) for d in batch]
+        )
+        for doc_id, found in zip(batch, overlaps):
+            graph.append((doc_id, top_neighbours(found, sizes[doc_id], sizes, k)))
+        report(min(0.9, (done + 1) * batch_size / max(len(doc_ids), 1) * 0.9), 'neighbours')
+
+    report(0.9, 'saving')
+    conn.execute('DELETE FROM document_neighbours')
+    conn.executemany(
+        'INSERT INTO document_neighbours (doc_id, neighbour_id, similarity) VALUES (?, ?, ?)',
+        ((int(doc_id), int(other), similarity)
+         for doc_id, neighbours in graph for other, similarity in neighbours)
+    )
+    conn.execute('''
+        INSERT OR REPLACE INTO knn_settings (id, n, k, built_at) VALUES (1, ?, ?, ?)
+    ''', (n, k, datetime.utcnow().isoformat() + 'Z'))
+
+    late = tuple(row[0] for row in conn.execute(
+        'SELECT id FROM documents WHERE id > ? ORDER BY id', (last_id,)
+    ))
+    for doc_id in late:
+        add_document_neighbours(conn, doc_id)
+    conn.commit()
+
+    return {
+        'documents': len(doc_ids) + len(late),
+        'edges': sum(len(neighbours) for _, neighbours in graph),
+        'k': k,
+    }
+
+
+def add_document_neighbours(conn: sqlite3.Connection, doc_id: int) -> int:
+    """
+    Добавить новый документ в граф (без commit): его k соседей и он сам
+    в списках документов, k-й сосед которых дальше него. Возвращает
+    число изменённых списков (0 - граф не строился).
+    """
+    settings = get_knn_settings(conn)
+    if settings is None:
+        return 0
+    n, k = settings
+
+    fp = load_fingerprints(conn, n, doc_ids=(doc_id,)).get(str(doc_id))
+    if fp is None:
+        return 0
+    overlaps = query_overlaps(conn, n, fp.hashes, exclude_doc_id=int(doc_id))
+
+    # Размеры соседей-кандидатов и их текущие списки одним запросом:
+    # (число соседей, схожесть k-го)
+    sizes: Dict[str, int] = {}
+    worst: Dict[str, Tuple[int, float]] = {}
+    for chunk in batch_process(tuple(int(other) for other in overlaps), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        for other, size, count, lowest in conn.execute(f'''
+            SELECT f.doc_id, f.unique_count, COUNT(nb.neighbour_id), MIN(nb.similarity)
+            FROM fingerprints f
+            LEFT JOIN document_neighbours nb ON nb.doc_id = f.doc_id
+            WHERE f.n = ? AND f.doc_id IN ({placeholders})
+            GROUP BY f.doc_id
+        ''', (n, *chunk)):
+            sizes[str(other)] = size
+            worst[str(other)] = (count, lowest)
+    _save_neighbours(conn, doc_id, top_neighbours(overlaps, fp.unique_count, sizes, k))
+
+    # Документ входит в списки, где меньше k соседей или k-й хуже него.
+    # При равной схожести новый документ (наибольший id) проигрывает;
+    # списки, где он уже есть (повторное добавление), не меняются
+    listed = frozenset(str(row[0]) for row in conn.execute(
+        'SELECT doc_id FROM document_neighbours WHERE neighbour_id = ?', (int(doc_id),)
+    ))
+
+    changed = 1
+    for other, count in overlaps.items():
+        if other not in sizes or other in listed:
+            continue
+        similarity = jaccard_from_counts(count, sizes[other], fp.unique_count)
+        current, lowest = worst.get(other, (0, 0.0))
+        if current >= k:
+            if similarity <= lowest:
+                continue
+            conn.execute('''
+                DELETE FROM document_neighbours WHERE doc_id = ? AND neighbour_id = (
+                    SELECT neighbour_id FROM document_neighbours WHERE doc_id = ?
+                    ORDER BY similarity ASC, neighbour_id DESC LIMIT 1
+                )
+            ''', (int(other), int(other)))
+        conn.execute(
+            'INSERT INTO document_neighbours (doc_id, neighbour_id, similarity) VALUES (?, ?, ?)',
+            (int(other), int(doc_id), similarity)
+        )
+        changed += 1
+    return changed
+
+
+def load_neighbours(
+    conn: sqlite3.Connection,
+    doc_id: int,
+    limit: Optional[int] = None
+) -> Neighbours:
+    """Соседи документа по убыванию схожести"""
+    return tuple(
+        (str(other), similarity)
+        for other, similarity in conn.execute('''
+            SELECT neighbour_id, similarity FROM document_neighbours
+            WHERE doc_id = ? ORDER BY similarity DESC, neighbour_id LIMIT ?
+        ''', (int(doc_id), -1 if limit is None else limit))
+    )
+
+
+def load_edges(
+    conn: sqlite3.Connection,
+    doc_ids: Iterable[int]
+) -> Tuple[Tuple[int, int, float], ...]:
+    """Рёбра графа между документами набора (например, кластера): (a, b, схожесть)"""
+    members = frozenset(int(doc_id) for doc_id in doc_ids)
+    edges = []
+    # Части по возрастанию doc_id: общий порядок тот же, что в одном запросе
+    for chunk in batch_process(tuple(sorted(members)), SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        edges.extend(
+            edge for edge in conn.execute(f'''
+                SELECT doc_id, neighbour_id, similarity FROM document_neighbours
+                WHERE doc_id IN ({placeholders})
+                ORDER BY doc_id, similarity DESC, neighbour_id
+            ''', chunk)
+            if edge[1] in members
+        )
+    return tuple(edges)
+
+
+def neighbours_lookup(conn: sqlite3.Connection) -> Callable[[str], Sequence[Tuple[str, float]]]:
+    """Функция doc_id -> соседи для обхода графа (core.recursion.walk_neighbours)"""
+    return lambda doc_id: load_neighbours(conn, int(doc_id))
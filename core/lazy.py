@@ -3,9 +3,10 @@
 Внутренний модуль - пользователь не видит технических деталей.
 """
 
-from typing import Iterator, Callable, Tuple, Dict, Any
-from core.domain import Document
-from core.transforms import normalize, tokenize, ngrams, jaccard
+from typing import Iterator, Callable, Tuple, Dict, Any, Mapping, Optional
+from core.domain import Document, Fingerprint
+from core.transforms import stream_ngram_hashes, jaccard_hashes, jaccard_from_counts
+from core.metrics import DOCUMENTS_SCANNED, stage_timer
 
 
 def paginate_documents(
@@ -68,26 +69,42 @@ def progressive_check(
     submission_text: str,
     documents: Tuple[Document, ...],
     n: int = 3,
-    min_similarity: float = 0.0
+    min_similarity: float = 0.0,
+    fingerprints: Optional[Mapping[str, Fingerprint]] = None,
+    overlaps: Optional[Mapping[str, int]] = None,
+    scores: Optional[Mapping[str, float]] = None
 ) -> Iterator[Dict[str, Any]]:
     """
     Проверка на плагиат с прогрессом в реальном времени.
     Возвращает результаты по мере проверки каждого документа.
+    Если переданы отпечатки документов (fingerprints), тексты корпуса
+    не обрабатываются повторно - сравниваются готовые хэши n-грамм.
+    С overlaps (число общих n-грамм из инвертированного индекса) схожесть
+    считается только по размерам множеств, а scores (готовые оценки
+    внешнего движка, например MinHash) используются как есть.
     """
-    # Подготавливаем n-граммы один раз
-    sub_normalized = normalize(submission_text)
-    sub_tokens = tokenize(sub_normalized)
-    sub_ngrams = ngrams(sub_tokens, n)
+    # Хэши n-грамм submission считаются один раз, одним проходом по тексту
+    with stage_timer('text_hashes'):
+        sub_hashes = frozenset(stream_ngram_hashes(submission_text, n))
     
     total = len(documents)
     
     # Проверяем каждый документ
     for idx, doc in enumerate(documents):
-        doc_normalized = normalize(doc.text)
-        doc_tokens = tokenize(doc_normalized)
-        doc_ngrams = ngrams(doc_tokens, n)
-        
-        similarity = jaccard(sub_ngrams, doc_ngrams)
+        # Время сравнения с одним документом замеряется выборочно
+        with stage_timer('score_document', hot=True):
+            fp = fingerprints.get(doc.id) if fingerprints else None
+            if scores is not None and doc.id in scores:
+                similarity = scores[doc.id]
+            elif fp is not None and fp.n == n and overlaps is not None:
+                similarity = jaccard_from_counts(
+                    overlaps.get(doc.id, 0), len(sub_hashes), fp.unique_count
+                )
+            elif fp is not None and fp.n == n:
+                similarity = jaccard_hashes(sub_hashes, fp.hashes)
+            else:
+                similarity = jaccard_hashes(sub_hashes, frozenset(stream_ngram_hashes(doc.text, n)))
+        DOCUMENTS_SCANNED.inc()
         
         # Возвращаем только значимые результаты
         if similarity >= min_similarity:
@@ -0,0 +1,129 @@
+"""
+Разреженный движок матрицы схожести.
+Множества n-грамм кодируются как CSR-матрица инцидентности
+(строка - документ, столбец - n-грамма), и все пересечения
+считаются одним разреженным произведением A·Bᵀ.
+Объединения выводятся из размеров множеств: |a ∪ b| = |a| + |b| - |a ∩ b|.
+"""
+
+from array import array
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+from core.transforms import jaccard_from_counts
+
+# CSR: (indptr, indices) - столбцы строки i лежат в indices[indptr[i]:indptr[i + 1]]
+Csr = Tuple[array, array]
+
+
+def build_incidence(
+    rows: Sequence[Iterable[Hashable]],
+    vocabulary: Dict[Hashable, int] = None
+) -> Tuple[Csr, Dict[Hashable, int]]:
+    """
+    Построить CSR-матрицу инцидентности по множествам элементов.
+    Элементы (хэши или кортежи n-грамм) нумеруются через общий словарь
+    vocabulary, чтобы несколько матриц имели одни и те же столбцы.
+    """
+    vocabulary = {} if vocabulary is None else vocabulary
+    indptr = array('L', [0])
+    indices = array('L')
+
+    for items in rows:
+        columns = sorted({vocabulary.setdefault(item, len(vocabulary)) for item in items})
+        indices.extend(columns)
+        indptr.append(len(indices))
+
+    return (indptr, indices), vocabulary
+
+
+def _row_sizes(csr: Csr) -> Tuple[int, ...]:
+    indptr, _ = csr
+    return tuple(indptr[i + 1] - indptr[i] for i in range(len(indptr) - 1))
+
+
+def _transpose(csr: Csr, num_columns: int) -> Csr:
+    """CSR -> CSC: для каждого столбца - строки, в которых он встречается"""
+    indptr, indices = csr
+    counts = array('L', bytes(array('L').itemsize * (num_columns + 1)))
+    for column in indices:
+        counts[column + 1] += 1
+    for column in range(num_columns):
+        counts[column + 1] += counts[column]
+
+    rows_of = array('L', bytes(array('L').itemsize * len(indices)))
+    fill = array('L', counts)
+    for row in range(len(indptr) - 1):
+        for column in indices[indptr[row]:indptr[row + 1]]:
+            rows_of[fill[column]] = row
+            fill[column] += 1
+
+    return counts, rows_of
+
+
+def intersection_counts(a: Csr, b: Csr, num_columns: int) -> List[Dict[int, int]]:
+    """
+    Разреженное произведение A·Bᵀ: для каждой строки A - словарь
+    {строка B: число общих столбцов}. Нулевые пересечения не хранятся.
+    """
+    a_indptr, a_indices = a
+    b_colptr, b_rows = _transpose(b, num_columns)
+
+    result = []
+    for row in range(len(a_indptr) - 1):
+        counts: Dict[int, int] = {}
+        for column in a_indices[a_indptr[row]:a_indptr[row + 1]]:
+            for other in b_rows[b_colptr[column]:b_colptr[column + 1]]:
+                counts[other] = counts.get(other, 0) + 1
+        result.append(counts)
+    return result
+
+
+def _jaccard_matrix(a: Csr, b: Csr, num_columns: int) -> Tuple[Tuple[float, ...], ...]:
+    sizes_a = _row_sizes(a)
+    sizes_b = _row_sizes(b)
+    counts = intersection_counts(a, b, num_columns)
+
+    return tuple(
+        tuple(
+            jaccard_from_counts(row_counts.get(j, 0), size_a, size_b)
+            for j, size_b in enumerate(sizes_b)
+        )
+        for row_counts, size_a in zip(counts, sizes_a)
+    )
+
+
+def similarity_matrix(
+    rows_a: Sequence[Iterable[Hashable]],
+    rows_b: Sequence[Iterable[Hashable]]
+) -> Tuple[Tuple[float, ...], ...]:
+    """
+    Матрица Жаккара |rows_a| x |rows_b| одним разреженным произведением.
+
+    Пример:
+        matrix = similarity_matrix(sub_hash_sets, doc_hash_sets)
+        # ((0.15, 0.67), (0.0, 1.0))
+    """
+    a, vocabulary = build_incidence(rows_a)
+    b, vocabulary = build_incidence(rows_b, vocabulary)
+    return _jaccard_matrix(a, b, len(vocabulary))
+
+
+def pairwise_similarity_matrix(
+    rows: Sequence[Iterable[Hashable]]
+) -> Tuple[Tuple[float, ...], ...]:
+    """Симметричная матрица Жаккара всех пар (диагональ - 1.0)"""
+    a, vocabulary = build_incidence(rows)
+    return _jaccard_matrix(a, a, len(vocabulary))
+
+
+def similar_pairs(
+    matrix: Tuple[Tuple[float, ...], ...],
+    min_similarity: float = 0.0
+) -> Tuple[Tuple[int, int, float], ...]:
+    """Пары (i, j, схожесть) над диагональю симметричной матрицы, по убыванию"""
+    pairs = (
+        (i, j, matrix[i][j])
+        for i in range(len(matrix))
+        for j in range(i + 1, len(matrix))
+        if matrix[i][j] > 0.0 and matrix[i][j] >= min_similarity
+    )
+    return tuple(sorted(pairs, key=lambda pair: pair[2], reverse=True))
@@ -3,92 +3,200 @@
 Продвинутая рекурсия + мемоизация
 """
 
-from functools import lru_cache
-from typing import Tuple, Dict
-from core.domain import Document, Submission
-from core.transforms import normalize, tokenize, ngrams, jaccard
+import hashlib
+import heapq
+import sys
+import threading
+from collections import OrderedDict
+from typing import Tuple, Dict, Mapping, Optional
+from core.domain import Document, Submission, Fingerprint
+from core.transforms import (
+    text_hash_array,
+    jaccard_hashes,
+    jaccard_from_counts,
+    jaccard_upper_bound,
+    HashArray
+)
+from core.metrics import CANDIDATES_PRUNED, DOCUMENTS_SCANNED, stage_timer
+
+# Число лучших совпадений в ответе проверки
+TOP_MATCHES = 5
+
+# Кэш артефактов обработки текста: (хэш содержимого, n) -> (число токенов,
+# отсортированный массив хэшей n-грамм, число n-грамм). Каждый документ
+# корпуса нормализуется один раз и переиспользуется всеми проверками;
+# объём кэша ограничен в байтах.
+_artifacts: "OrderedDict[Tuple[str, int], Tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_limit = {"max_bytes": 64 * 1024 * 1024}
 
 # Глобальный кэш для статистики
-_cache_stats = {"hits": 0, "misses": 0, "size": 0}
+_cache_stats = {"hits": 0, "misses": 0, "size": 0, "bytes": 0}
+
+
+def _content_key(text: str, n: int) -> Tuple[str, int]:
+    """Ключ кэша: хэш содержимого вместо самого текста"""
+    digest = hashlib.blake2b((text or '').encode('utf-8'), digest_size=16).hexdigest()
+    return (digest, n)
+
+
+def _artifact_size(hashes: HashArray) -> int:
+    """Приблизительный объём артефактов в памяти"""
+    return sys.getsizeof(hashes) + sys.getsizeof(())
 
 
-@lru_cache(maxsize=1000)
-def _compare_texts_cached(text1: str, text2: str, n: int) -> float:
+def text_artifacts(text: str, n: int) -> Tuple[int, HashArray, int]:
     """
-    Кэшированное сравнение двух текстов.
-    Использует @lru_cache для автоматической мемоизации.
+    Получить (число токенов, отсортированный массив хэшей n-грамм,
+    число n-грамм) для текста.
+    Результат кэшируется по хэшу содержимого и n.
     
-    Args:
-        text1: Первый текст
-        text2: Второй текст
-        n: Размер n-грамм
-        
-    Returns:
-        Коэффициент схожести (0-1)
+    Example:
+        token_count, hashes, count = text_artifacts("Мама мыла раму", 2)
+        # token_count == 3, count == 2, len(hashes) == 2
     """
-    # Обновляем статистику
-    cache_info = _compare_texts_cached.cache_info()
-    _cache_stats["hits"] = cache_info.hits
-    _cache_stats["misses"] = cache_info.misses
-    _cache_stats["size"] = cache_info.currsize
+    key = _content_key(text, n)
+    with _cache_lock:
+        cached = _artifacts.get(key)
+        if cached is not None:
+            _artifacts.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return cached[:3]
+        _cache_stats["misses"] += 1
+    
+    # Нормализация, токенизация и хэши n-грамм - один проход по тексту
+    with stage_timer('text_hashes', hot=True):
+        token_count, hashes, ngram_count = text_hash_array(text, n)
+    size = _artifact_size(hashes)
     
-    # Выполняем сравнение
-    normalized1 = normalize(text1)
-    normalized2 = normalize(text2)
-    tokens1 = tokenize(normalized1)
-    tokens2 = tokenize(normalized2)
-    ngrams1 = ngrams(tokens1, n)
-    ngrams2 = ngrams(tokens2, n)
+    with _cache_lock:
+        if key not in _artifacts:
+            _artifacts[key] = (token_count, hashes, ngram_count, size)
+            _cache_stats["bytes"] += size
+        # Вытесняем самые старые записи, пока не уложимся в лимит
+        while _cache_stats["bytes"] > _cache_limit["max_bytes"] and len(_artifacts) > 1:
+            _, evicted = _artifacts.popitem(last=False)
+            _cache_stats["bytes"] -= evicted[3]
+        _cache_stats["size"] = len(_artifacts)
     
-    return jaccard(ngrams1, ngrams2)
+    return token_count, hashes, ngram_count
 
 
 def check_submission_cached(
     submission: Submission,
     documents: Tuple[Document, ...],
-    n: int = 3
+    n: int = 3,
+    fingerprints: Optional[Mapping[str, Fingerprint]] = None,
+    overlaps: Optional[Mapping[str, int]] = None,
+    scores: Optional[Mapping[str, float]] = None,
+    top_k: int = TOP_MATCHES
 ) -> Dict:
     """
     Проверка submission с использованием кэша.
     
+    Хранятся только top_k лучших документов (куча). Документы обходятся
+    по убыванию верхней границы схожести по размерам множеств n-грамм
+    (jaccard_upper_bound); как только граница опускается ниже top_k-й
+    оценки, остальные документы не могут попасть в ответ и пропускаются.
+    
     Args:
         submission: Проверяемый текст
         documents: База документов для сравнения
         n: Размер n-грамм
+        fingerprints: Готовые отпечатки документов (doc_id -> Fingerprint).
+            Для документов с отпечатком текст повторно не обрабатывается.
+        overlaps: Число общих n-грамм с документами из инвертированного
+            индекса (doc_id -> count). Вместе с fingerprints позволяет
+            посчитать точный Жаккар по размерам множеств, без самих хэшей.
+        scores: Готовые оценки схожести от внешнего движка (например,
+            MinHash); имеют приоритет над остальными способами.
+        top_k: Сколько лучших совпадений вернуть
         
     Returns:
         Словарь с результатами проверки
     """
-    results = []
+    # Статистика и хэши submission считаются один раз; множество хэшей
+    # проверяется по массивам документов без их копирования
+    token_count, sub_array, ngram_count = text_artifacts(submission.text, n)
+    sub_hashes = frozenset(sub_array)
+    sub_size = len(sub_hashes)
+    fingerprints_used = 0
     
-    # Сравниваем с каждым документом
-    for doc in documents:
-        similarity = _compare_texts_cached(submission.text, doc.text, n)
-        results.append({
-            'doc_id': doc.id,
-            'doc_title': doc.title,
-            'doc_author': doc.author,
-            'similarity': similarity
-        })
+    # Очередь обхода: (-верхняя граница, позиция документа, хэши документа).
+    # Для документов без отпечатка размер известен после обработки текста
+    # (из кэша при повторных проверках), остаётся только пересечение
+    queue = []
+    for position, doc in enumerate(documents):
+        fp = fingerprints.get(doc.id) if fingerprints else None
+        doc_hashes = None
+        if scores is not None and doc.id in scores:
+            bound = scores[doc.id]
+        elif fp is not None and fp.n == n:
+            bound = jaccard_upper_bound(sub_size, fp.unique_count)
+        else:
+            _, doc_hashes, _ = text_artifacts(doc.text, n)
+            bound = jaccard_upper_bound(sub_size, len(doc_hashes))
+        queue.append((-bound, position, doc_hashes))
+    heapq.heapify(queue)
+    
+    # Худший из лучших - в вершине: (схожесть, -позиция); при равной
+    # схожести выше документ, стоящий в корпусе раньше
+    top = []
+    top_k = max(1, top_k)
+    scored = 0
+    with stage_timer('scoring'):
+        while queue:
+            if len(top) >= top_k and -queue[0][0] < top[0][0]:
+                break
+            _, position, doc_hashes = heapq.heappop(queue)
+            doc = documents[position]
+            fp = fingerprints.get(doc.id) if fingerprints else None
+            if scores is not None and doc.id in scores:
+                similarity = scores[doc.id]
+            elif doc_hashes is not None:
+                similarity = jaccard_hashes(sub_hashes, doc_hashes)
+            elif overlaps is not None:
+                similarity = jaccard_from_counts(
+                    overlaps.get(doc.id, 0), sub_size, fp.unique_count
+                )
+                fingerprints_used += 1
+            else:
+                similarity = jaccard_hashes(sub_hashes, fp.hashes)
+                fingerprints_used += 1
+            scored += 1
+            entry = (similarity, -position)
+            if len(top) < top_k:
+                heapq.heappush(top, entry)
+            elif entry > top[0]:
+                heapq.heapreplace(top, entry)
+    
+    DOCUMENTS_SCANNED.inc(scored)
+    CANDIDATES_PRUNED.inc(len(queue), 'size_bound')
     
-    # Сортируем по убыванию схожести
-    results.sort(key=lambda x: x['similarity'], reverse=True)
+    # Сортируем лучшие по убыванию схожести
+    results = [
+        {
+            'doc_id': documents[-position].id,
+            'doc_title': documents[-position].title,
+            'doc_author': documents[-position].author,
+            'similarity': similarity
+        }
+        for similarity, position in sorted(top, key=lambda x: (-x[0], -x[1]))
+    ]
     
     # Находим максимальную схожесть
     max_similarity = results[0]['similarity'] if results else 0.0
     
-    # Статистика
-    tokens = tokenize(normalize(submission.text))
-    text_ngrams = ngrams(tokens, n)
-    
     return {
         'score': max_similarity,
-        'matches': results[:5],  # Топ-5 похожих
+        'matches': results,
         'stats': {
-            'tokens': len(tokens),
-            'ngrams': len(text_ngrams),
+            'tokens': token_count,
+            'ngrams': ngram_count,
             'documents_checked': len(documents),
+            'documents_scored': scored,
             'cache_used': True,
+            'fingerprints_used': fingerprints_used,
             **_cache_stats
         }
     }
@@ -96,20 +204,34 @@ def check_submission_cached(
 
 def clear_cache():
     """Очистить кэш"""
-    _compare_texts_cached.cache_clear()
-    _cache_stats["hits"] = 0
-    _cache_stats["misses"] = 0
-    _cache_stats["size"] = 0
+    with _cache_lock:
+        _artifacts.clear()
+        _cache_stats["hits"] = 0
+        _cache_stats["misses"] = 0
+        _cache_stats["size"] = 0
+        _cache_stats["bytes"] = 0
+
+
+def set_cache_limit(max_bytes: int) -> None:
+    """Установить лимит памяти кэша в байтах"""
+    with _cache_lock:
+        _cache_limit["max_bytes"] = max_bytes
+        while _cache_stats["bytes"] > max_bytes and _artifacts:
+            _, evicted = _artifacts.popitem(last=False)
+            _cache_stats["bytes"] -= evicted[3]
+        _cache_stats["size"] = len(_artifacts)
 
 
 def get_cache_stats() -> Dict:
     """Получить статистику кэша"""
-    cache_info = _compare_texts_cached.cache_info()
-    return {
-        "hits": cache_info.hits,
-        "misses": cache_info.misses,
-        "size": cache_info.currsize,
-        "maxsize": cache_info.maxsize,
-        "hit_rate": cache_info.hits / (cache_info.hits + cache_info.misses) 
-                    if (cache_info.hits + cache_info.misses) > 0 else 0
-    }
+    with _cache_lock:
+        hits = _cache_stats["hits"]
+        misses = _cache_stats["misses"]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": len(_artifacts),
+            "bytes": _cache_stats["bytes"],
+            "max_bytes": _cache_limit["max_bytes"],
+            "hit_rate": hits / (hits + misses) if (hits + misses) > 0 else 0
+        }
@@ -0,0 +1,277 @@
+"""
+Метрики в формате Prometheus.
+Счётчики и гистограммы пишут в шарды своего потока без блокировок;
+шарды складываются только при выдаче /metrics. Шард завершившегося
+потока сливается в общий итог, так что шардов не больше, чем живых потоков. Горячие этапы можно
+замерять выборочно: таймер с every=N засекает каждый N-й вызов
+в потоке, остальные вызовы почти ничего не стоят.
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм (секунды)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_name: Optional[str], label: Optional[str], extra: str = '') -> str:
+    parts = []
+    if label_name is not None:
+        parts.append(f'{label_name}="{_escape(label)}"')
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _ShardOwner:
+    """Держатель шарда в thread-local: по нему узнаём о завершении потока"""
+    __slots__ = ('__weakref__',)
+
+
+class _Sharded:
+    """Метрика с шардом на поток: {значение метки: данные}"""
+
+    def __init__(self, name: str, help_text: str, label_name: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.label_name = label_name
+        self._local = threading.local()
+        self._shards: Dict[int, Dict] = {}
+        self._retired: Dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard)
+        return shard
+
+    def _retire(self, shard: Dict) -> None:
+        """Слить шард завершившегося потока в общий итог"""
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            self._merge(self._retired, shard)
+
+    def _merge(self, totals: Dict, shard: Dict) -> None:
+        raise NotImplementedError
+
+    def _snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [dict(self._retired)] + [dict(shard) for shard in self._shards.values()]
+
+
+class Counter(_Sharded):
+    """Монотонный счётчик"""
+
+    def inc(self, amount: float = 1, label: str = None) -> None:
+        shard = self._shard()
+        shard[label] = shard.get(label, 0) + amount
+
+    def _merge(self, totals: Dict, shard: Dict) -> None:
+        for label, value in shard.items():
+            totals[label] = totals.get(label, 0) + value
+
+    def values(self) -> Dict[Optional[str], float]:
+        totals: Dict[Optional[str], float] = {}
+        for shard in self._snapshot():
+            self._merge(totals, shard)
+        return totals
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label, value in sorted(self.values().items(), key=lambda item: str(item[0])):
+            lines.append(f'{self.name}{_format_labels(self.label_name, label)} {value}')
+        return lines
+
+
+class Histogram(_Sharded):
+    """Гистограмма длительностей"""
+
+    def __init__(self, name: str, help_text: str, label_name: Optional[str] = None,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_name)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, label: str = None) -> None:
+        shard = self._shard()
+        data = shard.get(label)
+        if data is None:
+            # [счётчики корзин (последняя - +Inf), сумма, количество]
+            data = shard[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        data[0][bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    def time(self, label: str = None, every: int = 1) -> '_Timer':
+        """Таймер-контекст; every=N - замерять каждый N-й вызов в потоке"""
+        return _Timer(self, label, every)
+
+    def _merge(self, totals: Dict, shard: Dict) -> None:
+        for label, (counts, total, count) in shard.items():
+            acc = totals.get(label)
+            acc = [[0] * (len(self.buckets) + 1), 0.0, 0] if acc is None else list(acc)
+            acc[0] = [a + b for a, b in zip(acc[0], counts)]
+            acc[1] += total
+            acc[2] += count
+            totals[label] = acc
+
+    def values(self) -> Dict[Optional[str], Tuple[List[int], float, int]]:
+        totals: Dict[Optional[str], list] = {}
+        for shard in self._snapshot():
+            self._merge(totals, shard)
+        return {label: (acc[0], acc[1], acc[2]) for label, acc in totals.items()}
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label, (counts, total, count) in sorted(self.values().items(), key=lambda item: str(item[0])):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.label_name, label, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_name, label)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label', 'every', 'started')
+
+    def __init__(self, histogram: Histogram, label: Optional[str], every: int):
+        self.histogram = histogram
+        self.label = label
+        self.every = every
+        self.started = None
+
+    def __enter__(self):
+        if self.every > 1:
+            local = self.histogram._local
+            calls = getattr(local, 'calls', 0) + 1
+            local.calls = calls
+            if calls % self.every:
+                return self
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            self.histogram.observe(time.perf_counter() - self.started, self.label)
+        return False
+
+
+class Gauge:
+    """Значение, которое считается функцией в момент выдачи"""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float], kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', f'{self.name} {value}']
+
+
+class Registry:
+    """Набор метрик приложения"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, label_name: str = None) -> Counter:
+        return self._register(Counter(name, help_text, label_name))
+
+    def histogram(self, name: str, help_text: str, label_name: str = None,
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_name, buckets))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float], kind: str = 'gauge') -> Gauge:
+        """Метрика по функции; kind='counter' - для монотонных значений"""
+        with self._lock:
+            gauge = Gauge(name, help_text, fn, kind)
+            self._metrics[name] = gauge
+            return gauge
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Глобальный реестр и метрики конвейера проверки
+registry = Registry()
+
+# Горячие этапы (обработка каждого текста) замеряются выборочно
+HOT_STAGE_SAMPLE_EVERY = 1
+
+CHECK_STAGE_SECONDS = registry.histogram(
+    'plagiarism_check_stage_seconds',
+    'Длительность этапов проверки на плагиат',
+    label_name='stage'
+)
+DOCUMENTS_SCANNED = registry.counter(
+    'plagiarism_documents_scanned_total',
+    'Документы, с которыми сравнивался текст'
+)
+CANDIDATES_PRUNED = registry.counter(
+    'plagiarism_candidates_pruned_total',
+    'Документы корпуса, отсеянные индексом до сравнения',
+    label_name='engine'
+)
+EVENT_HANDLER_SECONDS = registry.histogram(
+    'plagiarism_event_handler_seconds',
+    'Время обработчиков шины событий',
+    label_name='event'
+)
+
+
+def stage_timer(stage: str, hot: bool = False) -> _Timer:
+    """Таймер этапа проверки; hot=True - выборочный замер"""
+    return CHECK_STAGE_SECONDS.time(stage, HOT_STAGE_SAMPLE_EVERY if hot else 1)
+
+
+def timed(stage: str, hot: bool = False) -> Callable:
+    """Декоратор: замерять вызовы функции как этап проверки"""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage, hot):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_hot_stage_sampling(every: int) -> None:
+    """Замерять каждый every-й вызов горячих этапов"""
+    global HOT_STAGE_SAMPLE_EVERY
+    HOT_STAGE_SAMPLE_EVERY = max(1, int(every))
@@ -0,0 +1,173 @@
+"""
+Многопроцессный движок оценки схожести.
+Корпус делится на чанки, которые считаются в пуле процессов в обход GIL.
+Каждый рабочий процесс держит отпечатки документов в памяти между
+запросами (отсортированные массивы хэшей, 8 байт на n-грамму) и догружает
+из БД только те, которых у него ещё нет.
+"""
+
+import multiprocessing
+import sqlite3
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, Tuple
+from core.domain import Document
+from core.index import load_fingerprints
+from core.lazy import batch_process
+from core.transforms import text_hash_array, jaccard_hashes, Hashes, HashArray
+
+# Состояние рабочего процесса: путь к БД и тёплый кэш отпечатков
+_worker_state: Dict[str, Any] = {
+    'db_path': None,
+    'max_cached': 0,
+    'fingerprints': OrderedDict(),  # (doc_id, n) -> hashes
+}
+
+
+def _init_worker(db_path: str, max_cached: int) -> None:
+    """Инициализация рабочего процесса"""
+    _worker_state['db_path'] = db_path
+    _worker_state['max_cached'] = max_cached
+    _worker_state['fingerprints'] = OrderedDict()
+
+
+def _warm_fingerprints(n: int, doc_ids: Tuple[str, ...]) -> Dict[str, HashArray]:
+    """Отпечатки чанка: из кэша процесса, недостающие - из БД"""
+    cache = _worker_state['fingerprints']
+    missing = tuple(doc_id for doc_id in doc_ids if (doc_id, n) not in cache)
+
+    if missing:
+        conn = sqlite3.connect(_worker_state['db_path'])
+        try:
+            loaded = load_fingerprints(conn, n, doc_ids=missing)
+        finally:
+            conn.close()
+        for doc_id, fp in loaded.items():
+            cache[(doc_id, n)] = fp.hashes
+        while len(cache) > _worker_state['max_cached']:
+            cache.popitem(last=False)
+
+    return {
+        doc_id: cache[(doc_id, n)]
+        for doc_id in doc_ids
+        if (doc_id, n) in cache
+    }
+
+
+def _score_chunk(
+    n: int,
+    sub_hashes: Hashes,
+    doc_ids: Tuple[str, ...]
+) -> Tuple[Tuple[str, float], ...]:
+    """Посчитать схожесть submission с документами чанка (в рабочем процессе)"""
+    hashes = _warm_fingerprints(n, doc_ids)
+    probe = frozenset(sub_hashes)
+    empty = array('Q')
+    return tuple(
+        (doc_id, jaccard_hashes(probe, hashes.get(doc_id, empty)))
+        for doc_id in doc_ids
+    )
+
+
+class ScoringPool:
+    """
+    Пул процессов для оценки схожести по отпечаткам из БД.
+
+    Example:
+        pool = ScoringPool('plagiarism.db', workers=4, chunk_size=500)
+        for chunk in pool.score(sub_hashes, doc_ids, n=3):
+            ...  # ((doc_id, similarity), ...)
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int = 4,
+        chunk_size: int = 500,
+        max_cached: int = 100000
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        # spawn: не форкаем многопоточный веб-сервер
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(db_path, max_cached)
+        )
+
+    def score(
+        self,
+        sub_hashes: Hashes,
+        doc_ids: Tuple[str, ...],
+        n: int = 3,
+        ordered: bool = True
+    ) -> Iterator[Tuple[Tuple[str, float], ...]]:
+        """
+        Разбить документы на чанки и посчитать их в пуле.
+        ordered=True - чанки возвращаются в исходном порядке,
+        ordered=False - по мере готовности.
+        """
+        futures = [
+            self._executor.submit(_score_chunk, n, sub_hashes, chunk)
+            for chunk in batch_process(tuple(doc_ids), self.chunk_size)
+        ]
+        if ordered:
+            for future in futures:
+                yield future.result()
+        else:
+            for future in as_completed(futures):
+                yield future.result()
+
+    def score_all(
+        self,
+        sub_hashes: Hashes,
+        doc_ids: Tuple[str, ...],
+        n: int = 3
+    ) -> Dict[str, float]:
+        """Схожесть со всеми документами одним словарём"""
+        return {
+            doc_id: similarity
+            for chunk in self.score(sub_hashes, doc_ids, n, ordered=False)
+            for doc_id, similarity in chunk
+        }
+
+    def shutdown(self) -> None:
+        """Остановить рабочие процессы"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parallel_progressive_check(
+    pool: ScoringPool,
+    submission_text: str,
+    documents: Tuple[Document, ...],
+    n: int = 3,
+    min_similarity: float = 0.0,
+    ordered: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """
+    Аналог core.lazy.progressive_check на пуле процессов.
+    Результаты отдаются по мере готовности чанков; при ordered=False
+    порядок документов не сохраняется, и каждый результат помечен
+    флагом 'ordered': False.
+    """
+    _, sub_hashes, _ = text_hash_array(submission_text, n)
+    by_id = {doc.id: doc for doc in documents}
+    total = len(documents)
+    done = 0
+
+    for chunk in pool.score(sub_hashes, tuple(by_id), n, ordered):
+        for doc_id, similarity in chunk:
+            done += 1
+            if similarity < min_similarity:
+                continue
+            doc = by_id[doc_id]
+            yield {
+                'doc_id': doc.id,
+                'doc_title': doc.title,
+                'doc_author': doc.author,
+                'similarity': similarity,
+                'progress': round(done / total * 100, 1),
+                'ordered': ordered
+            }
@@ -3,19 +3,20 @@
 Лямбда и замыкания + рекурсия
 Использование композиции функций
 """
-from typing import Any, Iterable, Tuple
+from typing import Any, Callable, Iterable, Mapping, Optional, Sequence, Tuple
 from core.domain import Document, Submission
-from core.transforms import normalize, tokenize, ngrams, jaccard
-from core.compose import text_processing_pipeline
+from core.transforms import normalize, tokenize, ngram_hash_array, jaccard_hashes, HashArray
+from core.compose import pipe
+from core.matrix import similarity_matrix
 
 
-def _text_to_ngrams(text: str, n: int = 3) -> Tuple[Tuple[str, ...], ...]:
+def _text_to_ngrams(text: str, n: int = 3) -> HashArray:
     """
-    Вспомогательная функция: преобразует текст в n-граммы через пайплайн.
+    Вспомогательная функция: преобразует текст в отсортированный массив
+    хэшей n-грамм через пайплайн.
     Использует композицию
     """
-    _, _, grams = text_processing_pipeline(text, n)
-    return grams
+    return pipe(normalize, tokenize, lambda tokens: ngram_hash_array(tokens, n))(text)
 
 
 def compare_submissions_recursive(
@@ -46,7 +47,7 @@ def compare_submissions_recursive(
     current_sub = subs[idx]
     
     # Используем композицию вместо трех отдельных вызовов
-    sub_ngrams = _text_to_ngrams(current_sub.text, n)
+    sub_ngrams = frozenset(_text_to_ngrams(current_sub.text, n))
     
     # Найти максимальную схожесть с документами
     max_similarity = _find_max_similarity_recursive(
@@ -96,7 +97,7 @@ def _find_max_similarity_recursive(
     # Используем композицию
     doc_ngrams = _text_to_ngrams(doc.text, n)
     
-    similarity = jaccard(sub_ngrams, doc_ngrams)
+    similarity = jaccard_hashes(sub_ngrams, doc_ngrams)
     new_max = max(current_max, similarity)
     
     # Продолжить рекурсию со следующим документом
@@ -115,12 +116,17 @@ def tree_walk_documents(
     root: int = 0,
     visited: Tuple[str, ...] = None,
     depth: int = 0,
-    max_depth: int = 5
+    max_depth: int = 5,
+    neighbours: Optional[Mapping[str, Sequence[Tuple[str, float]]]] = None
 ) -> Tuple[str, ...]:
     """
     Рекурсивный обход "дерева" документов.
     Имитирует обход по связям между документами (по похожим темам).
     
+    neighbours - готовый граф соседей {id: ((id соседа, схожесть), ...)}
+    (core.knn): следующий документ берётся из списка соседей, без
+    сравнения текущего документа со всем корпусом на каждом шаге.
+    
     Использует: рекурсия, композиция
     
     Пример:
@@ -130,6 +136,15 @@ def tree_walk_documents(
     if visited is None:
         visited = tuple()
     
+    if neighbours is not None:
+        if depth >= max_depth or root >= len(docs):
+            return visited
+        known = frozenset(doc.id for doc in docs)
+        return walk_neighbours(
+            lambda doc_id: tuple(pair for pair in neighbours.get(doc_id, ()) if pair[0] in known),
+            docs[root].id, max_depth, visited, depth
+        )
+    
     # Базовые случаи
     if depth >= max_depth:
         return visited
@@ -158,6 +173,32 @@ def tree_walk_documents(
     return new_visited
 
 
+def walk_neighbours(
+    neighbours: Callable[[str], Sequence[Tuple[str, float]]],
+    start: str,
+    max_depth: int = 5,
+    visited: Tuple[str, ...] = (),
+    depth: int = 0
+) -> Tuple[str, ...]:
+    """
+    Рекурсивный обход графа соседей: из каждого документа - в самого
+    похожего непосещённого соседа. neighbours(id) возвращает соседей
+    по убыванию схожести (например, core.knn.neighbours_lookup).
+    
+    Пример:
+        path = walk_neighbours(neighbours_lookup(conn), '12', max_depth=5)
+        # ('12', '40', '7', ...)
+    """
+    if depth >= max_depth:
+        return visited
+    
+    path = visited + (start,)
+    next_id = next((other for other, _ in neighbours(start) if other not in path), None)
+    if next_id is None:
+        return path
+    return walk_neighbours(neighbours, next_id, max_depth, path, depth + 1)
+
+
 def _find_most_similar_doc(
     current: Document,
     docs: Tuple[Document, ...],
@@ -167,7 +208,7 @@ def _find_most_similar_doc(
     Найти индекс наиболее похожего непосещенного документа.
     Использует композицию для обработки текста.
     """
-    current_ngrams = _text_to_ngrams(current.text, 3)
+    current_ngrams = frozenset(_text_to_ngrams(current.text, 3))
     
     best_idx = None
     best_similarity = 0.0
@@ -178,7 +219,7 @@ def _find_most_similar_doc(
             continue
         
         doc_ngrams = _text_to_ngrams(doc.text, 3)
-        similarity = jaccard(current_ngrams, doc_ngrams)
+        similarity = jaccard_hashes(current_ngrams, doc_ngrams)
         
         if similarity > best_similarity:
             best_similarity = similarity
@@ -246,19 +287,16 @@ def calculate_similarity_matrix_recursive(
     acc: Tuple[Tuple[float, ...], ...] = ()
 ) -> Tuple[Tuple[float, ...], ...]:
     """
-    Рекурсивно строит матрицу схожести |subs| x |docs| по Жаккару.
-    Для каждой submission считает схожесть со всеми документами.
+    Строит матрицу схожести |subs| x |docs| по Жаккару.
+    N-граммы каждого текста считаются один раз, все пересечения -
+    одним разреженным произведением (core.matrix).
+    s_idx и acc сохранены для совместимости: строки начиная с s_idx
+    дописываются к acc.
     """
-    # базовый случай
     if s_idx >= len(subs):
         return acc
 
-    sub = subs[s_idx]
-    sub_ngrams = _text_to_ngrams(sub.text, n)
-
-    row: Tuple[float, ...] = ()
-    for d in docs:
-        doc_ngrams = _text_to_ngrams(d.text, n)
-        row = row + (jaccard(sub_ngrams, doc_ngrams),)
+    sub_ngrams = tuple(_text_to_ngrams(sub.text, n) for sub in subs[s_idx:])
+    doc_ngrams = tuple(_text_to_ngrams(d.text, n) for d in docs)
 
-    return calculate_similarity_matrix_recursive(subs, docs, n, s_idx + 1, acc + (row,))
+    return acc + similarity_matrix(sub_ngrams, doc_ngrams)
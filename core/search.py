@@ -0,0 +1,169 @@
+"""
+Полнотекстовый поиск документов на SQLite FTS5.
+Виртуальная таблица documents_fts хранит название, автора и текст
+документа (rowid = id документа) и пополняется при загрузке.
+Кандидаты отбираются по BM25 с весами полей, как в
+core.lazy.search_documents: название 0.5, автор 0.3, текст 0.2;
+релевантность считается по той же шкале. Сниппеты строит сам SQLite.
+
+Если сборка SQLite без FTS5, таблица не создаётся, и вызывающий код
+возвращается к полному перебору (core.lazy.search_documents).
+"""
+
+import re
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+# Веса полей (title, author, text) для bm25() и релевантности
+FIELD_WEIGHTS: Tuple[float, float, float] = (0.5, 0.3, 0.2)
+
+# Число токенов в сниппете текста
+SNIPPET_TOKENS = 24
+
+_WORD = re.compile(r'\w+')
+
+
+def init_search_schema(conn: sqlite3.Connection) -> bool:
+    """
+    Создать таблицу FTS5 и проиндексировать документы, которых в ней нет.
+    Возвращает False, если FTS5 недоступен.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts
+            USING fts5(title, author, text, tokenize = 'unicode61')
+        ''')
+    except sqlite3.OperationalError:
+        return False
+
+    conn.execute('''
+        INSERT INTO documents_fts (rowid, title, author, text)
+        SELECT d.id, d.title, u.full_name, d.text
+        FROM documents d
+        JOIN users u ON d.user_id = u.id
+        WHERE d.id NOT IN (SELECT rowid FROM documents_fts)
+    ''')
+    conn.commit()
+    return True
+
+
+def search_enabled(conn: sqlite3.Connection) -> bool:
+    """Есть ли таблица полнотекстового индекса"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'"
+    ).fetchone() is not None
+
+
+def index_document_search(conn: sqlite3.Connection, doc_id: int) -> None:
+    """Добавить документ в полнотекстовый индекс (без commit)"""
+    if not search_enabled(conn):
+        return
+    conn.execute('''
+        INSERT OR REPLACE INTO documents_fts (rowid, title, author, text)
+        SELECT d.id, d.title, u.full_name, d.text
+        FROM documents d
+        JOIN users u ON d.user_id = u.id
+        WHERE d.id = ?
+    ''', (doc_id,))
+
+
+def query_words(query: str) -> Tuple[str, ...]:
+    """Слова запроса без повторов; спецсимволы синтаксиса FTS5 отбрасываются"""
+    return tuple(dict.fromkeys(_WORD.findall(query.lower())))
+
+
+def build_match_query(words: Tuple[str, ...], column: str = None, op: str = 'OR') -> str:
+    """Запрос MATCH: слова как префиксы, при column - только в этом поле"""
+    expression = f' {op} '.join(f'"{word}"*' for word in words)
+    return f'{column} : ({expression})' if column else expression
+
+
+def _matching_ids(conn: sqlite3.Connection, match: str, doc_ids: Tuple[int, ...]) -> set:
+    placeholders = ','.join('?' * len(doc_ids))
+    return {
+        row[0] for row in conn.execute(
+            f'SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? AND rowid IN ({placeholders})',
+            (match,) + doc_ids
+        )
+    }
+
+
+def field_relevance(
+    conn: sqlite3.Connection,
+    words: Tuple[str, ...],
+    doc_ids: Tuple[int, ...]
+) -> Dict[int, float]:
+    """
+    Релевантность по шкале core.lazy.search_documents: 0.5 за все слова
+    в названии, 0.3 - в авторе, 0.2 * доля слов, найденных в тексте.
+    Считается точечными запросами к индексу только для найденных документов.
+    """
+    title_weight, author_weight, text_weight = FIELD_WEIGHTS
+    relevance = dict.fromkeys(doc_ids, 0.0)
+
+    for doc_id in _matching_ids(conn, build_match_query(words, 'title', 'AND'), doc_ids):
+        relevance[doc_id] += title_weight
+    for doc_id in _matching_ids(conn, build_match_query(words, 'author', 'AND'), doc_ids):
+        relevance[doc_id] += author_weight
+    for word in words:
+        for doc_id in _matching_ids(conn, build_match_query((word,), 'text'), doc_ids):
+            relevance[doc_id] += text_weight / len(words)
+
+    return relevance
+
+
+def search_fts(
+    conn: sqlite3.Connection,
+    query: str,
+    user_id: Optional[int] = None,
+    limit: int = 50
+) -> Tuple[Dict[str, Any], ...]:
+    """
+    Найти документы по запросу.
+    Кандидаты отбираются индексом по BM25 с весами полей, затем
+    упорядочиваются по релевантности (шкала search_documents), BM25 -
+    при равной релевантности. user_id ограничивает поиск документами
+    пользователя.
+
+    Возвращает кортеж словарей: id, title, author, created_at,
+    snippet и relevance.
+    """
+    words = query_words(query)
+    if not words:
+        return ()
+
+    user_filter = 'AND d.user_id = ?' if user_id is not None else ''
+    params = (build_match_query(words),) + ((user_id,) if user_id is not None else ()) + (limit,)
+
+    rows = conn.execute(f'''
+        SELECT
+            d.id,
+            d.title,
+            d.created_at,
+            documents_fts.author,
+            snippet(documents_fts, 2, '', '', '...', {SNIPPET_TOKENS}) AS snippet,
+            bm25(documents_fts, {', '.join(map(str, FIELD_WEIGHTS))}) AS rank
+        FROM documents_fts
+        JOIN documents d ON d.id = documents_fts.rowid
+        WHERE documents_fts MATCH ? {user_filter}
+        ORDER BY rank
+        LIMIT ?
+    ''', params).fetchall()
+
+    if not rows:
+        return ()
+
+    relevance = field_relevance(conn, words, tuple(row[0] for row in rows))
+    ranked = sorted(rows, key=lambda row: (-relevance[row[0]], row[5]))
+
+    return tuple(
+        {
+            'id': str(row[0]),
+            'title': row[1],
+            'created_at': row[2],
+            'author': row[3],
+            'snippet': row[4],
+            'relevance': round(relevance[row[0]], 4)
+        }
+        for row in ranked
+    )
@@ -1,15 +1,50 @@
 import re
 import string
-from typing import Tuple
-from functools import reduce
+import hashlib
+import random
+from bisect import bisect_left
+from array import array
+from collections import deque
+from typing import Iterable, Iterator, Sequence, Tuple, FrozenSet, Union
+from functools import reduce, lru_cache
+
+# Хэши n-грамм хранятся в БД, поэтому они должны быть стабильны между
+# процессами (встроенный hash() для строк рандомизирован).
+HASH_MASK = (1 << 63) - 1
+HASH_BASE = 1099511628211
+
+# Простое Мерсенна для универсального хэширования в MinHash
+MINHASH_PRIME = (1 << 61) - 1
+
+# Внутреннее представление n-грамм текста - отсортированный массив
+# уникальных 64-битных хэшей (8 байт на n-грамму вместо кортежа строк
+# в множестве). Для многократных сравнений одного текста (проверяемого)
+# с многими массивами он переводится в frozenset один раз.
+HashArray = array
+Hashes = Union[HashArray, FrozenSet[int]]
+
+# Текст документа в корпусе - последовательность id токенов словаря
+# (core.vocab), упакованная в массив int32
+TokenIds = array
+
+# Таблица удаления пунктуации строится один раз, а не на каждый вызов
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+_WHITESPACE = re.compile(r'\s+')
+
+# Размер куска текста (в символах) для потоковой токенизации
+TOKEN_CHUNK_CHARS = 4096
+
+# Во сколько раз больший массив должен быть длиннее меньшего, чтобы
+# пересечение считалось бинарным поиском, а не через множество
+GALLOP_RATIO = 64
 
 
 def normalize(text: str) -> str:
     if not text:
         return ""
     result = text.lower()
-    result = result.translate(str.maketrans('', '', string.punctuation))
-    result = re.sub(r'\s+', ' ', result).strip()
+    result = result.translate(_PUNCTUATION_TABLE)
+    result = _WHITESPACE.sub(' ', result).strip()
     return result
 
 
@@ -47,3 +82,244 @@ def jaccard(a: Tuple[str, ...], b: Tuple[str, ...]) -> float:
 
     union_count = len(set_a | set_b)
     return intersection_count / union_count if union_count > 0 else 0.0
+
+
+@lru_cache(maxsize=65536)
+def hash_token(token: str) -> int:
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') & HASH_MASK
+
+
+def hash_ngram(gram: Tuple[str, ...]) -> int:
+    return reduce(
+        lambda acc, token: (acc * HASH_BASE + hash_token(token)) & HASH_MASK,
+        gram,
+        0
+    )
+
+
+def ngram_hashes(tokens: Tuple[str, ...], n: int = 3) -> FrozenSet[int]:
+    return frozenset(rolling_ngram_hashes(tokens, n))
+
+
+def ngram_hash_array(tokens: Tuple[str, ...], n: int = 3) -> HashArray:
+    return array('Q', sorted(set(rolling_ngram_hashes(tokens, n))))
+
+
+def hash_array(hashes: Iterable[int]) -> HashArray:
+    return array('Q', sorted(set(hashes)))
+
+
+def intersection_size(a: Hashes, b: Hashes) -> int:
+    # Множество проверяется по элементам массива на C-уровне; два массива:
+    # при сильной разнице длин - бинарный поиск по большему (он отсортирован),
+    # иначе меньший переводится во множество
+    if isinstance(a, (set, frozenset)):
+        return len(a.intersection(b))
+    if isinstance(b, (set, frozenset)):
+        return len(b.intersection(a))
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return 0
+    if len(b) < GALLOP_RATIO * len(a):
+        return len(set(a).intersection(b))
+    count = 0
+    lo = 0
+    size = len(b)
+    for h in a:
+        lo = bisect_left(b, h, lo)
+        if lo == size:
+            break
+        if b[lo] == h:
+            count += 1
+            lo += 1
+    return count
+
+
+def jaccard_hashes(a: Hashes, b: Hashes) -> float:
+    return jaccard_from_counts(intersection_size(a, b), len(a), len(b))
+
+
+def jaccard_from_counts(intersection: int, size_a: int, size_b: int) -> float:
+    if size_a == 0 and size_b == 0:
+        return 1.0
+    if size_a == 0 or size_b == 0:
+        return 0.0
+    return intersection / (size_a + size_b - intersection)
+
+
+def jaccard_upper_bound(size_a: int, size_b: int) -> float:
+    # J(A, B) <= min(|A|, |B|) / max(|A|, |B|): пересечение не больше
+    # меньшего множества, объединение не меньше большего. Граница
+    # достигается (A вложено в B) и согласована с jaccard_from_counts
+    if size_a == 0 and size_b == 0:
+        return 1.0
+    return min(size_a, size_b) / max(size_a, size_b)
+
+
+@lru_cache(maxsize=16)
+def minhash_permutations(num_perm: int, seed: int = 1) -> Tuple[Tuple[int, int], ...]:
+    rng = random.Random(seed)
+    return tuple(
+        (rng.randrange(1, MINHASH_PRIME), rng.randrange(0, MINHASH_PRIME))
+        for _ in range(num_perm)
+    )
+
+
+def minhash_signature(hashes: Hashes, num_perm: int = 128, seed: int = 1) -> Tuple[int, ...]:
+    if not hashes:
+        return (MINHASH_PRIME,) * num_perm
+    values = tuple(h % MINHASH_PRIME for h in hashes)
+    return tuple(
+        min((a * v + b) % MINHASH_PRIME for v in values)
+        for a, b in minhash_permutations(num_perm, seed)
+    )
+
+
+def minhash_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def lsh_bands(signature: Tuple[int, ...], bands: int, rows: int) -> Tuple[int, ...]:
+    if bands * rows > len(signature):
+        raise ValueError("bands * rows больше длины сигнатуры")
+    return tuple(
+        int.from_bytes(
+            hashlib.blake2b(
+                array('Q', signature[i * rows:(i + 1) * rows]).tobytes(),
+                digest_size=8
+            ).digest(),
+            'little'
+        ) & HASH_MASK
+        for i in range(bands)
+    )
+
+
+def iter_tokens(text: str, chunk_size: int = TOKEN_CHUNK_CHARS) -> Iterator[str]:
+    # Токены tokenize(normalize(text)) за один проход: текст читается кусками
+    # не длиннее chunk_size (плюс хвост слова), поэтому дополнительная память
+    # не зависит от длины текста. Куски режутся только по пробельным символам:
+    # lower() учитывает соседние буквы (конечная сигма), но не через пробел
+    if not text:
+        return
+    length = len(text)
+    pos = 0
+    while pos < length:
+        end = pos + chunk_size
+        if end < length:
+            boundary = _WHITESPACE.search(text, end)
+            end = boundary.start() if boundary else length
+        yield from text[pos:end].lower().translate(_PUNCTUATION_TABLE).split()
+        pos = end
+
+
+def iter_ngram_hashes(tokens: Iterable[str], n: int = 3) -> Iterator[int]:
+    # Скользящий хэш n-грамм потока токенов: в памяти только окно из n хэшей.
+    # Значения совпадают с hash_ngram и rolling_ngram_hashes
+    return _roll_hashes(map(hash_token, tokens), n)
+
+
+def _roll_hashes(token_hashes: Iterable[int], n: int) -> Iterator[int]:
+    top = pow(HASH_BASE, n - 1, HASH_MASK + 1)
+    window = deque(maxlen=n)
+    current = 0
+    for h in token_hashes:
+        if len(window) == n:
+            current -= window[0] * top
+        window.append(h)
+        current = (current * HASH_BASE + h) & HASH_MASK
+        if len(window) == n:
+            yield current
+
+
+def stream_ngram_hashes(text: str, n: int = 3) -> Iterator[int]:
+    return iter_ngram_hashes(iter_tokens(text), n)
+
+
+def text_hash_array(text: str, n: int = 3) -> Tuple[int, HashArray, int]:
+    # Один проход по тексту: (число токенов, отсортированный массив
+    # уникальных хэшей n-грамм, число n-грамм с повторами)
+    return _hash_array(map(hash_token, iter_tokens(text)), n)
+
+
+def _hash_array(token_hashes: Iterable[int], n: int) -> Tuple[int, HashArray, int]:
+    top = pow(HASH_BASE, n - 1, HASH_MASK + 1)
+    window = deque(maxlen=n)
+    unique = set()
+    current = 0
+    token_count = 0
+    for h in token_hashes:
+        token_count += 1
+        if token_count > n:
+            current -= window[0] * top
+        window.append(h)
+        current = (current * HASH_BASE + h) & HASH_MASK
+        if token_count >= n:
+            unique.add(current)
+    return token_count, array('Q', sorted(unique)), max(token_count - n + 1, 0)
+
+
+def id_ngram_hashes(token_ids: Iterable[int], token_hashes: Sequence[int], n: int = 3) -> Iterator[int]:
+    # Хэши n-грамм по последовательности id токенов словаря:
+    # token_hashes[id] == hash_token(токен), поэтому значения совпадают
+    # с хэшами по тексту, а текст не токенизируется заново для каждого n
+    return _roll_hashes(map(token_hashes.__getitem__, token_ids), n)
+
+
+def id_hash_array(token_ids: Iterable[int], token_hashes: Sequence[int], n: int = 3) -> Tuple[int, HashArray, int]:
+    # То же, что text_hash_array, но по id токенов
+    return _hash_array(map(token_hashes.__getitem__, token_ids), n)
+
+
+def rolling_ngram_hashes(tokens: Tuple[str, ...], k: int = 3) -> Tuple[int, ...]:
+    if len(tokens) < k:
+        return tuple()
+    token_hashes = tuple(map(hash_token, tokens))
+    top = pow(HASH_BASE, k - 1, HASH_MASK + 1)
+    current = reduce(lambda acc, h: (acc * HASH_BASE + h) & HASH_MASK, token_hashes[:k], 0)
+    result = [current]
+    for i in range(k, len(token_hashes)):
+        current = ((current - token_hashes[i - k] * top) * HASH_BASE + token_hashes[i]) & HASH_MASK
+        result.append(current)
+    return tuple(result)
+
+
+def winnow(hashes: Tuple[int, ...], window: int = 4) -> Tuple[Tuple[int, int], ...]:
+    if not hashes:
+        return tuple()
+    if len(hashes) <= window:
+        smallest = min(hashes)
+        return ((smallest, len(hashes) - 1 - hashes[::-1].index(smallest)),)
+    selected = []
+    last_pos = -1
+    for start in range(len(hashes) - window + 1):
+        frame = hashes[start:start + window]
+        smallest = min(frame)
+        # при равенстве берётся самый правый минимум (robust winnowing)
+        pos = start + window - 1 - frame[::-1].index(smallest)
+        if pos != last_pos:
+            selected.append((smallest, pos))
+            last_pos = pos
+    return tuple(selected)
+
+
+def match_regions(
+    pairs: Tuple[Tuple[int, int], ...],
+    k: int,
+    window: int
+) -> Tuple[Tuple[int, int, int, int], ...]:
+    # pairs: (позиция в первом тексте, позиция во втором) совпавших k-грамм.
+    # Соседние совпадения на одной диагонали склеиваются в один регион
+    # (разрыв до window позиций допустим - winnowing оставляет пропуски).
+    regions = []
+    for a_pos, b_pos in sorted(pairs, key=lambda p: (p[1] - p[0], p[0])):
+        if regions:
+            a_start, a_end, b_start, b_end = regions[-1]
+            if b_pos - a_pos == b_start - a_start and a_pos <= a_end + window:
+                regions[-1] = (a_start, max(a_end, a_pos + k), b_start, max(b_end, b_pos + k))
+                continue
+        regions.append((a_pos, a_pos + k, b_pos, b_pos + k))
+    return tuple(sorted(regions))
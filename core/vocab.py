@@ -0,0 +1,165 @@
+"""
+Словарь токенов корпуса.
+Каждый токен (после normalize/tokenize) получает постоянный целый id,
+словарь пополняется при загрузке документов. Документ хранится как
+массив id токенов (int32 в BLOB), поэтому n-граммы любого размера
+строятся по id без повторной токенизации текста.
+
+Вместе с токеном хранится его хэш (hash_token), и хэши n-грамм по id
+совпадают с хэшами по тексту - отпечатки в индексе не меняются.
+"""
+
+import sqlite3
+from array import array
+from typing import Dict, Iterable, Optional, Tuple
+from core.db import SQL_CHUNK
+from core.transforms import TokenIds, hash_token, iter_tokens
+from core.lazy import batch_process
+
+# Тип элемента массива id токенов (int32)
+TOKEN_ID_TYPECODE = 'i'
+
+
+def init_vocab_schema(conn: sqlite3.Connection) -> None:
+    """Создать таблицы словаря и последовательностей токенов"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS vocabulary (
+            id INTEGER PRIMARY KEY,
+            token TEXT NOT NULL UNIQUE,
+            hash INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS document_tokens (
+            doc_id INTEGER PRIMARY KEY,
+            token_ids BLOB NOT NULL,
+            FOREIGN KEY (doc_id) REFERENCES documents(id)
+        )
+    ''')
+
+
+def pack_token_ids(token_ids: Iterable[int]) -> bytes:
+    """Упаковать id токенов в BLOB"""
+    if isinstance(token_ids, array) and token_ids.typecode == TOKEN_ID_TYPECODE:
+        return token_ids.tobytes()
+    return array(TOKEN_ID_TYPECODE, token_ids).tobytes()
+
+
+def unpack_token_ids(blob: bytes) -> TokenIds:
+    """Распаковать BLOB в массив id токенов"""
+    token_ids = array(TOKEN_ID_TYPECODE)
+    token_ids.frombytes(blob)
+    return token_ids
+
+
+def _select_ids(conn: sqlite3.Connection, tokens: Tuple[str, ...]) -> Dict[str, int]:
+    ids = {}
+    for chunk in batch_process(tokens, SQL_CHUNK):
+        placeholders = ','.join('?' * len(chunk))
+        ids.update(conn.execute(
+            f'SELECT token, id FROM vocabulary WHERE token IN ({placeholders})', chunk
+        ))
+    return ids
+
+
+def intern_tokens(conn: sqlite3.Connection, tokens: Iterable[str]) -> Dict[str, int]:
+    """
+    id для каждого уникального токена (без commit).
+    Новые токены добавляются в словарь в порядке сортировки.
+    """
+    unique = tuple(sorted(set(tokens)))
+    ids = _select_ids(conn, unique)
+    missing = tuple(token for token in unique if token not in ids)
+    if missing:
+        conn.executemany(
+            'INSERT OR IGNORE INTO vocabulary (token, hash) VALUES (?, ?)',
+            ((token, hash_token(token)) for token in missing)
+        )
+        ids.update(_select_ids(conn, missing))
+    return ids
+
+
+def encode_text(conn: sqlite3.Connection, text: str) -> Tuple[TokenIds, Dict[int, int]]:
+    """
+    Текст в последовательность id токенов (словарь пополняется).
+    Возвращает массив id и хэши его токенов (id -> hash_token).
+    """
+    tokens = list(iter_tokens(text))
+    ids = intern_tokens(conn, tokens)
+    token_ids = array(TOKEN_ID_TYPECODE, map(ids.__getitem__, tokens))
+    return token_ids, {token_id: hash_token(token) for token, token_id in ids.items()}
+
+
+def save_document_tokens(conn: sqlite3.Connection, doc_id: int, token_ids: TokenIds) -> None:
+    """Сохранить последовательность токенов документа (без commit)"""
+    conn.execute(
+        'INSERT OR REPLACE INTO document_tokens (doc_id, token_ids) VALUES (?, ?)',
+        (int(doc_id), pack_token_ids(token_ids))
+    )
+
+
+def store_document_tokens(
+    conn: sqlite3.Connection,
+    doc_id: int,
+    text: str
+) -> Tuple[TokenIds, Dict[int, int]]:
+    """Перевести текст документа в id и сохранить (без commit)"""
+    token_ids, token_hashes = encode_text(conn, text)
+    save_document_tokens(conn, doc_id, token_ids)
+    return token_ids, token_hashes
+
+
+def ensure_document_tokens(conn: sqlite3.Connection) -> int:
+    """
+    Перевести в id документы, загруженные до появления словаря
+    (без commit: вызывается внутри транзакции достройки индекса).
+    Возвращает число обработанных документов.
+    """
+    rows = conn.execute('''
+        SELECT d.id, d.text
+        FROM documents d
+        LEFT JOIN document_tokens t ON t.doc_id = d.id
+        WHERE t.doc_id IS NULL
+    ''').fetchall()
+    for doc_id, text in rows:
+        store_document_tokens(conn, doc_id, text)
+    return len(rows)
+
+
+def load_document_tokens(
+    conn: sqlite3.Connection,
+    doc_ids: Optional[Iterable[int]] = None
+) -> Dict[str, TokenIds]:
+    """Последовательности токенов документов (None - всех)"""
+    if doc_ids is None:
+        rows = conn.execute('SELECT doc_id, token_ids FROM document_tokens').fetchall()
+    else:
+        rows = []
+        for chunk in batch_process(tuple(int(d) for d in doc_ids), SQL_CHUNK):
+            placeholders = ','.join('?' * len(chunk))
+            rows.extend(conn.execute(
+                f'SELECT doc_id, token_ids FROM document_tokens WHERE doc_id IN ({placeholders})',
+                chunk
+            ).fetchall())
+    return {str(doc_id): unpack_token_ids(blob) for doc_id, blob in rows}
+
+
+def load_token_hashes(conn: sqlite3.Connection) -> array:
+    """
+    Хэши всех токенов словаря: массив uint64, индекс - id токена
+    (8 байт на токен словаря, а не на вхождение в корпус).
+    """
+    size = conn.execute('SELECT COALESCE(MAX(id), 0) FROM vocabulary').fetchone()[0]
+    token_hashes = array('Q', bytes(8 * (size + 1)))
+    for token_id, h in conn.execute('SELECT id, hash FROM vocabulary'):
+        token_hashes[token_id] = h
+    return token_hashes
+
+
+def vocabulary_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Размер словаря и объём хранимых последовательностей"""
+    tokens = conn.execute('SELECT COUNT(*) FROM vocabulary').fetchone()[0]
+    documents, size = conn.execute(
+        'SELECT COUNT(*), COALESCE(SUM(LENGTH(token_ids)), 0) FROM document_tokens'
+    ).fetchone()
+    return {'tokens': tokens, 'documents': documents, 'token_bytes': size}
@@ -9,22 +9,53 @@ from flask_cors import CORS
 import sqlite3
 import hashlib
 import secrets
-from datetime import datetime
 from pathlib import Path
 from functools import wraps
 import json
-import time
+import queue
+import base64
+import os
+import atexit
+import threading
 
 # Импорты из наших модулей
-from core.domain import Document, Submission
-from core.transforms import normalize, tokenize, ngrams, jaccard
+from core.domain import Document, Submission, MinHashParams
+from core.transforms import normalize, tokenize, ngrams, jaccard, match_regions
 from core.closures import by_author, by_title, by_min_length, compose_filters, by_date_range, create_similarity_threshold
-from core.memo import check_submission_cached, get_cache_stats
-from core.ftypes import validate_submission
-from core.recursion import compare_submissions_recursive, tree_walk_documents, count_documents_by_author_recursive
-from core.lazy import paginate_documents, progressive_check, filter_documents, batch_process, search_documents
+from core.memo import check_submission_cached, get_cache_stats, set_cache_limit
+from core.ftypes import validate_submission, validate_ngram_size
+from core.index import (
+    init_index_schema,
+    index_document,
+    ensure_fingerprints,
+    load_fingerprints,
+    fingerprint_text,
+    query_overlaps,
+    query_overlaps_batch,
+    query_prefix,
+    ensure_minhash,
+    query_lsh,
+    ensure_winnow,
+    query_winnow,
+    winnow_text_tokens,
+    DEFAULT_NGRAM_SIZES
+)
+from core.recursion import compare_submissions_recursive, tree_walk_documents, count_documents_by_author_recursive, walk_neighbours
+from core.lazy import progressive_check, batch_process, search_documents
+from core.parallel import ScoringPool, parallel_progressive_check
+from core.matrix import pairwise_similarity_matrix, similar_pairs
+from core.vocab import vocabulary_stats
+from core.clusters import init_cluster_schema, assign_document, build_clusters, load_clusters, count_clusters
+from core.knn import init_knn_schema, add_document_neighbours, build_knn_graph, load_neighbours, load_edges, neighbours_lookup
+from core.search import init_search_schema, index_document_search, search_enabled, search_fts
+from core.db import ConnectionPool, SQL_CHUNK
+from core.jobs import JobQueue, JobQueueFull
+from core.eventlog import EventLog
+from core.metrics import registry as metrics_registry, CANDIDATES_PRUNED, set_hot_stage_sampling, stage_timer, timed
 from core.events import (
     event_bus, 
+    Event,
+    EventFanout,
     setup_event_handlers, 
     get_recent_submissions, 
     get_check_results, 
@@ -46,15 +77,152 @@ CORS(app,
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False
 
+# Приближённый поиск MinHash/LSH: длина сигнатуры и разбиение на полосы.
+# Больше полос (меньше строк в полосе) - выше полнота, но больше кандидатов.
+app.config['MINHASH_NUM_PERM'] = 128
+app.config['MINHASH_BANDS'] = 32
+app.config['MINHASH_ROWS'] = 4
+app.config['MINHASH_SEED'] = 1
+
+# Winnowing: размер окна (в k-граммах). Совпадение длиной не меньше
+# window + n - 1 токенов гарантированно обнаруживается.
+app.config['WINNOW_WINDOW'] = 4
+
+# Лимит памяти кэша артефактов обработки текстов (core.memo)
+app.config['ARTIFACT_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+set_cache_limit(app.config['ARTIFACT_CACHE_MAX_BYTES'])
+
+# Пул процессов для engine=parallel: число процессов, размер чанка
+# и сколько отпечатков каждый процесс держит в памяти между запросами
+app.config['SCORING_WORKERS'] = min(4, os.cpu_count() or 1)
+app.config['SCORING_CHUNK_SIZE'] = 500
+app.config['SCORING_WORKER_CACHE'] = 100000
+
+# Матрица схожести всех пар (admin): ограничение на число документов,
+# ответ растёт квадратично
+app.config['SIMILARITY_MATRIX_MAX_DOCS'] = 500
+
+# Пакетная проверка (admin): сколько документов или текстов за один запрос
+app.config['BATCH_CHECK_MAX_SUBMISSIONS'] = 200
+
+# Кластеры почти-дубликатов (admin): порог схожести по умолчанию
+app.config['CLUSTER_THRESHOLD'] = 0.5
+
+# Граф k ближайших соседей (admin): k по умолчанию и предел глубины обхода
+app.config['NEIGHBOURS_K'] = 10
+app.config['NEIGHBOURS_MAX_WALK_DEPTH'] = 50
+
+# Пул соединений SQLite: сколько простаивающих соединений держать,
+# ожидание блокировки и настройки страниц/кэша
+app.config['DB_POOL_MAX_IDLE'] = 8
+app.config['DB_BUSY_TIMEOUT_MS'] = 5000
+app.config['DB_CACHED_STATEMENTS'] = 256
+app.config['DB_SYNCHRONOUS'] = 'NORMAL'
+app.config['DB_MMAP_SIZE'] = 256 * 1024 * 1024
+app.config['DB_CACHE_SIZE_KB'] = 64 * 1024
+
+# Фоновые проверки: число рабочих потоков, вместимость очереди
+# и сколько завершённых задач хранить для /api/jobs/<id>
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_QUEUE_SIZE'] = 100
+app.config['JOB_RETENTION'] = 1000
+
+# Асинхронная шина событий: рабочие потоки (1 - события обрабатываются
+# по порядку), размер очереди и политика при её переполнении:
+# block / drop_oldest / drop_new
+app.config['EVENT_BUS_WORKERS'] = 1
+app.config['EVENT_BUS_QUEUE_SIZE'] = 10000
+app.config['EVENT_BUS_BACKPRESSURE'] = 'block'
+
+# Стрим мониторинга: очередь на клиента, сколько последних событий
+# хранить для докачки по Last-Event-ID и интервал keepalive при простое (с)
+app.config['MONITORING_CLIENT_QUEUE'] = 100
+app.config['MONITORING_REPLAY_SIZE'] = 500
+app.config['MONITORING_HEARTBEAT'] = 15
+
+# Журнал событий: размер пачки и интервал группировки записи,
+# хранение (число событий и дни) и сколько событий проигрывать при старте
+app.config['EVENT_LOG_ENABLED'] = True
+app.config['EVENT_LOG_BATCH_SIZE'] = 200
+app.config['EVENT_LOG_FLUSH_INTERVAL'] = 0.5
+app.config['EVENT_LOG_MAX_EVENTS'] = 100000
+app.config['EVENT_LOG_MAX_AGE_DAYS'] = 30
+app.config['EVENT_LOG_REPLAY'] = 1000
+
+# Метрики /metrics: горячие этапы (обработка каждого текста, сравнение
+# с каждым документом) замеряются раз в METRICS_HOT_SAMPLE_EVERY вызовов;
+# без входа в систему метрики отдаются только этим адресам
+app.config['METRICS_HOT_SAMPLE_EVERY'] = 16
+app.config['METRICS_ALLOWED_HOSTS'] = ('127.0.0.1', '::1')
+set_hot_stage_sampling(app.config['METRICS_HOT_SAMPLE_EVERY'])
+
 DB_FILE = 'plagiarism.db'
 
+# События, которые видит мониторинг (стрим и журнал)
+MONITORED_EVENTS = ('TEXT_SUBMITTED', 'CHECK_DONE', 'ALERT')
+
+# Длина превью текста в списке документов
+PREVIEW_LENGTH = 200
+
+SCORING_ENGINES = ('exact', 'minhash', 'winnow', 'parallel')
+
+_scoring_pool = None
+_scoring_pool_lock = threading.Lock()
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+_event_log = None
+
 # Инициализация обработчиков событий
 setup_event_handlers()
 
+# Обработчики событий работают в фоне и не задерживают ответы
+event_bus.start_async(
+    workers=app.config['EVENT_BUS_WORKERS'],
+    max_queue=app.config['EVENT_BUS_QUEUE_SIZE'],
+    backpressure=app.config['EVENT_BUS_BACKPRESSURE']
+)
+atexit.register(event_bus.stop_async)
+
+# Раздача событий мониторинга подключённым клиентам SSE
+monitoring_fanout = EventFanout(
+    max_client_queue=app.config['MONITORING_CLIENT_QUEUE'],
+    replay_size=app.config['MONITORING_REPLAY_SIZE']
+)
+for event_name in MONITORED_EVENTS:
+    event_bus.subscribe(event_name, monitoring_fanout.push)
+
+# Метрики, которые считываются из состояния компонентов при выдаче /metrics
+metrics_registry.gauge('plagiarism_cache_hits_total', 'Попадания в кэш артефактов текстов',
+                       lambda: get_cache_stats()['hits'], kind='counter')
+metrics_registry.gauge('plagiarism_cache_misses_total', 'Промахи кэша артефактов текстов',
+                       lambda: get_cache_stats()['misses'], kind='counter')
+metrics_registry.gauge('plagiarism_cache_bytes', 'Объём кэша артефактов текстов',
+                       lambda: get_cache_stats()['bytes'])
+metrics_registry.gauge('plagiarism_event_bus_queue_depth', 'Глубина очереди шины событий',
+                       lambda: event_bus.get_stats()['queue_depth'])
+metrics_registry.gauge('plagiarism_event_bus_dropped_total', 'События, потерянные при переполнении шины',
+                       lambda: event_bus.get_stats()['dropped'], kind='counter')
+metrics_registry.gauge('plagiarism_monitoring_clients', 'Подключённые клиенты стрима мониторинга',
+                       lambda: monitoring_fanout.get_stats()['clients'])
+metrics_registry.gauge('plagiarism_job_queue_depth', 'Глубина очереди фоновых проверок',
+                       lambda: _job_queue.get_stats()['queue_depth'] if _job_queue else 0)
+metrics_registry.gauge('plagiarism_db_connections_in_use', 'Занятые соединения пула SQLite',
+                       lambda: _db_pool.get_stats()['in_use'] if _db_pool else 0)
+
 # ===== DATABASE SETUP =====
 def init_db():
     """Инициализация базы данных"""
+    # Ошибка в параметрах MinHash - при старте, а не 500 на каждый запрос
+    minhash_params()
+    
     conn = sqlite3.connect(DB_FILE)
+    # WAL сохраняется в файле БД: читатели не блокируют писателя
+    conn.execute('PRAGMA journal_mode = WAL')
     c = conn.cursor()
     
     # Таблица пользователей
@@ -81,6 +249,25 @@ def init_db():
         )
     ''')
     
+    # Превью и длина хранятся отдельно, чтобы список документов не читал тексты
+    columns = {row[1] for row in c.execute('PRAGMA table_info(documents)')}
+    if 'preview' not in columns:
+        c.execute('ALTER TABLE documents ADD COLUMN preview TEXT')
+    if 'length' not in columns:
+        c.execute('ALTER TABLE documents ADD COLUMN length INTEGER')
+    c.execute(f'''
+        UPDATE documents
+        SET length = length(text),
+            preview = CASE WHEN length(text) > {PREVIEW_LENGTH}
+                           THEN substr(text, 1, {PREVIEW_LENGTH}) || '...'
+                           ELSE text END
+        WHERE preview IS NULL OR length IS NULL
+    ''')
+    
+    # Индексы для keyset-пагинации по (created_at, id)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_documents_user_created ON documents(user_id, created_at, id)')
+    
     # Таблица проверок
     c.execute('''
         CREATE TABLE IF NOT EXISTS checks (
@@ -96,6 +283,16 @@ def init_db():
         )
     ''')
     
+    # Индекс отпечатков n-грамм
+    init_index_schema(conn)
+    
+    # Полнотекстовый индекс (если SQLite собран с FTS5)
+    init_search_schema(conn)
+    
+    # Кластеры почти-дубликатов
+    init_cluster_schema(conn)
+    init_knn_schema(conn)
+    
     # Создаём админа
     admin_pass = hashlib.sha256('admin123'.encode()).hexdigest()
     try:
@@ -117,13 +314,235 @@ def init_db():
         pass
     
     conn.commit()
+    
+    # Отпечатки для документов, загруженных до появления индекса
+    for n in DEFAULT_NGRAM_SIZES:
+        ensure_fingerprints(conn, n)
+    
     conn.close()
+    
+    if app.config['EVENT_LOG_ENABLED']:
+        start_event_log()
+
+def start_event_log():
+    """
+    Открыть журнал событий, восстановить из него витрины мониторинга
+    и начать записывать новые события.
+    """
+    global _event_log
+    if _event_log is not None:
+        return _event_log
+    
+    _event_log = EventLog(
+        DB_FILE,
+        batch_size=app.config['EVENT_LOG_BATCH_SIZE'],
+        flush_interval=app.config['EVENT_LOG_FLUSH_INTERVAL'],
+        max_events=app.config['EVENT_LOG_MAX_EVENTS'],
+        max_age_days=app.config['EVENT_LOG_MAX_AGE_DAYS']
+    )
+    # Проигрываем до подписки журнала, чтобы не записать события повторно
+    event_bus.replay(_event_log.read_recent(app.config['EVENT_LOG_REPLAY']))
+    
+    def log_event(event):
+        _event_log.append(Event(name=event.name, ts=event.ts, payload=compact_payload(event.payload)))
+    
+    for event_name in MONITORED_EVENTS:
+        event_bus.subscribe(event_name, log_event)
+    atexit.register(_event_log.close)
+    return _event_log
+
+def get_db_pool() -> ConnectionPool:
+    """Пул соединений с БД (создаётся при первом обращении)"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ConnectionPool(
+                DB_FILE,
+                max_idle=app.config['DB_POOL_MAX_IDLE'],
+                busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+                cached_statements=app.config['DB_CACHED_STATEMENTS'],
+                pragmas={
+                    'synchronous': app.config['DB_SYNCHRONOUS'],
+                    'mmap_size': app.config['DB_MMAP_SIZE'],
+                    'cache_size': -app.config['DB_CACHE_SIZE_KB'],
+                    'temp_store': 'MEMORY'
+                }
+            )
+            atexit.register(_db_pool.close_all)
+        return _db_pool
 
 def get_db():
-    """Получить соединение с БД"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Получить соединение с БД из пула; close() возвращает его в пул"""
+    return get_db_pool().connect()
+
+def document_preview(text: str) -> str:
+    """Превью текста для списка документов"""
+    return text[:PREVIEW_LENGTH] + '...' if len(text) > PREVIEW_LENGTH else text
+
+def encode_cursor(created_at: str, doc_id: int) -> str:
+    """Курсор keyset-пагинации: позиция последнего документа страницы"""
+    raw = json.dumps([created_at, doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str):
+    """Разобрать курсор; None - если курсор повреждён"""
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(doc_id)
+    except (ValueError, TypeError):
+        return None
+
+def get_scoring_pool() -> ScoringPool:
+    """Пул процессов для оценки схожести (создаётся при первом обращении)"""
+    global _scoring_pool
+    with _scoring_pool_lock:
+        if _scoring_pool is None:
+            _scoring_pool = ScoringPool(
+                os.path.abspath(DB_FILE),
+                workers=app.config['SCORING_WORKERS'],
+                chunk_size=app.config['SCORING_CHUNK_SIZE'],
+                max_cached=app.config['SCORING_WORKER_CACHE']
+            )
+            atexit.register(_scoring_pool.shutdown)
+        return _scoring_pool
+
+def get_job_queue() -> JobQueue:
+    """Очередь фоновых проверок (создаётся при первом обращении)"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                workers=app.config['JOB_WORKERS'],
+                max_queue=app.config['JOB_QUEUE_SIZE'],
+                max_finished=app.config['JOB_RETENTION']
+            )
+        return _job_queue
+
+def minhash_params() -> MinHashParams:
+    """Параметры MinHash/LSH из конфигурации приложения"""
+    return MinHashParams(
+        num_perm=app.config['MINHASH_NUM_PERM'],
+        bands=app.config['MINHASH_BANDS'],
+        rows=app.config['MINHASH_ROWS'],
+        seed=app.config['MINHASH_SEED']
+    )
+
+def all_document_ids(conn, exclude_doc_id: int = None):
+    """ID всех документов корпуса"""
+    c = conn.cursor()
+    c.execute('SELECT id FROM documents WHERE id != ? ORDER BY id',
+              (exclude_doc_id if exclude_doc_id is not None else -1,))
+    return tuple(str(row['id']) for row in c.fetchall())
+
+def load_documents_meta(conn, doc_ids, with_author: bool = True):
+    """Метаданные документов (без текстов) по списку ID"""
+    c = conn.cursor()
+    rows = []
+    for chunk in batch_process(tuple(int(doc_id) for doc_id in doc_ids), SQL_CHUNK):
+        c.execute(f'''
+            SELECT d.id, d.title, d.created_at, u.full_name as author
+            FROM documents d
+            JOIN users u ON d.user_id = u.id
+            WHERE d.id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        rows.extend(c.fetchall())
+    
+    return tuple(
+        Document(
+            id=str(d['id']),
+            title=d['title'],
+            text='',
+            author=d['author'] if with_author else '',
+            ts=d['created_at']
+        )
+        for d in rows
+    )
+
+@timed('db_fetch')
+def load_candidates(conn, n: int, text: str, exclude_doc_id: int = None,
+                    with_author: bool = True, engine: str = 'exact', rescore: bool = False,
+                    threshold: float = 0.0):
+    """
+    Загрузить кандидатов для проверки текста.
+    
+    engine='exact': по инвертированному индексу выбираются только документы,
+    имеющие с текстом общие n-граммы; точный Жаккар считается по числу общих
+    n-грамм и размерам множеств, без текстов и хэшей документов.
+    С порогом threshold > 0 кандидаты ищутся префиксной фильтрацией по
+    самым редким n-граммам текста и фильтром длины: проверяются только
+    документы, которые могут пройти порог. Совпадения не ниже порога те же,
+    но score - максимум только по ним; для проверок, которые сохраняются
+    в checks, порог не передаётся (см. score_recorded_check).
+    engine='minhash': кандидаты из LSH-корзин с оценкой схожести по
+    сигнатурам; rescore=True пересчитывает их схожесть точно.
+    engine='winnow': кандидаты по отпечаткам winnowing, схожесть - Жаккар
+    по отпечаткам (или точный при rescore=True), плюс совпавшие фрагменты.
+    engine='parallel': точный Жаккар со всем корпусом в пуле процессов.
+    
+    Возвращает (documents, scoring, corpus_total, regions), где scoring -
+    именованные аргументы для check_submission_cached / progressive_check,
+    regions - совпавшие фрагменты по документам (только для winnow).
+    """
+    ensure_fingerprints(conn, n)
+    
+    c = conn.cursor()
+    c.execute('SELECT COUNT(*) as count FROM documents WHERE id != ?',
+              (exclude_doc_id if exclude_doc_id is not None else -1,))
+    corpus_total = c.fetchone()['count']
+    
+    sub_hashes = fingerprint_text('0', text, n).hashes
+    regions = {}
+    
+    if engine == 'minhash':
+        params = minhash_params()
+        ensure_minhash(conn, n, params)
+        estimates = query_lsh(conn, n, sub_hashes, params, exclude_doc_id)
+        candidate_ids = estimates.keys()
+        if rescore:
+            scoring = {'fingerprints': load_fingerprints(conn, n, doc_ids=candidate_ids)}
+        else:
+            scoring = {'scores': estimates}
+    elif engine == 'parallel':
+        candidate_ids = all_document_ids(conn, exclude_doc_id)
+        with stage_timer('scoring'):
+            scoring = {'scores': get_scoring_pool().score_all(sub_hashes, candidate_ids, n)}
+    elif engine == 'winnow':
+        window = app.config['WINNOW_WINDOW']
+        ensure_winnow(conn, n, window)
+        selected = winnow_text_tokens(tokenize(normalize(text)), n, window)
+        found = query_winnow(conn, n, window, selected, exclude_doc_id)
+        candidate_ids = found.keys()
+        if rescore:
+            scoring = {'fingerprints': load_fingerprints(conn, n, doc_ids=candidate_ids)}
+        else:
+            scoring = {'scores': {doc_id: score for doc_id, (score, _) in found.items()}}
+        regions = {
+            doc_id: [
+                {'submission': [s_start, s_end], 'document': [d_start, d_end]}
+                for s_start, s_end, d_start, d_end in match_regions(pairs, n, window)
+            ]
+            for doc_id, (_, pairs) in found.items()
+        }
+    elif threshold > 0:
+        fingerprints = query_prefix(conn, n, sub_hashes, threshold, exclude_doc_id)
+        candidate_ids = fingerprints.keys()
+        scoring = {'fingerprints': fingerprints}
+    else:
+        overlaps = query_overlaps(conn, n, sub_hashes, exclude_doc_id)
+        candidate_ids = overlaps.keys()
+        scoring = {
+            'fingerprints': load_fingerprints(conn, n, doc_ids=candidate_ids, with_hashes=False),
+            'overlaps': overlaps
+        }
+    
+    CANDIDATES_PRUNED.inc(corpus_total - len(candidate_ids), engine)
+    return load_documents_meta(conn, candidate_ids, with_author), scoring, corpus_total, regions
+
+def sse_message(payload, event_id=None) -> str:
+    """Сообщение SSE с JSON-данными (сериализация попадает в метрики)"""
+    with stage_timer('json'):
+        data = json.dumps(payload)
+    return f"id: {event_id}\ndata: {data}\n\n" if event_id is not None else f"data: {data}\n\n"
 
 def hash_password(password: str) -> str:
     """Хэширование пароля"""
@@ -287,11 +706,15 @@ def upload_document():
     c = conn.cursor()
     
     c.execute('''
-        INSERT INTO documents (user_id, title, text)
-        VALUES (?, ?, ?)
-    ''', (session['user_id'], title, text))
+        INSERT INTO documents (user_id, title, text, preview, length)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (session['user_id'], title, text, document_preview(text), len(text)))
     
     doc_id = c.lastrowid
+    index_document(conn, doc_id, text)
+    index_document_search(conn, doc_id)
+    assign_document(conn, doc_id)
+    add_document_neighbours(conn, doc_id)
     conn.commit()
     conn.close()
     
@@ -316,90 +739,108 @@ def upload_document():
 @app.route('/api/documents', methods=['GET'])
 @login_required
 def get_documents():
-    """Получить документы с фильтрами и пагинацией"""
-    page = request.args.get('page', 0, type=int)
-    page_size = request.args.get('page_size', 20, type=int)
+    """
+    Получить документы с фильтрами и пагинацией.
     
-    conn = get_db()
-    c = conn.cursor()
+    Пагинация выполняется в SQL по ключу (created_at, id): cursor из
+    next_cursor предыдущей страницы даёт следующую страницу за одно
+    обращение к индексу, независимо от её номера. Без cursor страница
+    выбирается по page через OFFSET. Тексты не читаются - только превью.
+    """
+    page = max(request.args.get('page', 0, type=int), 0)
+    page_size = min(max(request.args.get('page_size', 20, type=int), 1), 100)
+    cursor = request.args.get('cursor', '')
+    
+    conditions = []
+    params = []
     
     if session.get('role') == 'user':
-        c.execute('''
-            SELECT d.id, d.title, d.text, d.created_at, u.full_name as author
-            FROM documents d
-            JOIN users u ON d.user_id = u.id
-            WHERE d.user_id = ?
-            ORDER BY d.created_at DESC
-        ''', (session['user_id'],))
+        conditions.append('d.user_id = ?')
+        params.append(session['user_id'])
     else:
-        c.execute('''
-            SELECT d.id, d.title, d.text, d.created_at, u.full_name as author, u.username
-            FROM documents d
-            JOIN users u ON d.user_id = u.id
-            ORDER BY d.created_at DESC
-        ''')
-    
-    docs = c.fetchall()
-    conn.close()
-    
-    documents = tuple(
-        Document(
-            id=str(doc['id']),
-            title=doc['title'],
-            text=doc['text'],
-            author=doc['author'],
-            ts=doc['created_at']
-        )
-        for doc in docs
-    )
-    
-    # Применяем фильтры
-    if session.get('role') == 'admin':
-        filters = []
-        
         author = request.args.get('author', '')
         if author:
-            filters.append(lambda doc: author.lower() in doc.author.lower())
-            
+            conditions.append('instr(py_lower(u.full_name), ?) > 0')
+            params.append(author.lower())
+        
         title_keyword = request.args.get('title', '')
         if title_keyword:
-            filters.append(lambda doc: title_keyword.lower() in doc.title.lower())
+            conditions.append('instr(py_lower(d.title), ?) > 0')
+            params.append(title_keyword.lower())
         
         min_length = request.args.get('min_length', 0, type=int)
         if min_length > 0:
-            filters.append(lambda doc: len(doc.text) >= min_length)
+            conditions.append('d.length >= ?')
+            params.append(min_length)
         
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         if date_from and date_to:
-            filters.append(lambda doc: date_from <= doc.ts <= date_to)
-        
-        if filters:
-            def combined_filter(doc):
-                return all(predicate(doc) for predicate in filters)
-            
-            documents = tuple(filter_documents(documents, combined_filter))
+            conditions.append('d.created_at BETWEEN ? AND ?')
+            params.extend((date_from, date_to))
     
-    # Ленивая пагинация
-    paginated_docs = list(paginate_documents(documents, page_size, page))
+    conn = get_db()
+    # SQLite lower() понимает только ASCII - для кириллицы нужен str.lower
+    conn.create_function('py_lower', 1, lambda value: value.lower() if value else value,
+                         deterministic=True)
+    c = conn.cursor()
     
-    result = []
-    for doc in paginated_docs:
-        result.append({
-            'id': doc.id,
-            'title': doc.title,
-            'text': doc.text[:200] + '...' if len(doc.text) > 200 else doc.text,
-            'text_full': doc.text,
-            'author': doc.author,
-            'created_at': doc.ts,
-            'length': len(doc.text)
-        })
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    c.execute(f'''
+        SELECT COUNT(*) as count
+        FROM documents d
+        JOIN users u ON d.user_id = u.id
+        {where}
+    ''', params)
+    total = c.fetchone()['count']
+    
+    page_conditions = list(conditions)
+    page_params = list(params)
+    offset = 0
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            conn.close()
+            return jsonify({'error': 'Некорректный курсор'}), 400
+        page_conditions.append('(d.created_at, d.id) < (?, ?)')
+        page_params.extend(position)
+    else:
+        offset = page * page_size
+    
+    page_where = ('WHERE ' + ' AND '.join(page_conditions)) if page_conditions else ''
+    c.execute(f'''
+        SELECT d.id, d.title, d.preview, d.length, d.created_at, u.full_name as author
+        FROM documents d
+        JOIN users u ON d.user_id = u.id
+        {page_where}
+        ORDER BY d.created_at DESC, d.id DESC
+        LIMIT ? OFFSET ?
+    ''', page_params + [page_size + 1, offset])
+    
+    rows = c.fetchall()
+    conn.close()
+    
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    
+    result = [
+        {
+            'id': str(doc['id']),
+            'title': doc['title'],
+            'text': doc['preview'],
+            'author': doc['author'],
+            'created_at': doc['created_at'],
+            'length': doc['length']
+        }
+        for doc in rows
+    ]
     
     return jsonify({
         'documents': result,
-        'total': len(documents),
+        'total': total,
         'page': page,
-        'page_size': page_size
+        'page_size': page_size,
+        'next_cursor': encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
     })
 
 @app.route('/api/plagiarism/check', methods=['POST'])
@@ -410,89 +851,177 @@ def plagiarism_check():
     text = data.get('text', '')
     n = data.get('n', 3)
     threshold = data.get('threshold', 0.0)
+    engine = data.get('engine', 'exact')
+    rescore = bool(data.get('rescore', False))
+    ordered = bool(data.get('ordered', True))
     
     if not text:
         return jsonify({'error': 'Текст не может быть пустым'}), 400
     
-    conn = get_db()
-    c = conn.cursor()
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
     
-    c.execute('''
-        SELECT d.id, d.title, d.text, d.created_at, u.full_name as author
-        FROM documents d
-        JOIN users u ON d.user_id = u.id
-    ''')
-    docs = c.fetchall()
-    conn.close()
+    if engine not in SCORING_ENGINES:
+        return jsonify({'error': f'Неизвестный движок: {engine}'}), 400
     
-    documents = tuple(
-        Document(
-            id=str(doc['id']),
-            title=doc['title'],
-            text=doc['text'],
-            author=doc['author'],
-            ts=doc['created_at']
+    conn = get_db()
+    if engine == 'parallel':
+        # Результаты считаются в пуле и отдаются по мере готовности чанков
+        ensure_fingerprints(conn, n)
+        documents = load_documents_meta(conn, all_document_ids(conn))
+        corpus_total = len(documents)
+        checks = parallel_progressive_check(get_scoring_pool(), text, documents, n, threshold, ordered)
+        regions = {}
+    else:
+        documents, scoring, corpus_total, regions = load_candidates(
+            conn, n, text, engine=engine, rescore=rescore, threshold=threshold
         )
-        for doc in docs
-    )
+        checks = progressive_check(text, documents, n, threshold, **scoring)
+    conn.close()
     
     def generate():
-        results = []
-        yield 'data: {"status": "started", "total": ' + str(len(documents)) + '}\n\n'
-        
-        for result in progressive_check(text, documents, n, threshold):
-            results.append(result)
-            yield f"data: {json.dumps(result)}\n\n"
-        
-        yield f"data: {json.dumps({'status': 'completed', 'total_results': len(results)})}\n\n"
+        # Время всего стрима: от первого сообщения до последнего
+        with stage_timer('sse'):
+            results = []
+            yield sse_message({'status': 'started', 'total': len(documents), 'corpus_total': corpus_total, 'engine': engine})
+            
+            for result in checks:
+                if regions:
+                    result['regions'] = regions.get(result['doc_id'], [])
+                results.append(result)
+                yield sse_message(result)
+            
+            yield sse_message({'status': 'completed', 'total_results': len(results)})
     
     return Response(generate(), mimetype='text/event-stream')
 
-@app.route('/api/check/<int:doc_id>', methods=['POST'])
-@admin_required
-def check_document(doc_id):
-    """Проверить документ (админ)"""
-    data = request.json
-    n = data.get('n', 3)
-    threshold = data.get('threshold', 0.0)
+def apply_threshold(result: dict, threshold: float) -> None:
+    """Оставить в результате проверки только совпадения не ниже порога"""
+    if threshold > 0:
+        threshold_filter = create_similarity_threshold(threshold)
+        result['matches'] = [
+            match for match in result['matches']
+            if threshold_filter(match['similarity'])
+        ]
+        result['filtered_by_threshold'] = threshold
+
+def publish_check_done(doc_id: int, title: str, score: float, admin_id: int, admin_name: str):
+    """Опубликовать CHECK_DONE и, при высокой схожести, ALERT"""
+    # 🔥 ПУБЛИКУЕМ СОБЫТИЕ: CHECK_DONE
+    event_bus.publish('CHECK_DONE', {
+        'doc_id': str(doc_id),
+        'doc_title': title,
+        'similarity': score,
+        'admin_id': str(admin_id),
+        'admin_name': admin_name
+    })
     
+    # 🔥 Если высокая схожесть - публикуем ALERT
+    if score > 0.7:
+        event_bus.publish('ALERT', {
+            'doc_id': str(doc_id),
+            'doc_title': title,
+            'similarity': score,
+            'severity': 'high' if score > 0.9 else 'medium',
+            'message': f'Обнаружено подозрительное совпадение: {round(score * 100)}%'
+        })
+
+def score_recorded_check(submission: Submission, compare_docs, n: int, scoring: dict,
+                         documents_total: int, threshold: float):
+    """
+    Проверка, результат которой пишется в checks и по которой публикуются
+    CHECK_DONE/ALERT. Кандидаты должны быть без префиксного фильтра:
+    score - максимум по всему корпусу, иначе документ ниже порога, но
+    выше порога ALERT, теряется. Порог отсекает только список совпадений.
+    Возвращает (результат, id лучшего совпадения или None).
+    """
+    result = check_submission_cached(submission, compare_docs, n, **scoring)
+    result['stats']['documents_total'] = documents_total
+    apply_threshold(result, threshold)
+    matched_doc_id = int(result['matches'][0]['doc_id']) if result['matches'] else None
+    return result, matched_doc_id
+
+def run_document_check(report, doc_id: int, n: int, threshold: float, engine: str,
+                       rescore: bool, admin_id: int, admin_name: str):
+    """
+    Проверка документа админом (выполняется фоновой задачей).
+    По завершении пишет запись в checks и публикует CHECK_DONE/ALERT.
+    """
     conn = get_db()
-    c = conn.cursor()
-    
-    c.execute('SELECT * FROM documents WHERE id = ?', (doc_id,))
-    doc = c.fetchone()
-    
-    if not doc:
+    try:
+        c = conn.cursor()
+        c.execute('SELECT * FROM documents WHERE id = ?', (doc_id,))
+        doc = c.fetchone()
+        if not doc:
+            raise LookupError('Документ не найден')
+        
+        report(0.1, 'candidates')
+        compare_docs, scoring, corpus_total, regions = load_candidates(
+            conn, n, doc['text'], exclude_doc_id=doc_id, engine=engine, rescore=rescore
+        )
+        
+        if not corpus_total:
+            return {
+                'score': 0.0,
+                'matches': [],
+                'message': 'Нет документов для сравнения'
+            }
+        
+        report(0.5, 'scoring')
+        submission = Submission(
+            id=str(doc_id),
+            user_id=str(doc['user_id']),
+            text=doc['text'],
+            ts=doc['created_at']
+        )
+        
+        result, matched_doc_id = score_recorded_check(
+            submission, compare_docs, n, scoring, corpus_total, threshold
+        )
+        result['stats']['engine'] = engine
+        result['stats']['estimated'] = engine in ('minhash', 'winnow') and not rescore
+        if regions:
+            for match in result['matches']:
+                match['regions'] = regions.get(match['doc_id'], [])
+        
+        report(0.9, 'saving')
+        c.execute('''
+            INSERT INTO checks (admin_id, document_id, similarity_score, matched_doc_id)
+            VALUES (?, ?, ?, ?)
+        ''', (admin_id, doc_id, result['score'], matched_doc_id))
+        conn.commit()
+    finally:
         conn.close()
-        return jsonify({'error': 'Документ не найден'}), 404
-    
-    c.execute('''
-        SELECT d.*, u.full_name as author_name
-        FROM documents d
-        JOIN users u ON d.user_id = u.id
-        WHERE d.id != ?
-    ''', (doc_id,))
-    other_docs = c.fetchall()
     
-    if not other_docs:
+    publish_check_done(doc_id, doc['title'], result['score'], admin_id, admin_name)
+    return result
+
+def run_my_document_check(report, doc_id: int, n: int, user_id: int):
+    """Проверка своего документа пользователем (выполняется фоновой задачей)"""
+    conn = get_db()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT * FROM documents WHERE id = ? AND user_id = ?', (doc_id, user_id))
+        doc = c.fetchone()
+        if not doc:
+            raise LookupError('Документ не найден')
+        
+        report(0.1, 'candidates')
+        compare_docs, scoring, corpus_total, _ = load_candidates(
+            conn, n, doc['text'], exclude_doc_id=doc_id, with_author=False
+        )
+    finally:
         conn.close()
-        return jsonify({
+    
+    if not corpus_total:
+        return {
             'score': 0.0,
             'matches': [],
             'message': 'Нет документов для сравнения'
-        })
-    
-    compare_docs = tuple(
-        Document(
-            id=str(d['id']),
-            title=d['title'],
-            text=d['text'],
-            author=d['author_name'],
-            ts=d['created_at']
-        )
-        for d in other_docs
-    )
+        }
     
+    report(0.5, 'scoring')
     submission = Submission(
         id=str(doc_id),
         user_id=str(doc['user_id']),
@@ -500,45 +1029,221 @@ def check_document(doc_id):
         ts=doc['created_at']
     )
     
-    result = check_submission_cached(submission, compare_docs, n)
+    result = check_submission_cached(submission, compare_docs, n, **scoring)
+    result['stats']['documents_total'] = corpus_total
+    return result
+
+def submit_job(kind: str, fn, *args):
+    """Поставить задачу в очередь и вернуть ответ 202 с её адресами"""
+    try:
+        job = get_job_queue().submit(kind, fn, *args, owner_id=str(session['user_id']))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
     
-    if threshold > 0:
-        threshold_filter = create_similarity_threshold(threshold)
-        result['matches'] = [
-            match for match in result['matches']
-            if threshold_filter(match['similarity'])
-        ]
-        result['filtered_by_threshold'] = threshold
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.id}',
+        'stream_url': f'/api/jobs/{job.id}/stream'
+    }), 202
+
+def document_exists(doc_id: int, user_id: int = None) -> bool:
+    """Есть ли документ (и принадлежит ли он user_id, если задан)"""
+    conn = get_db()
+    if user_id is None:
+        row = conn.execute('SELECT 1 FROM documents WHERE id = ?', (doc_id,)).fetchone()
+    else:
+        row = conn.execute('SELECT 1 FROM documents WHERE id = ? AND user_id = ?',
+                           (doc_id, user_id)).fetchone()
+    conn.close()
+    return row is not None
+
+@app.route('/api/check/<int:doc_id>', methods=['POST'])
+@admin_required
+def check_document(doc_id):
+    """Проверить документ (админ): проверка ставится в очередь фоновых задач"""
+    data = request.json
+    n = data.get('n', 3)
+    threshold = data.get('threshold', 0.0)
+    engine = data.get('engine', 'exact')
+    rescore = bool(data.get('rescore', False))
     
-    matched_doc_id = int(result['matches'][0]['doc_id']) if result['matches'] else None
-    c.execute('''
-        INSERT INTO checks (admin_id, document_id, similarity_score, matched_doc_id)
-        VALUES (?, ?, ?, ?)
-    ''', (session['user_id'], doc_id, result['score'], matched_doc_id))
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
     
-    conn.commit()
-    conn.close()
+    if engine not in SCORING_ENGINES:
+        return jsonify({'error': f'Неизвестный движок: {engine}'}), 400
     
-    # 🔥 ПУБЛИКУЕМ СОБЫТИЕ: CHECK_DONE
-    event_bus.publish('CHECK_DONE', {
-        'doc_id': str(doc_id),
-        'doc_title': doc['title'],
-        'similarity': result['score'],
-        'admin_id': str(session['user_id']),
-        'admin_name': session.get('full_name', 'Unknown')
-    })
+    if not document_exists(doc_id):
+        return jsonify({'error': 'Документ не найден'}), 404
     
-    # 🔥 Если высокая схожесть - публикуем ALERT
-    if result['score'] > 0.7:
-        event_bus.publish('ALERT', {
-            'doc_id': str(doc_id),
-            'doc_title': doc['title'],
-            'similarity': result['score'],
-            'severity': 'high' if result['score'] > 0.9 else 'medium',
-            'message': f'Обнаружено подозрительное совпадение: {round(result["score"] * 100)}%'
-        })
+    return submit_job('check', run_document_check, doc_id, n, threshold, engine, rescore,
+                      session['user_id'], session.get('full_name', 'Unknown'))
+
+def load_batch_submissions(conn, doc_ids, texts, n: int):
+    """
+    Проверяемые тексты пакета: [(Submission, хэши n-грамм, id документа
+    или None, название)] и id ненайденных документов. Хэши документов
+    берутся из индекса, тексты токенизируются один раз.
+    """
+    if texts:
+        return [
+            (Submission(id=f'text-{i}', user_id=str(session['user_id']), text=text, ts=''),
+             fingerprint_text(f'text-{i}', text, n).hashes, None, '')
+            for i, text in enumerate(texts)
+        ], []
+    
+    rows = {}
+    for chunk in batch_process(doc_ids, SQL_CHUNK):
+        rows.update((str(row['id']), row) for row in conn.execute(f'''
+            SELECT id, user_id, title, text, created_at FROM documents
+            WHERE id IN ({','.join('?' * len(chunk))})
+        ''', chunk))
+    fingerprints = load_fingerprints(conn, n, doc_ids=rows.keys())
+    submissions = [
+        (Submission(id=doc_id, user_id=str(rows[doc_id]['user_id']),
+                    text=rows[doc_id]['text'], ts=rows[doc_id]['created_at']),
+         fingerprints[doc_id].hashes, int(doc_id), rows[doc_id]['title'])
+        for doc_id in doc_ids if doc_id in rows and doc_id in fingerprints
+    ]
+    return submissions, [int(doc_id) for doc_id in doc_ids if doc_id not in rows]
+
+@app.route('/api/check/batch', methods=['POST'])
+@admin_required
+def check_batch():
+    """
+    Пакетная проверка (админ): список doc_ids или texts.
+    Корпус и индекс читаются один раз на весь пакет. Все тексты
+    проверяются и записи в checks (для документов) пишутся одной
+    транзакцией до ответа, поэтому обрыв соединения их не теряет;
+    результаты затем отдаются потоком SSE.
+    """
+    data = request.json or {}
+    n = data.get('n', 3)
+    threshold = data.get('threshold', 0.0)
+    limit = app.config['BATCH_CHECK_MAX_SUBMISSIONS']
     
-    return jsonify(result)
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
+    
+    texts = data.get('texts') or []
+    raw_doc_ids = data.get('doc_ids') or []
+    try:
+        if not isinstance(raw_doc_ids, list):
+            raise TypeError
+        doc_ids = tuple(dict.fromkeys(str(int(doc_id)) for doc_id in raw_doc_ids))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'doc_ids должен быть списком ID документов'}), 400
+    if not isinstance(texts, list) or not all(isinstance(text, str) and text for text in texts):
+        return jsonify({'error': 'texts должен быть списком непустых текстов'}), 400
+    if bool(texts) == bool(doc_ids):
+        return jsonify({'error': 'Передайте doc_ids или texts'}), 400
+    if len(texts) + len(doc_ids) > limit:
+        return jsonify({'error': f'Не больше {limit} текстов за раз'}), 400
+    
+    admin_id = session['user_id']
+    admin_name = session.get('full_name', 'Unknown')
+    
+    conn = get_db()
+    try:
+        ensure_fingerprints(conn, n)
+        corpus_total = conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        submissions, missing = load_batch_submissions(conn, doc_ids, texts, n)
+        
+        # Один проход по postings на все тексты; размеры отпечатков
+        # и метаданные кандидатов загружаются один раз на пакет
+        with stage_timer('db_fetch'):
+            overlaps = query_overlaps_batch(
+                conn, n, [hashes for _, hashes, _, _ in submissions],
+                [doc_id for _, _, doc_id, _ in submissions]
+            )
+            candidates = set().union(*overlaps)
+            sizes = load_fingerprints(conn, n, doc_ids=candidates, with_hashes=False)
+            meta = {doc.id: doc for doc in load_documents_meta(conn, candidates)}
+        
+        results = []
+        checks = []
+        for (submission, _, doc_id, title), found in zip(submissions, overlaps):
+            compare_docs = tuple(meta[candidate] for candidate in sorted(found, key=int)
+                                 if candidate in meta)
+            result, matched_doc_id = score_recorded_check(
+                submission, compare_docs, n, {'fingerprints': sizes, 'overlaps': found},
+                corpus_total - (doc_id is not None), threshold
+            )
+            results.append((doc_id, result))
+            if doc_id is not None:
+                checks.append((doc_id, title, result['score'], matched_doc_id))
+        
+        # Все записи пакета - одной транзакцией
+        conn.executemany('''
+            INSERT INTO checks (admin_id, document_id, similarity_score, matched_doc_id)
+            VALUES (?, ?, ?, ?)
+        ''', ((admin_id, doc_id, score, matched) for doc_id, _, score, matched in checks))
+        conn.commit()
+    finally:
+        conn.close()
+    
+    for doc_id, title, score, _ in checks:
+        publish_check_done(doc_id, title, score, admin_id, admin_name)
+    
+    def generate():
+        with stage_timer('sse'):
+            yield sse_message({'status': 'started', 'total': len(submissions),
+                               'corpus_total': corpus_total, 'missing': missing})
+            for index, (doc_id, result) in enumerate(results):
+                yield sse_message({'index': index, 'doc_id': doc_id, 'result': result})
+            yield sse_message({'status': 'completed', 'total_results': len(submissions),
+                               'saved': len(checks)})
+    
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Статус, прогресс и результат фоновой задачи"""
+    job = get_job_queue().get(job_id)
+    if job is None or (session.get('role') != 'admin' and job.owner_id != str(session['user_id'])):
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+@login_required
+def job_stream(job_id):
+    """SSE-поток состояния задачи до её завершения"""
+    jobs = get_job_queue()
+    job = jobs.get(job_id)
+    if job is None or (session.get('role') != 'admin' and job.owner_id != str(session['user_id'])):
+        return jsonify({'error': 'Задача не найдена'}), 404
+    
+    def generate():
+        while True:
+            version = job.version
+            yield sse_message(job.to_dict())
+            if job.finished:
+                break
+            while not jobs.wait_for_change(job, version, timeout=15):
+                yield ": keepalive\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/api/admin/jobs/stats', methods=['GET'])
+@admin_required
+def job_stats():
+    """Глубина очереди, время ожидания и выполнения задач (только админы)"""
+    return jsonify(get_job_queue().get_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Метрики в текстовом формате Prometheus: гистограммы этапов проверки,
+    счётчики документов и кэша, очереди шины и задач.
+    Доступны админам и сборщику с адресов METRICS_ALLOWED_HOSTS.
+    """
+    if session.get('role') != 'admin' and request.remote_addr not in app.config['METRICS_ALLOWED_HOSTS']:
+        return jsonify({'error': 'Доступ запрещён'}), 403
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/stats', methods=['GET'])
 @login_required
@@ -563,6 +1268,7 @@ def get_stats():
     else:
         my_docs = 0
     
+    vocabulary = vocabulary_stats(conn)
     conn.close()
     
     # Добавляем статистику событий
@@ -574,7 +1280,11 @@ def get_stats():
         'total_users': total_users,
         'my_documents': my_docs,
         'cache_stats': get_cache_stats(),
-        'activity_stats': activity
+        'vocabulary': vocabulary,
+        'activity_stats': activity,
+        'event_bus_stats': event_bus.get_stats(),
+        'monitoring_stream': monitoring_fanout.get_stats(),
+        'event_log': _event_log.get_stats() if _event_log is not None else None
     })
 
 @app.route('/api/monitoring/events', methods=['GET'])
@@ -588,38 +1298,102 @@ def get_monitoring_events():
         'activity_stats': get_activity_stats()
     })
 
+def monitoring_snapshot():
+    """Текущее состояние мониторинга для нового клиента стрима"""
+    return {
+        'recent_submissions': get_recent_submissions(5),
+        'check_results': get_check_results(5),
+        'suspicious_matches': get_suspicious_matches(0.7),
+        'activity': get_activity_stats()
+    }
+
+def compact_payload(payload):
+    """Данные события без полного текста документа (только его длина)"""
+    compact = {key: value for key, value in payload.items() if key != 'text'}
+    if 'text' in payload:
+        compact['text_length'] = len(payload['text'])
+    return compact
+
+def stream_event_payload(event):
+    """Событие для клиента стрима"""
+    return {'type': 'event', 'name': event.name, 'ts': event.ts, 'payload': compact_payload(event.payload)}
+
 @app.route('/api/monitoring/stream', methods=['GET'])
 @admin_required
 def monitoring_stream():
-    """SSE стрим для real-time мониторинга"""
-    def generate():
-        # Отправляем текущее состояние
-        yield f"data: {json.dumps({'type': 'init', 'data': {
-            'recent_submissions': get_recent_submissions(5),
-            'check_results': get_check_results(5),
-            'suspicious_matches': get_suspicious_matches(0.7)
-        }})}\n\n"
-        
-        # Периодически отправляем обновления
-        while True:
-            time.sleep(2)
-            yield f"data: {json.dumps({'type': 'update', 'data': {
-                'activity': get_activity_stats(),
-                'timestamp': datetime.now().isoformat()
-            }})}\n\n"
+    """
+    SSE стрим для real-time мониторинга.
+    События приходят в момент публикации; пока событий нет, раз в
+    MONITORING_HEARTBEAT секунд уходит комментарий-keepalive.
+    Переподключившийся клиент передаёт Last-Event-ID и получает
+    пропущенные события (или заново init, если их уже нет в буфере).
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
     
-    return Response(generate(), mimetype='text/event-stream')
+    heartbeat = app.config['MONITORING_HEARTBEAT']
+    client, backlog, complete = monitoring_fanout.connect(last_event_id)
+    
+    def generate():
+        try:
+            if last_event_id is None or not complete:
+                init = {'type': 'init', 'data': monitoring_snapshot()}
+                yield sse_message(init, monitoring_fanout.last_seq)
+            for seq, event in backlog:
+                yield sse_message(stream_event_payload(event), seq)
+            
+            while True:
+                try:
+                    seq, event = client.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_message(stream_event_payload(event), seq)
+        finally:
+            monitoring_fanout.disconnect(client)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/search/documents', methods=['GET'])
 @login_required
 def search_documents_route():
-    """Поиск по документам"""
+    """
+    Поиск по документам.
+    По полнотекстовому индексу FTS5 (BM25, сниппеты из SQLite);
+    без FTS5 - полным перебором через core.lazy.search_documents.
+    """
     query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
     
     if not query:
         return jsonify({'results': []})
     
     conn = get_db()
+    
+    if search_enabled(conn):
+        user_id = session['user_id'] if session.get('role') == 'user' else None
+        found = search_fts(conn, query, user_id=user_id, limit=limit)
+        conn.close()
+        return jsonify({
+            'results': [
+                {
+                    'document': {
+                        'id': doc['id'],
+                        'title': doc['title'],
+                        'text': doc['snippet'],
+                        'author': doc['author'],
+                        'created_at': doc['created_at']
+                    },
+                    'relevance': doc['relevance']
+                }
+                for doc in found
+            ]
+        })
+    
     c = conn.cursor()
     
     if session.get('role') == 'user':
@@ -704,65 +1478,265 @@ def get_checks_history():
     
     return jsonify(result)
 
-@app.route('/api/check-my-document/<int:doc_id>', methods=['POST'])
-@login_required
-def check_my_document(doc_id):
-    """Проверить свой документ (пользователь)"""
-    data = request.json
+@app.route('/api/admin/similarity-matrix', methods=['POST'])
+@admin_required
+def similarity_matrix_route():
+    """Матрица схожести всех пар для выбранных документов (только админы)"""
+    data = request.json or {}
     n = data.get('n', 3)
+    min_similarity = float(data.get('min_similarity', 0.0))
+    
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
+    
+    try:
+        doc_ids = tuple(dict.fromkeys(str(int(doc_id)) for doc_id in data.get('doc_ids', [])))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'doc_ids должен быть списком ID документов'}), 400
+    
+    if len(doc_ids) < 2:
+        return jsonify({'error': 'Выберите хотя бы два документа'}), 400
+    if len(doc_ids) > app.config['SIMILARITY_MATRIX_MAX_DOCS']:
+        return jsonify({
+            'error': f"Не больше {app.config['SIMILARITY_MATRIX_MAX_DOCS']} документов за раз"
+        }), 400
     
     conn = get_db()
-    c = conn.cursor()
+    ensure_fingerprints(conn, n)
+    fingerprints = load_fingerprints(conn, n, doc_ids=doc_ids)
+    meta = {doc.id: doc for doc in load_documents_meta(conn, fingerprints.keys())}
+    conn.close()
+    
+    found_ids = tuple(doc_id for doc_id in doc_ids if doc_id in fingerprints and doc_id in meta)
+    if len(found_ids) < 2:
+        return jsonify({'error': 'Документы не найдены'}), 404
+    
+    matrix = pairwise_similarity_matrix(tuple(fingerprints[doc_id].hashes for doc_id in found_ids))
+    
+    return jsonify({
+        'documents': [
+            {'id': int(doc_id), 'title': meta[doc_id].title, 'author': meta[doc_id].author}
+            for doc_id in found_ids
+        ],
+        'matrix': [[round(value, 4) for value in row] for row in matrix],
+        'pairs': [
+            {'a': int(found_ids[i]), 'b': int(found_ids[j]), 'similarity': round(value, 4)}
+            for i, j, value in similar_pairs(matrix, min_similarity)
+        ],
+        'missing': [int(doc_id) for doc_id in doc_ids if doc_id not in found_ids],
+        'n': n
+    })
+
+def run_cluster_build(report, n: int, threshold: float):
+    """Полная сборка кластеров почти-дубликатов (выполняется фоновой задачей)"""
+    conn = get_db()
+    try:
+        return build_clusters(conn, n, threshold, report)
+    finally:
+        conn.close()
+
+@app.route('/api/admin/clusters/rebuild', methods=['POST'])
+@admin_required
+def rebuild_clusters():
+    """
+    Пересобрать кластеры по всему корпусу (только админы).
+    Новые документы присоединяются к кластерам при загрузке,
+    пересборка нужна только для смены n или порога.
+    """
+    data = request.json or {}
+    n = data.get('n', 3)
+    
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
+    
+    try:
+        threshold = float(data.get('threshold', app.config['CLUSTER_THRESHOLD']))
+    except (TypeError, ValueError):
+        threshold = -1
+    if not 0 < threshold <= 1:
+        return jsonify({'error': 'threshold должен быть в интервале (0, 1]'}), 400
+    
+    return submit_job('clusters', run_cluster_build, n, threshold)
+
+@app.route('/api/admin/clusters', methods=['GET'])
+@admin_required
+def get_clusters():
+    """Кластеры почти-дубликатов по убыванию размера (только админы)"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', 20, type=int), 1), 100)
+    min_size = max(request.args.get('min_size', 2, type=int), 2)
     
-    c.execute('SELECT * FROM documents WHERE id = ? AND user_id = ?', 
-              (doc_id, session['user_id']))
-    doc = c.fetchone()
+    conn = get_db()
+    settings = conn.execute('SELECT n, threshold, built_at FROM cluster_settings WHERE id = 1').fetchone()
+    total = count_clusters(conn, min_size)
+    clusters = load_clusters(conn, min_size, page_size, (page - 1) * page_size)
+    meta = {doc.id: doc for doc in load_documents_meta(
+        conn, [doc_id for _, members in clusters for doc_id in members]
+    )}
+    conn.close()
     
-    if not doc:
+    return jsonify({
+        'clusters': [
+            {
+                'id': cluster_id,
+                'size': len(members),
+                'documents': [
+                    {'id': doc_id, 'title': meta[str(doc_id)].title, 'author': meta[str(doc_id)].author}
+                    for doc_id in members if str(doc_id) in meta
+                ]
+            }
+            for cluster_id, members in clusters
+        ],
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'settings': dict(settings) if settings else None
+    })
+
+def run_knn_build(report, n: int, k: int):
+    """Полная сборка графа соседей (выполняется фоновой задачей)"""
+    conn = get_db()
+    try:
+        return build_knn_graph(conn, n, k, report)
+    finally:
+        conn.close()
+
+@app.route('/api/admin/neighbours/rebuild', methods=['POST'])
+@admin_required
+def rebuild_neighbours():
+    """
+    Пересобрать граф k ближайших соседей (только админы).
+    Новые документы добавляются в граф при загрузке,
+    пересборка нужна только для смены n или k.
+    """
+    data = request.json or {}
+    n = data.get('n', 3)
+    
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
+    
+    k = data.get('k', app.config['NEIGHBOURS_K'])
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= 100:
+        return jsonify({'error': 'k должен быть целым от 1 до 100'}), 400
+    
+    return submit_job('neighbours', run_knn_build, n, k)
+
+def neighbours_json(neighbours, meta):
+    """Соседи с метаданными документов для ответа API"""
+    return [
+        {
+            'id': int(doc_id),
+            'title': meta[doc_id].title,
+            'author': meta[doc_id].author,
+            'similarity': round(similarity, 4)
+        }
+        for doc_id, similarity in neighbours if doc_id in meta
+    ]
+
+@app.route('/api/admin/documents/<int:doc_id>/related', methods=['GET'])
+@admin_required
+def get_related_documents(doc_id):
+    """Самые похожие документы из графа соседей (только админы)"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    
+    conn = get_db()
+    exists = conn.execute('SELECT 1 FROM documents WHERE id = ?', (doc_id,)).fetchone()
+    if exists is None:
         conn.close()
         return jsonify({'error': 'Документ не найден'}), 404
     
-    c.execute('SELECT * FROM documents WHERE id != ?', (doc_id,))
-    other_docs = c.fetchall()
+    settings = conn.execute('SELECT n, k, built_at FROM knn_settings WHERE id = 1').fetchone()
+    neighbours = load_neighbours(conn, doc_id, limit)
+    meta = {doc.id: doc for doc in load_documents_meta(conn, [other for other, _ in neighbours])}
+    conn.close()
     
+    return jsonify({
+        'doc_id': doc_id,
+        'related': neighbours_json(neighbours, meta),
+        'settings': dict(settings) if settings else None
+    })
+
+@app.route('/api/admin/documents/<int:doc_id>/walk', methods=['GET'])
+@admin_required
+def walk_documents(doc_id):
+    """
+    Цепочка похожих документов от заданного (только админы):
+    на каждом шаге - самый похожий непосещённый сосед из графа.
+    """
+    depth = min(max(request.args.get('depth', 5, type=int), 1),
+                app.config['NEIGHBOURS_MAX_WALK_DEPTH'])
+    
+    conn = get_db()
+    exists = conn.execute('SELECT 1 FROM documents WHERE id = ?', (doc_id,)).fetchone()
+    if exists is None:
+        conn.close()
+        return jsonify({'error': 'Документ не найден'}), 404
+    
+    path = walk_neighbours(neighbours_lookup(conn), str(doc_id), depth)
+    meta = {doc.id: doc for doc in load_documents_meta(conn, path)}
     conn.close()
     
-    if not other_docs:
-        return jsonify({
-            'score': 0.0,
-            'matches': [],
-            'message': 'Нет документов для сравнения'
-        })
+    return jsonify({
+        'doc_id': doc_id,
+        'path': [
+            {'id': int(step), 'title': meta[step].title, 'author': meta[step].author}
+            for step in path if step in meta
+        ],
+        'depth': depth
+    })
+
+@app.route('/api/admin/clusters/<int:cluster_id>/graph', methods=['GET'])
+@admin_required
+def get_cluster_graph(cluster_id):
+    """Документы кластера и рёбра графа соседей между ними (только админы)"""
+    conn = get_db()
+    members = tuple(row[0] for row in conn.execute(
+        'SELECT doc_id FROM clusters WHERE cluster_id = ? ORDER BY doc_id', (cluster_id,)
+    ))
+    if not members:
+        conn.close()
+        return jsonify({'error': 'Кластер не найден'}), 404
     
-    check_doc = Document(
-        id=str(doc['id']),
-        title=doc['title'],
-        text=doc['text'],
-        author='',
-        ts=doc['created_at']
-    )
+    edges = load_edges(conn, members)
+    meta = {doc.id: doc for doc in load_documents_meta(conn, members)}
+    conn.close()
     
-    compare_docs = tuple(
-        Document(
-            id=str(d['id']),
-            title=d['title'],
-            text=d['text'],
-            author='',
-            ts=d['created_at']
-        )
-        for d in other_docs
-    )
+    return jsonify({
+        'id': cluster_id,
+        'documents': [
+            {'id': doc_id, 'title': meta[str(doc_id)].title, 'author': meta[str(doc_id)].author}
+            for doc_id in members if str(doc_id) in meta
+        ],
+        'edges': [
+            {'a': a, 'b': b, 'similarity': round(similarity, 4)}
+            for a, b, similarity in edges
+        ]
+    })
+
+@app.route('/api/admin/db/stats', methods=['GET'])
+@admin_required
+def db_stats():
+    """Статистика пула соединений и ожиданий блокировок (только админы)"""
+    return jsonify(get_db_pool().get_stats())
+
+@app.route('/api/check-my-document/<int:doc_id>', methods=['POST'])
+@login_required
+def check_my_document(doc_id):
+    """Проверить свой документ (пользователь): проверка ставится в очередь"""
+    data = request.json
+    n = data.get('n', 3)
     
-    submission = Submission(
-        id=str(doc_id),
-        user_id=str(doc['user_id']),
-        text=doc['text'],
-        ts=doc['created_at']
-    )
+    n_validation = validate_ngram_size(n)
+    if n_validation.is_left():
+        return jsonify({'error': n_validation.get_left()}), 400
     
-    result = check_submission_cached(submission, compare_docs, n)
+    if not document_exists(doc_id, session['user_id']):
+        return jsonify({'error': 'Документ не найден'}), 404
     
-    return jsonify(result)
+    return submit_job('check-my-document', run_my_document_check, doc_id, n, session['user_id'])
 
 if __name__ == '__main__':
     print("🚀 Инициализация базы данных...")
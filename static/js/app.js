@@ -8,6 +8,8 @@ let monitoringEventSource = null;
 // Пагинация
 let myDocsCurrentPage = 0;
 const myDocsPageSize = 10;
+// Курсоры keyset-пагинации: cursors[page] - позиция, с которой начинается страница
+let myDocsCursors = [null];
 
 // ===== INIT =====
 window.addEventListener('DOMContentLoaded', async () => {
@@ -289,14 +291,7 @@ async function uploadDocument() {
                 </p>
             `;
             
-            const checkResponse = await fetch(`${API_URL}/check-my-document/${docId}`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                credentials: 'include',
-                body: JSON.stringify({ n: 3 })
-            });
-            
-            const checkResult = await checkResponse.json();
+            const checkResult = await runCheckJob(`${API_URL}/check-my-document/${docId}`, { n: 3 });
             displayUploadCheckResult(checkResult, title);
             
             document.getElementById('docTitle').value = '';
@@ -381,18 +376,58 @@ function displayUploadCheckResult(result, title) {
     `;
 }
 
+// ===== CHECK JOBS =====
+// Проверка выполняется фоновой задачей: запрос возвращает id задачи,
+// результат приходит в SSE-потоке задачи
+async function runCheckJob(url, body) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        credentials: 'include',
+        body: JSON.stringify(body)
+    });
+    
+    const job = await response.json();
+    if (!response.ok) {
+        throw new Error(job.error || 'Ошибка проверки');
+    }
+    
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.stream_url, { withCredentials: true });
+        
+        source.onmessage = (event) => {
+            const state = JSON.parse(event.data);
+            if (state.status === 'done') {
+                source.close();
+                resolve(state.result);
+            } else if (state.status === 'failed') {
+                source.close();
+                reject(new Error(state.error));
+            }
+        };
+        
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Соединение с сервером прервано'));
+        };
+    });
+}
+
 // ===== MY DOCUMENTS (USER) =====
 async function renderMyDocuments(page = 0) {
     myDocsCurrentPage = page;
+    if (page === 0) myDocsCursors = [null];
     
     try {
         const params = new URLSearchParams({
             page: myDocsCurrentPage,
             page_size: myDocsPageSize
         });
+        if (myDocsCursors[page]) params.set('cursor', myDocsCursors[page]);
         
         const response = await fetch(`${API_URL}/documents?${params}`, { credentials: 'include' });
         const data = await response.json();
+        myDocsCursors[page + 1] = data.next_cursor;
         
         if (data.documents.length === 0 && myDocsCurrentPage === 0) {
             document.getElementById('myDocsContent').innerHTML = `
@@ -432,7 +467,7 @@ async function renderMyDocuments(page = 0) {
                             <div class="doc-title">${doc.title}</div>
                             <div class="doc-meta">
                                 📅 ${new Date(doc.created_at).toLocaleString('ru-RU')} • 
-                                📝 ${doc.text_full.length} символов
+                                📝 ${doc.length} символов
                             </div>
                             <div class="doc-text">${doc.text}</div>
                         </div>
@@ -457,14 +492,7 @@ async function checkMyDoc(docId, title) {
     resultDiv.innerHTML = '<div style="text-align: center; padding: 20px;"><div class="loading"></div> Проверка...</div>';
     
     try {
-        const response = await fetch(`${API_URL}/check-my-document/${docId}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            credentials: 'include',
-            body: JSON.stringify({ n: 3 })
-        });
-        
-        const result = await response.json();
+        const result = await runCheckJob(`${API_URL}/check-my-document/${docId}`, { n: 3 });
         
         const percentage = Math.round(result.score * 100);
         let statusClass, statusText;
@@ -756,6 +784,7 @@ function completeCheck(results, totalResults) {
 let currentPage = 0;
 const pageSize = 20;
 let currentFilters = {};
+let documentCursors = [null];
 
 async function renderAllDocuments() {
     await loadDocuments(0);
@@ -763,6 +792,7 @@ async function renderAllDocuments() {
 
 async function loadDocuments(page = 0) {
     currentPage = page;
+    if (page === 0) documentCursors = [null];
     
     try {
         const params = new URLSearchParams({
@@ -770,9 +800,11 @@ async function loadDocuments(page = 0) {
             page_size: pageSize,
             ...currentFilters
         });
+        if (documentCursors[page]) params.set('cursor', documentCursors[page]);
         
         const response = await fetch(`${API_URL}/documents?${params}`, { credentials: 'include' });
         const data = await response.json();
+        documentCursors[page + 1] = data.next_cursor;
         
         displayDocuments(data.documents, data.total, currentPage);
     } catch (error) {
@@ -918,8 +950,16 @@ async function startMonitoring() {
     // Загружаем начальные данные
     await updateMonitoringData();
     
-    // Обновляем каждые 5 секунд
-    setInterval(updateMonitoringData, 5000);
+    // Обновляем витрины только когда сервер присылает событие;
+    // при переподключении браузер сам передаёт Last-Event-ID
+    let refreshTimer = null;
+    monitoringEventSource = new EventSource(`${API_URL}/monitoring/stream`, { withCredentials: true });
+    monitoringEventSource.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type !== 'event') return;
+        clearTimeout(refreshTimer);
+        refreshTimer = setTimeout(updateMonitoringData, 300);
+    };
 }
 async function updateMonitoringData() {
     try {
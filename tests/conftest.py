@@ -0,0 +1,65 @@
+import random
+import sqlite3
+import pytest
+import core.clusters
+import core.index
+import core.knn
+import core.vocab
+from core.index import init_index_schema, index_document, fingerprint_text
+from core.transforms import jaccard_hashes
+
+
+@pytest.fixture
+def conn():
+    """БД в памяти с таблицей документов и схемой индекса"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, text TEXT NOT NULL)')
+    init_index_schema(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def small_sql_limit(conn, monkeypatch):
+    """
+    Лимит переменных SQLite в 6 и части по 2: запрос, не разбитый
+    на части по SQL_CHUNK, падает уже на нескольких документах
+    """
+    for module in (core.clusters, core.index, core.knn, core.vocab):
+        monkeypatch.setattr(module, 'SQL_CHUNK', 2)
+    conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 6)
+    return conn
+
+
+def add_doc(conn, doc_id, text):
+    """Добавить документ без индексации"""
+    conn.execute('INSERT INTO documents (id, text) VALUES (?, ?)', (doc_id, text))
+
+
+def add_indexed_doc(conn, doc_id, text, sizes=(2,)):
+    """Добавить документ и проиндексировать, как при загрузке"""
+    add_doc(conn, doc_id, text)
+    index_document(conn, doc_id, text, sizes=sizes)
+
+
+def make_texts(count, seed=5):
+    """Случайные тексты из 15 слов; часть - копии более ранних с добавками"""
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(15)]
+    texts = {}
+    for doc_id in range(1, count + 1):
+        if doc_id > 3 and rng.random() < 0.4:
+            base = texts[rng.randint(1, doc_id - 1)].split()
+            texts[doc_id] = " ".join(base + rng.choices(words, k=rng.randint(0, 3)))
+        else:
+            texts[doc_id] = " ".join(rng.choices(words, k=rng.randint(5, 20)))
+    return texts
+
+
+def brute_force_similarities(texts, n=2):
+    """Точный Жаккар всех пар документов: {(a, b): схожесть}, a != b"""
+    hashes = {d: frozenset(fingerprint_text(str(d), t, n).hashes) for d, t in texts.items()}
+    return {
+        (a, b): jaccard_hashes(hashes[a], hashes[b])
+        for a in texts for b in texts if a != b
+    }
@@ -0,0 +1,59 @@
+import pytest
+from bench.corpus import CorpusSpec, generate_corpus, generate_submissions
+from bench.runner import (
+    BenchResult, compare, load_results, measure, save_results, server_database, index_cases
+)
+from core.domain import Submission
+from core.memo import check_submission_cached
+from core.transforms import normalize
+
+
+def test_corpus_is_deterministic():
+    spec = CorpusSpec(documents=30, mean_length=60, vocabulary=500, seed=7)
+    corpus = generate_corpus(spec)
+    assert corpus == generate_corpus(spec)
+    assert len(corpus) == 30 and len({doc.id for doc in corpus}) == 30
+    assert corpus != generate_corpus(CorpusSpec(documents=30, mean_length=60, vocabulary=500, seed=8))
+
+def test_plagiarized_passages_are_injected():
+    spec = CorpusSpec(documents=20, mean_length=80, vocabulary=5000,
+                      plagiarism_rate=1.0, passage_length=20, seed=3)
+    corpus = generate_corpus(spec)
+    texts = [normalize(doc.text) for doc in corpus]
+    submission = normalize(generate_submissions(corpus, spec, count=1, borrowed_share=0.5)[0])
+
+    words = submission.split()
+    passages = {' '.join(words[i:i + 8]) for i in range(len(words) - 7)}
+    assert any(passage in text for passage in passages for text in texts)
+
+def test_compare_reports_regressions(tmp_path):
+    spec = CorpusSpec(documents=10)
+    baseline = [BenchResult('normalize', 0, 100, 0.001, 0.0009),
+                BenchResult('progressive_check', 1000, 1, 0.5, 0.5)]
+    path = str(tmp_path / 'baseline.json')
+    save_results(path, baseline, spec)
+    assert load_results(path) == baseline
+
+    current = [BenchResult('normalize', 0, 100, 0.00105, 0.001),
+               BenchResult('progressive_check', 1000, 1, 0.8, 0.8),
+               BenchResult('search_documents', 1000, 1, 0.1, 0.1)]
+    regressions = compare(current, baseline, threshold=0.2)
+    assert [(r['name'], r['size']) for r in regressions] == [('progressive_check', 1000)]
+    assert regressions[0]['ratio'] == 1.6
+
+def test_measure_returns_per_call_time():
+    calls, median, best = measure(lambda: sum(range(100)), repeat=3, min_time=0.001)
+    assert calls >= 1 and 0 < best <= median
+
+def test_indexed_check_matches_in_memory_check():
+    spec = CorpusSpec(documents=30, mean_length=60, vocabulary=300, plagiarism_rate=0.5, seed=7)
+    corpus = generate_corpus(spec)
+    submissions = generate_submissions(corpus, spec, count=1, borrowed_share=0.5)
+
+    with server_database(corpus) as server:
+        result = index_cases(server, submissions)['indexed_check']()
+
+    submission = Submission(id='bench', user_id='bench', text=submissions[0], ts='')
+    expected = check_submission_cached(submission, corpus, 3)
+    assert result['score'] == pytest.approx(expected['score'])
+    assert result['score'] > 0
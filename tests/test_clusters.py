@@ -0,0 +1,99 @@
+import pytest
+from core.clusters import (
+    init_cluster_schema, UnionFind, build_clusters, assign_document,
+    load_clusters, count_clusters, get_cluster_settings
+)
+from tests.conftest import add_indexed_doc, make_texts, brute_force_similarities
+
+
+@pytest.fixture
+def conn(conn):
+    init_cluster_schema(conn)
+    return conn
+
+
+def brute_force_groups(texts, threshold):
+    uf = UnionFind()
+    for (a, b), similarity in brute_force_similarities(texts).items():
+        if a < b and similarity >= threshold:
+            uf.union(a, b)
+    return uf.groups()
+
+
+# --------------------------
+# Система непересекающихся множеств
+# --------------------------
+def test_union_find_groups():
+    uf = UnionFind()
+    uf.union(5, 2)
+    uf.union(3, 4)
+    uf.union(4, 5)
+    uf.find(9)
+    assert uf.groups() == {2: [2, 3, 4, 5]}
+
+# --------------------------
+# Сборка и присоединение
+# --------------------------
+def test_build_clusters_matches_brute_force(conn):
+    texts = make_texts(60)
+    for doc_id, text in texts.items():
+        add_indexed_doc(conn, doc_id, text)
+
+    stats = build_clusters(conn, 2, 0.6)
+
+    expected = brute_force_groups(texts, 0.6)
+    assert dict((cid, list(members)) for cid, members in load_clusters(conn)) == expected
+    assert stats['clusters'] == len(expected) == count_clusters(conn)
+    assert get_cluster_settings(conn) == (2, 0.6)
+
+def test_new_documents_join_clusters_incrementally(conn):
+    texts = make_texts(60, seed=11)
+    for doc_id in range(1, 31):
+        add_indexed_doc(conn, doc_id, texts[doc_id])
+    build_clusters(conn, 2, 0.6)
+
+    for doc_id in range(31, 61):
+        add_indexed_doc(conn, doc_id, texts[doc_id])
+        assign_document(conn, doc_id)
+
+    assert dict((cid, list(members)) for cid, members in load_clusters(conn)) == \
+        brute_force_groups(texts, 0.6)
+
+def test_assign_without_build_does_nothing(conn):
+    add_indexed_doc(conn, 1, "a b c d")
+    add_indexed_doc(conn, 2, "a b c d")
+    assert assign_document(conn, 2) is None
+    assert load_clusters(conn) == ()
+
+def test_load_clusters_orders_by_size(conn):
+    for doc_id, text in ((1, "a b c"), (2, "a b c"), (3, "x y z"), (4, "x y z"), (5, "x y z")):
+        add_indexed_doc(conn, doc_id, text)
+    build_clusters(conn, 2, 0.9)
+    assert load_clusters(conn) == ((3, (3, 4, 5)), (1, (1, 2)))
+    assert load_clusters(conn, min_size=3) == ((3, (3, 4, 5)),)
+    assert load_clusters(conn, limit=1, offset=1) == ((1, (1, 2)),)
+
+def test_assign_merges_many_clusters_in_chunks(small_sql_limit):
+    conn = small_sql_limit
+    build_clusters(conn, 2, 0.05)
+    words = [f"w{i}" for i in range(12)]
+    texts = {doc_id: f"{words[2 * doc_id - 2]} {words[2 * doc_id - 1]}" for doc_id in range(1, 7)}
+    texts[7], texts[8] = texts[1], texts[2]
+    texts[9] = " ".join(words)
+    for doc_id, text in texts.items():
+        add_indexed_doc(conn, doc_id, text)
+        assign_document(conn, doc_id)
+
+    assert load_clusters(conn) == ((1, tuple(range(1, 10))),)
+
+def test_load_clusters_without_limit_in_chunks(small_sql_limit):
+    conn = small_sql_limit
+    build_clusters(conn, 2, 0.9)
+    for pair in range(10):
+        for doc_id in (2 * pair + 1, 2 * pair + 2):
+            add_indexed_doc(conn, doc_id, f"t{pair} u{pair} v{pair}")
+            assign_document(conn, doc_id)
+
+    clusters = load_clusters(conn)
+    assert len(clusters) == 10
+    assert all(members == (cluster_id, cluster_id + 1) for cluster_id, members in clusters)
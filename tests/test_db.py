@@ -0,0 +1,65 @@
+import sqlite3
+import pytest
+from core.db import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'test.db'), max_idle=1, retry_delay=0.0)
+    conn = pool.connect()
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+def test_connection_reused_and_configured(pool):
+    conn = pool.connect()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert isinstance(conn.execute('SELECT 1 AS one').fetchone(), sqlite3.Row)
+    conn.close()
+
+    stats = pool.get_stats()
+    assert stats['opened'] == 1
+    assert stats['reused'] == 1
+    assert stats['in_use'] == 0 and stats['idle'] == 1
+
+def test_release_rolls_back_open_transaction(pool):
+    conn = pool.connect()
+    conn.cursor().execute("INSERT INTO items (name) VALUES ('lost')")
+    conn.close()
+
+    conn = pool.connect()
+    assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+    conn.close()
+
+def test_extra_connections_discarded_over_max_idle(pool):
+    first, second = pool.connect(), pool.connect()
+    first.close()
+    second.close()
+
+    stats = pool.get_stats()
+    assert stats['idle'] == 1
+    assert stats['discarded'] == 1
+
+def test_retry_locked(pool):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise sqlite3.OperationalError('database is locked')
+        return 'ok'
+
+    assert pool.retry_locked(flaky) == 'ok'
+    assert pool.get_stats()['lock_retries'] == 2
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.retry_locked(lambda: (_ for _ in ()).throw(sqlite3.OperationalError('database is locked')))
+    assert pool.get_stats()['lock_errors'] == 1
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.retry_locked(lambda: (_ for _ in ()).throw(sqlite3.OperationalError('no such table: x')))
+    assert pool.get_stats()['lock_errors'] == 1
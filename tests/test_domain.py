@@ -1,5 +1,5 @@
 import pytest
-from core.domain import Document, User, Submission, Token, Ngram, CheckResult, Rule, Event
+from core.domain import Document, User, Submission, Token, Ngram, CheckResult, Rule, Event, MinHashParams
 
 # --------------------------
 # Document
@@ -69,3 +69,17 @@ def test_event_creation():
     ev = Event(id="e1", ts="2025-11-18T12:00:00Z", name="TEXT_SUBMITTED", payload={"doc_id": "d1"})
     assert ev.name == "TEXT_SUBMITTED"
     assert ev.payload["doc_id"] == "d1"
+
+# --------------------------
+# MinHashParams
+# --------------------------
+def test_minhash_params_key_roundtrip():
+    params = MinHashParams(num_perm=64, bands=16, rows=4, seed=7)
+    assert params.key == "64:16x4:7"
+    assert MinHashParams.from_key(params.key) == params
+
+def test_minhash_params_validated():
+    with pytest.raises(ValueError):
+        MinHashParams(num_perm=64, bands=32, rows=4)
+    with pytest.raises(ValueError):
+        MinHashParams(num_perm=64, bands=0, rows=4)
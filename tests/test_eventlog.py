@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime
+from core.events import Event, EventBus
+from core.eventlog import EventLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = EventLog(str(tmp_path / 'events.db'), batch_size=50, flush_interval=0.05)
+    yield log
+    log.close()
+
+
+def make_event(i, name='TEXT_SUBMITTED'):
+    return Event(name=name, ts=datetime.utcnow().isoformat() + 'Z', payload={'doc_id': str(i)})
+
+
+def test_events_written_in_batches(log):
+    for i in range(120):
+        log.append(make_event(i % 60))
+    assert log.flush()
+
+    stats = log.get_stats()
+    assert stats['written'] == 120 and stats['pending'] == 0
+    assert stats['batches'] < 120
+
+    events = log.read_recent(5)
+    assert [e.payload['doc_id'] for e in events] == ['55', '56', '57', '58', '59']
+    assert events[0].name == 'TEXT_SUBMITTED'
+
+def test_close_flushes_pending(tmp_path):
+    path = str(tmp_path / 'events.db')
+    log = EventLog(path, flush_interval=10)
+    log.append(make_event(1))
+    log.close()
+
+    reopened = EventLog(path)
+    assert [e.payload for e in reopened.read_recent()] == [{'doc_id': '1'}]
+    reopened.close()
+
+def test_retention_by_count_and_age(tmp_path):
+    log = EventLog(str(tmp_path / 'events.db'), max_events=3, max_age_days=None)
+    for i in range(10):
+        log.append(make_event(i))
+    log.flush()
+    log._apply_retention()
+
+    assert [e.payload['doc_id'] for e in log.read_recent()] == ['7', '8', '9']
+
+    log.max_age_days = 1
+    log.append(Event(name='ALERT', ts='2020-01-01T00:00:00Z', payload={}))
+    log.flush()
+    log._apply_retention()
+    assert [e.payload.get('doc_id') for e in log.read_recent()] == ['8', '9']
+    log.close()
+
+def test_replay_restores_monitoring(log):
+    log.append(Event(name='TEXT_SUBMITTED', ts='t1', payload={'doc_id': 'd1', 'text_length': 42}))
+    log.append(Event(name='CHECK_DONE', ts='t2', payload={'doc_id': 'd1', 'similarity': 0.9}))
+    log.flush()
+
+    bus = EventBus()
+    seen = []
+    bus.subscribe('CHECK_DONE', seen.append)
+    bus.replay(log.read_recent())
+
+    assert [e.name for e in bus.get_history()] == ['TEXT_SUBMITTED', 'CHECK_DONE']
+    assert seen[0].ts == 't2'
@@ -1,4 +1,5 @@
 import pytest
+import threading
 from datetime import datetime, timedelta
 import core.events
 
@@ -135,3 +136,183 @@ def test_event_history_limit_and_get_activity_stats():
     assert stats['submissions'] == len(core.events.event_bus.monitoring_data.submissions)
     # last_activity должен соответствовать ts последнего события в истории
     assert stats['last_activity'] == core.events.event_bus._event_history[-1].ts
+
+
+def test_async_publish_does_not_wait_for_handlers():
+    reset_bus()
+    bus = core.events.event_bus
+    release = threading.Event()
+    seen = []
+    bus.subscribe('SLOW', lambda e: (release.wait(2), seen.append(e.payload['i'])))
+    bus.start_async(workers=1, max_queue=10)
+
+    for i in range(3):
+        bus.publish('SLOW', {'i': i})
+    assert seen == []
+
+    release.set()
+    bus.flush()
+    assert seen == [0, 1, 2]
+    bus.stop_async()
+    assert bus.get_stats()['async'] is False
+
+def test_async_backpressure_drop_policies():
+    for policy, expected in (('drop_new', [0, 1]), ('drop_oldest', [0, 3])):
+        reset_bus()
+        bus = core.events.event_bus
+        release = threading.Event()
+        started = threading.Event()
+        seen = []
+
+        def handler(e):
+            started.set()
+            release.wait(2)
+            seen.append(e.payload['i'])
+
+        bus.subscribe('E', handler)
+        bus.start_async(workers=1, max_queue=1, backpressure=policy)
+        bus.publish('E', {'i': 0})
+        started.wait(2)  # 0 в обработке, очередь пуста
+        for i in range(1, 4):
+            bus.publish('E', {'i': i})
+
+        release.set()
+        bus.flush()
+        bus.stop_async()
+        assert seen == expected
+        assert bus.get_stats()['dropped'] == 2
+        assert len(bus._event_history) == 4
+
+def test_concurrent_publish_keeps_history_bounded():
+    reset_bus()
+    bus = core.events.event_bus
+    bus._max_history = 50
+    bus.start_async(workers=2)
+
+    def publish_many():
+        for i in range(200):
+            bus.publish('TEXT_SUBMITTED', {'doc_id': str(i), 'text': 'x'})
+
+    threads = [threading.Thread(target=publish_many) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    bus.flush()
+    bus.stop_async()
+
+    assert len(bus._event_history) == 50
+    assert bus.get_stats()['dispatched'] == 800
+    assert len(bus.monitoring_data.submissions) == bus.monitoring_data.max_entries
+
+
+def test_stop_async_during_publish_loses_nothing():
+    for _ in range(20):
+        bus = core.events.EventBus()
+        delivered = []
+        bus.subscribe('ALERT', delivered.append)
+        bus.start_async(workers=2, max_queue=5)
+        errors = []
+
+        def publish_many():
+            try:
+                for i in range(100):
+                    bus.publish('ALERT', {'i': i})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=publish_many) for _ in range(4)]
+        for t in threads:
+            t.start()
+        bus.stop_async()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert len(delivered) == 400
+
+def make_event(i):
+    return core.events.Event(name='ALERT', ts=str(i), payload={'i': i})
+
+def test_fanout_pushes_to_each_client():
+    fanout = core.events.EventFanout()
+    first, _, _ = fanout.connect()
+    second, _, _ = fanout.connect()
+
+    fanout.push(make_event(1))
+    assert first.get_nowait()[0] == 1
+    assert second.get_nowait()[1].payload == {'i': 1}
+
+    fanout.disconnect(first)
+    fanout.push(make_event(2))
+    assert first.empty()
+    assert fanout.get_stats()['clients'] == 1
+
+def test_fanout_slow_client_drops_oldest():
+    fanout = core.events.EventFanout(max_client_queue=2)
+    client, _, _ = fanout.connect()
+    for i in range(4):
+        fanout.push(make_event(i))
+
+    assert [client.get_nowait()[0] for _ in range(2)] == [3, 4]
+    assert fanout.get_stats()['dropped'] == 2
+
+def test_fanout_resume_from_last_event_id():
+    fanout = core.events.EventFanout(replay_size=3)
+    for i in range(5):
+        fanout.push(make_event(i))
+
+    _, backlog, complete = fanout.connect(last_event_id=3)
+    assert [seq for seq, _ in backlog] == [4, 5] and complete
+
+    _, backlog, complete = fanout.connect(last_event_id=1)
+    assert [seq for seq, _ in backlog] == [3, 4, 5] and not complete
+
+    _, backlog, complete = fanout.connect(last_event_id=99)
+    assert backlog == () and not complete
+
+
+def test_monitoring_ring_buffers_evict_oldest():
+    md = core.events.MonitoringData(max_entries=3)
+    for i in range(5):
+        md.add_submission({'doc_id': str(i)})
+
+    assert [s['doc_id'] for s in md.submissions] == ['4', '3', '2']
+    assert [s['doc_id'] for s in md.recent(md.submissions, 2)] == ['4', '3']
+
+def test_suspicious_view_updated_incrementally():
+    reset_bus()
+    md = core.events.event_bus.monitoring_data
+
+    md.add_alert({'type': 'alert', 'doc_id': 'A', 'similarity': 0.9, 'timestamp': '1'})
+    md.add_check_result({'type': 'check_result', 'doc_id': 'B', 'similarity': 0.5, 'timestamp': '2'})
+    md.add_check_result({'type': 'check_result', 'doc_id': 'A', 'similarity': 0.8, 'timestamp': '3'})
+    md.add_alert({'type': 'alert', 'doc_id': 'A', 'similarity': 0.95, 'timestamp': '4'})
+    md.add_alert({'type': 'alert', 'doc_id': 'C', 'similarity': 0.75, 'timestamp': '5'})
+
+    view = core.events.get_suspicious_matches()
+    # B ниже порога, для A результат проверки важнее более нового алерта
+    assert [(x['doc_id'], x['timestamp']) for x in view] == [('C', '5'), ('A', '3')]
+    # другой порог считается перебором буферов
+    assert {x['doc_id'] for x in core.events.get_suspicious_matches(threshold=0.5)} == {'A', 'B', 'C'}
+
+def test_history_by_name_respects_retention():
+    reset_bus()
+    bus = core.events.event_bus
+    bus._max_history = 4
+    for i in range(6):
+        bus.publish('A' if i % 2 == 0 else 'B', {'i': i})
+
+    assert [e.payload['i'] for e in bus.get_history()] == [2, 3, 4, 5]
+    assert [e.payload['i'] for e in bus.get_history('A')] == [2, 4]
+    assert [e.payload['i'] for e in bus.get_history('B', limit=1)] == [5]
+    assert bus.get_history('C') == []
+
+
+def test_subscribe_same_handler_once():
+    bus = core.events.EventBus()
+    seen = []
+    bus.subscribe('E', seen.append)
+    bus.subscribe('E', seen.append)
+    bus.publish('E', {})
+    assert len(seen) == 1
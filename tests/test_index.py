@@ -0,0 +1,216 @@
+from core.index import (
+    init_index_schema, fingerprint_text, save_fingerprint, index_document,
+    ensure_fingerprints, load_fingerprints, pack_hashes, unpack_hashes,
+    query_overlaps, ensure_minhash, query_lsh,
+    ensure_winnow, query_winnow, winnow_text_tokens,
+    query_prefix, prefix_length, length_bounds, load_document_frequencies,
+    query_overlaps_batch
+)
+from core.domain import MinHashParams
+from core.transforms import normalize, tokenize, ngrams, hash_ngram
+from tests.conftest import add_doc
+
+
+# --------------------------
+# Отпечатки
+# --------------------------
+def test_fingerprint_text_matches_pipeline():
+    text = "Hello, world! Hello world again."
+    fp = fingerprint_text("7", text, n=2)
+    tokens = tokenize(normalize(text))
+    grams = ngrams(tokens, 2)
+
+    assert fp.doc_id == "7"
+    assert fp.token_count == len(tokens)
+    assert fp.ngram_count == len(grams)
+    assert list(fp.hashes) == sorted(set(hash_ngram(g) for g in grams))
+
+def test_fingerprint_text_short_text():
+    fp = fingerprint_text("1", "one two", n=3)
+    assert fp.ngram_count == 0
+    assert len(fp.hashes) == 0
+
+def test_pack_unpack_roundtrip():
+    hashes = frozenset({1, 2**62, 12345})
+    unpacked = unpack_hashes(pack_hashes(hashes))
+    assert list(unpacked) == [1, 12345, 2**62]
+    assert unpack_hashes(pack_hashes(unpacked)) == unpacked
+
+# --------------------------
+# Хранилище
+# --------------------------
+def test_index_document_and_load(conn):
+    add_doc(conn, 1, "a b c d")
+    index_document(conn, 1, "a b c d", sizes=(2, 3))
+    conn.commit()
+
+    fps = load_fingerprints(conn, 2)
+    assert set(fps) == {"1"}
+    assert len(fps["1"].hashes) == 3
+    assert len(load_fingerprints(conn, 3)["1"].hashes) == 2
+
+def test_load_fingerprints_excludes_document(conn):
+    for doc_id in (1, 2):
+        add_doc(conn, doc_id, "x y z w")
+        save_fingerprint(conn, fingerprint_text(str(doc_id), "x y z w", 3))
+
+    assert set(load_fingerprints(conn, 3, exclude_doc_id=1)) == {"2"}
+
+def test_ensure_fingerprints_backfills_missing(conn):
+    add_doc(conn, 1, "one two three four")
+    add_doc(conn, 2, "five six seven eight")
+    index_document(conn, 1, "one two three four", sizes=(3,))
+
+    assert ensure_fingerprints(conn, 3) == 1
+    assert ensure_fingerprints(conn, 3) == 0
+    assert set(load_fingerprints(conn, 3)) == {"1", "2"}
+
+# --------------------------
+# Инвертированный индекс
+# --------------------------
+def test_query_overlaps_counts_shared_ngrams(conn):
+    texts = {1: "a b c d e", 2: "c d e f g", 3: "x y z w v"}
+    for doc_id, text in texts.items():
+        add_doc(conn, doc_id, text)
+        index_document(conn, doc_id, text, sizes=(2,))
+
+    query = fingerprint_text("0", "a b c d e", 2).hashes
+    overlaps = query_overlaps(conn, 2, query)
+
+    assert overlaps == {"1": 4, "2": 2}  # документ 3 не кандидат
+    assert query_overlaps(conn, 2, query, exclude_doc_id=1) == {"2": 2}
+
+def test_load_fingerprints_sizes_only(conn):
+    add_doc(conn, 1, "a b c d e")
+    index_document(conn, 1, "a b c d e", sizes=(2,))
+
+    fps = load_fingerprints(conn, 2, doc_ids=["1"], with_hashes=False)
+    assert fps["1"].unique_count == 4
+    assert len(fps["1"].hashes) == 0
+
+def test_postings_rebuilt_for_existing_fingerprints(conn):
+    add_doc(conn, 1, "a b c d")
+    index_document(conn, 1, "a b c d", sizes=(2,))
+    conn.execute('DROP TABLE postings')
+    init_index_schema(conn)
+
+    assert query_overlaps(conn, 2, fingerprint_text("0", "a b", 2).hashes) == {"1": 1}
+
+# --------------------------
+# MinHash / LSH
+# --------------------------
+def test_ensure_minhash_and_query_lsh(conn):
+    base = " ".join(f"w{i}" for i in range(60))
+    texts = {1: base, 2: base + " extra tail", 3: " ".join(f"z{i}" for i in range(60))}
+    for doc_id, text in texts.items():
+        add_doc(conn, doc_id, text)
+        index_document(conn, doc_id, text, sizes=(3,))
+
+    params = MinHashParams(num_perm=64, bands=16, rows=4)
+    assert ensure_minhash(conn, 3, params) == 3
+    assert ensure_minhash(conn, 3, params) == 0
+
+    estimates = query_lsh(conn, 3, fingerprint_text("0", base, 3).hashes, params)
+    assert estimates["1"] == 1.0
+    assert estimates["2"] > 0.8
+    assert "3" not in estimates
+
+    assert "1" not in query_lsh(conn, 3, fingerprint_text("0", base, 3).hashes, params, exclude_doc_id=1)
+
+def test_index_document_writes_registered_minhash(conn):
+    params = MinHashParams(num_perm=32, bands=8, rows=4)
+    ensure_minhash(conn, 3, params)
+
+    add_doc(conn, 1, "a b c d e f")
+    index_document(conn, 1, "a b c d e f")
+
+    assert query_lsh(conn, 3, fingerprint_text("0", "a b c d e f", 3).hashes, params) == {"1": 1.0}
+
+# --------------------------
+# Winnowing
+# --------------------------
+def test_winnow_index_finds_shared_run_with_positions(conn):
+    shared = " ".join(f"s{i}" for i in range(12))
+    texts = {1: "intro words here " + shared, 2: " ".join(f"o{i}" for i in range(20))}
+    for doc_id, text in texts.items():
+        add_doc(conn, doc_id, text)
+
+    assert ensure_winnow(conn, 3, 4) == 2
+
+    query_tokens = tuple(shared.split()) + ("tail",)
+    found = query_winnow(conn, 3, 4, winnow_text_tokens(query_tokens, 3, 4))
+
+    assert set(found) == {"1"}
+    score, pairs = found["1"]
+    assert score > 0
+    # совпадения лежат на одной диагонали: документ смещён на 3 токена
+    assert all(doc_pos - pos == 3 for pos, doc_pos in pairs)
+
+def test_index_document_writes_registered_winnow(conn):
+    ensure_winnow(conn, 2, 2)
+    add_doc(conn, 1, "a b c d e")
+    index_document(conn, 1, "a b c d e")
+
+    found = query_winnow(conn, 2, 2, winnow_text_tokens(tuple("a b c d e".split()), 2, 2))
+    assert found["1"][0] == 1.0
+
+# --------------------------
+# Префиксная фильтрация
+# --------------------------
+def test_prefix_and_length_bounds():
+    assert prefix_length(10, 1.0) == 1
+    assert prefix_length(10, 0.7) == 4   # 0.7 * 10 без ошибки округления
+    assert prefix_length(10, 0.01) == 10
+    assert length_bounds(10, 0.5) == (5, 20)
+
+def test_document_frequencies_follow_postings(conn):
+    for doc_id, text in ((1, "a b c"), (2, "b c d"), (3, "x y z")):
+        add_doc(conn, doc_id, text)
+        index_document(conn, doc_id, text, sizes=(2,))
+    fp = fingerprint_text("0", "a b c d", 2)
+    assert sorted(load_document_frequencies(conn, 2, fp.hashes).values()) == [1, 1, 2]
+
+    # Повторное сохранение не удваивает частоты
+    index_document(conn, 2, "b c d", sizes=(2,))
+    assert sorted(load_document_frequencies(conn, 2, fp.hashes).values()) == [1, 1, 2]
+
+    # Для старой БД таблица строится по postings
+    conn.execute('DROP TABLE ngram_df')
+    init_index_schema(conn)
+    assert sorted(load_document_frequencies(conn, 2, fp.hashes).values()) == [1, 1, 2]
+
+def test_query_prefix_finds_every_document_above_threshold(conn):
+    import random
+    from core.transforms import jaccard_hashes
+
+    rng = random.Random(3)
+    words = [f"w{i}" for i in range(12)]
+    texts = {i: " ".join(rng.choices(words, k=rng.randint(2, 30))) for i in range(1, 80)}
+    for doc_id, text in texts.items():
+        add_doc(conn, doc_id, text)
+        index_document(conn, doc_id, text, sizes=(2,))
+
+    for probe_id in (1, 7, 42):
+        probe = fingerprint_text("0", texts[probe_id], 2).hashes
+        for threshold in (0.1, 0.3, 0.5, 0.7, 0.9, 1.0):
+            expected = {
+                str(doc_id) for doc_id, text in texts.items()
+                if doc_id != probe_id
+                and jaccard_hashes(frozenset(probe), fingerprint_text("x", text, 2).hashes) >= threshold
+            }
+            found = query_prefix(conn, 2, probe, threshold, exclude_doc_id=probe_id)
+            assert expected <= set(found)
+            assert all(len(fp.hashes) == fp.unique_count for fp in found.values())
+
+def test_query_overlaps_batch_matches_single_queries(conn):
+    texts = {1: "a b c d e", 2: "c d e f g", 3: "x y z a b", 4: "a b c"}
+    for doc_id, text in texts.items():
+        add_doc(conn, doc_id, text)
+        index_document(conn, doc_id, text, sizes=(2,))
+    probes = [fingerprint_text("p", text, 2).hashes for text in ("a b c d", "c d e f", "q r s")]
+    excludes = [1, None, None]
+
+    batch = query_overlaps_batch(conn, 2, probes, excludes)
+
+    assert list(batch) == [query_overlaps(conn, 2, h, e) for h, e in zip(probes, excludes)]
+    assert batch[2] == {}
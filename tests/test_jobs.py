@@ -0,0 +1,68 @@
+import threading
+import pytest
+from core.jobs import JobQueue, JobQueueFull, JOB_DONE, JOB_FAILED
+
+
+def wait_finished(jobs, job, timeout=2.0):
+    while not job.finished:
+        assert jobs.wait_for_change(job, job.version, timeout), 'задача не завершилась'
+    return job
+
+
+def test_job_runs_with_progress():
+    jobs = JobQueue(workers=1)
+    stages = []
+
+    def task(report, x):
+        report(0.5, 'half')
+        stages.append(jobs.get(job.id).stage)
+        return x * 2
+
+    job = jobs.submit('double', task, 21, owner_id='7')
+    wait_finished(jobs, job)
+
+    assert job.status == JOB_DONE
+    assert job.result == 42 and job.progress == 1.0
+    assert stages == ['half']
+    assert job.owner_id == '7'
+    assert job.to_dict()['status'] == JOB_DONE
+
+def test_job_failure_recorded():
+    jobs = JobQueue(workers=1)
+
+    def task(report):
+        raise LookupError('Документ не найден')
+
+    job = wait_finished(jobs, jobs.submit('fail', task))
+    assert job.status == JOB_FAILED
+    assert job.error == 'Документ не найден'
+    assert jobs.get_stats()['failed'] == 1
+
+def test_queue_bounded():
+    jobs = JobQueue(workers=1, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking(report):
+        started.set()
+        release.wait(2)
+
+    first = jobs.submit('block', blocking)
+    started.wait(2)
+    jobs.submit('block', blocking)  # ждёт в очереди
+    with pytest.raises(JobQueueFull):
+        jobs.submit('block', blocking)
+
+    stats = jobs.get_stats()
+    assert stats['queue_depth'] == 1 and stats['running'] == 1 and stats['rejected'] == 1
+
+    release.set()
+    wait_finished(jobs, first)
+
+def test_finished_jobs_trimmed():
+    jobs = JobQueue(workers=1, max_finished=2)
+    done = [wait_finished(jobs, jobs.submit('noop', lambda report: None)) for _ in range(3)]
+    jobs.submit('noop', lambda report: None)
+
+    assert jobs.get(done[0].id) is None
+    assert jobs.get(done[2].id) is done[2]
@@ -0,0 +1,118 @@
+import pytest
+from core.domain import Document
+from core.knn import (
+    init_knn_schema, build_knn_graph, add_document_neighbours,
+    load_neighbours, load_edges, get_knn_settings
+)
+from core.recursion import tree_walk_documents, walk_neighbours
+from tests.conftest import add_indexed_doc, make_texts, brute_force_similarities
+
+
+@pytest.fixture
+def conn(conn):
+    init_knn_schema(conn)
+    return conn
+
+
+def brute_force_neighbours(texts, k):
+    scored = {}
+    for (a, b), similarity in brute_force_similarities(texts).items():
+        if similarity > 0:
+            scored.setdefault(a, []).append((similarity, -b))
+    graph = {}
+    for a in texts:
+        top = sorted(scored.get(a, []), reverse=True)[:k]
+        graph[a] = [(str(-negative), similarity) for similarity, negative in top]
+    return graph
+
+
+def as_lists(conn, doc_ids):
+    return {doc_id: list(load_neighbours(conn, doc_id)) for doc_id in doc_ids}
+
+
+# --------------------------
+# Сборка и инкрементальное обновление
+# --------------------------
+def test_build_matches_brute_force(conn):
+    texts = make_texts(50)
+    for doc_id, text in texts.items():
+        add_indexed_doc(conn, doc_id, text)
+
+    stats = build_knn_graph(conn, 2, 4, batch_size=7)
+
+    expected = brute_force_neighbours(texts, 4)
+    actual = as_lists(conn, texts)
+    for doc_id in texts:
+        assert [other for other, _ in actual[doc_id]] == [other for other, _ in expected[doc_id]]
+        assert [s for _, s in actual[doc_id]] == pytest.approx([s for _, s in expected[doc_id]])
+    assert stats['edges'] == sum(len(v) for v in expected.values())
+    assert get_knn_settings(conn) == (2, 4)
+
+
+def test_incremental_matches_full_rebuild(conn):
+    texts = make_texts(60, seed=11)
+    for doc_id in range(1, 21):
+        add_indexed_doc(conn, doc_id, texts[doc_id])
+    build_knn_graph(conn, 2, 3)
+
+    for doc_id in range(21, 61):
+        add_indexed_doc(conn, doc_id, texts[doc_id])
+        assert add_document_neighbours(conn, doc_id) >= 1
+    incremental = as_lists(conn, texts)
+
+    build_knn_graph(conn, 2, 3)
+    assert incremental == as_lists(conn, texts)
+
+
+def test_add_without_graph_is_noop(conn):
+    add_indexed_doc(conn, 1, "a b c d")
+    assert add_document_neighbours(conn, 1) == 0
+    assert load_neighbours(conn, 1) == ()
+
+
+def test_load_edges_within_set(conn):
+    texts = {1: "a b c d e", 2: "a b c d f", 3: "a b x y z", 4: "p q r s t"}
+    for doc_id, text in texts.items():
+        add_indexed_doc(conn, doc_id, text)
+    build_knn_graph(conn, 2, 2)
+
+    edges = load_edges(conn, (1, 2))
+    assert [(a, b) for a, b, _ in edges] == [(1, 2), (2, 1)]
+    assert load_edges(conn, ()) == ()
+
+
+def test_load_edges_of_large_set_in_chunks(small_sql_limit):
+    conn = small_sql_limit
+    texts = make_texts(20)
+    for doc_id, text in texts.items():
+        add_indexed_doc(conn, doc_id, text)
+    build_knn_graph(conn, 2, 3)
+
+    members = set(range(1, 16))
+    expected = [
+        (doc_id, int(other), similarity)
+        for doc_id in sorted(members)
+        for other, similarity in load_neighbours(conn, doc_id) if int(other) in members
+    ]
+    assert list(load_edges(conn, members)) == expected
+
+# --------------------------
+# Обход графа
+# --------------------------
+def test_walk_neighbours_skips_visited():
+    graph = {
+        "1": (("2", 0.9), ("3", 0.5)),
+        "2": (("1", 0.9), ("3", 0.4)),
+        "3": (("2", 0.4),),
+    }
+    lookup = lambda doc_id: graph.get(doc_id, ())
+    assert walk_neighbours(lookup, "1", max_depth=5) == ("1", "2", "3")
+    assert walk_neighbours(lookup, "1", max_depth=2) == ("1", "2")
+    assert walk_neighbours(lookup, "1", max_depth=0) == ()
+
+
+def test_tree_walk_documents_with_graph():
+    docs = tuple(Document(doc_id, "", text, "", "") for doc_id, text in (("1", "a b c"), ("2", "a b c"), ("3", "x y z")))
+    graph = {"1": (("4", 0.9), ("3", 0.2)), "3": (("2", 0.1),)}
+    # "4" нет среди docs - пропускается
+    assert tree_walk_documents(docs, root=0, neighbours=graph) == ("1", "3", "2")
@@ -41,13 +41,7 @@ def test_search_documents_empty_query():
 # --------------------------
 # Progressive check
 # --------------------------
-def test_progressive_check_basic(monkeypatch):
-    # Подменим normalize, tokenize, ngrams, jaccard для простого контроля
-    monkeypatch.setattr("core.lazy.normalize", lambda x: x.lower())
-    monkeypatch.setattr("core.lazy.tokenize", lambda x: x.split())
-    monkeypatch.setattr("core.lazy.ngrams", lambda tokens, n: [tuple(tokens[i:i+n]) for i in range(len(tokens)-n+1)] if len(tokens)>=n else [tuple(tokens)])
-    monkeypatch.setattr("core.lazy.jaccard", lambda a, b: 1.0 if a==b else 0.0)
-
+def test_progressive_check_basic():
     docs = (
         Document(id="d1", title="Doc1", text="Hello world", author="Alice", ts="ts"),
         Document(id="d2", title="Doc2", text="Python rocks", author="Bob", ts="ts")
@@ -80,3 +74,24 @@ def test_batch_process_basic():
     assert len(batches) == 3
     assert batches[0] == (0,1,2,3,4)
     assert batches[-1] == (10,11)
+
+def test_progressive_check_with_fingerprints():
+    from core.index import fingerprint_text
+
+    docs = (
+        Document(id="d1", title="Doc1", text="", author="Alice", ts="ts"),
+        Document(id="d2", title="Doc2", text="", author="Bob", ts="ts")
+    )
+    fingerprints = {
+        "d1": fingerprint_text("d1", "hello big world", 2),
+        "d2": fingerprint_text("d2", "python rocks hard", 2),
+    }
+
+    results = list(progressive_check("Hello big world", docs, n=2, min_similarity=0.5, fingerprints=fingerprints))
+    assert [r['doc_id'] for r in results] == ["d1"]
+    assert results[0]['similarity'] == 1.0
+
+def test_progressive_check_with_scores():
+    docs = (Document(id="d1", title="Doc1", text="", author="Alice", ts="ts"),)
+    results = list(progressive_check("anything", docs, n=2, scores={"d1": 0.42}))
+    assert results[0]['similarity'] == 0.42
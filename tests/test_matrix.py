@@ -0,0 +1,53 @@
+import pytest
+from core.matrix import (
+    build_incidence,
+    intersection_counts,
+    similarity_matrix,
+    pairwise_similarity_matrix,
+    similar_pairs
+)
+from core.transforms import normalize, tokenize, ngrams, jaccard
+
+TEXTS = (
+    "the quick brown fox jumps over the lazy dog",
+    "the quick brown fox sleeps under the lazy dog",
+    "completely unrelated words in this document here",
+    "",
+)
+
+
+def grams(text, n=3):
+    return ngrams(tokenize(normalize(text)), n)
+
+
+def test_build_incidence_shares_vocabulary():
+    (indptr, indices), vocabulary = build_incidence(({1, 2, 3}, {3, 4}))
+    assert list(indptr) == [0, 3, 5]
+    assert len(vocabulary) == 4
+    assert vocabulary[3] in indices[0:3] and vocabulary[3] in indices[3:5]
+
+def test_intersection_counts_sparse():
+    a, vocabulary = build_incidence(({1, 2, 3}, {9}))
+    b, vocabulary = build_incidence(({2, 3}, {3}, {7}), vocabulary)
+    counts = intersection_counts(a, b, len(vocabulary))
+    assert counts == [{0: 2, 1: 1}, {}]
+
+def test_similarity_matrix_matches_jaccard():
+    subs = tuple(grams(t) for t in TEXTS[:2])
+    docs = tuple(grams(t) for t in TEXTS)
+    matrix = similarity_matrix(subs, docs)
+
+    assert len(matrix) == 2 and all(len(row) == len(TEXTS) for row in matrix)
+    for i, sub in enumerate(subs):
+        for j, doc in enumerate(docs):
+            assert matrix[i][j] == pytest.approx(jaccard(sub, doc))
+
+def test_pairwise_matrix_symmetric():
+    matrix = pairwise_similarity_matrix(tuple(grams(t) for t in TEXTS[:3]))
+    assert all(matrix[i][i] == 1.0 for i in range(3))
+    assert all(matrix[i][j] == matrix[j][i] for i in range(3) for j in range(3))
+
+def test_similar_pairs_threshold():
+    matrix = ((1.0, 0.6, 0.1), (0.6, 1.0, 0.0), (0.1, 0.0, 1.0))
+    assert similar_pairs(matrix) == ((0, 1, 0.6), (0, 2, 0.1))
+    assert similar_pairs(matrix, min_similarity=0.5) == ((0, 1, 0.6),)
@@ -1,14 +1,8 @@
 import pytest
-from core.memo import check_submission_cached, clear_cache, get_cache_stats
+from core.memo import check_submission_cached, clear_cache, get_cache_stats, text_artifacts, set_cache_limit
 from core.domain import Document, Submission
 
-def test_check_submission_cached_basic(monkeypatch):
-    # Подменим normalize, tokenize, ngrams, jaccard для контроля
-    monkeypatch.setattr("core.memo.normalize", lambda x: x.lower())
-    monkeypatch.setattr("core.memo.tokenize", lambda x: x.split())
-    monkeypatch.setattr("core.memo.ngrams", lambda tokens, n: [tuple(tokens[i:i+n]) for i in range(len(tokens)-n+1)] if len(tokens)>=n else [tuple(tokens)])
-    monkeypatch.setattr("core.memo.jaccard", lambda a,b: 1.0 if a==b else 0.0)
-
+def test_check_submission_cached_basic():
     doc1 = Document(id="d1", title="Doc1", text="Hello world", author="Alice", ts="ts")
     doc2 = Document(id="d2", title="Doc2", text="Python rocks", author="Bob", ts="ts")
     submission = Submission(id="s1", user_id="u1", text="Hello world", ts="ts")
@@ -28,12 +22,7 @@ def test_check_submission_cached_basic(monkeypatch):
     assert stats['tokens'] > 0
     assert stats['ngrams'] > 0
 
-def test_cache_stats_reflects_hits_and_misses(monkeypatch):
-    monkeypatch.setattr("core.memo.normalize", lambda x: x)
-    monkeypatch.setattr("core.memo.tokenize", lambda x: x.split())
-    monkeypatch.setattr("core.memo.ngrams", lambda tokens, n: [tuple(tokens)])
-    monkeypatch.setattr("core.memo.jaccard", lambda a,b: 1.0 if a==b else 0.0)
-
+def test_cache_stats_reflects_hits_and_misses():
     doc = Document(id="d1", title="Doc", text="abc", author="A", ts="ts")
     sub = Submission(id="s1", user_id="u1", text="abc", ts="ts")
 
@@ -46,12 +35,7 @@ def test_cache_stats_reflects_hits_and_misses(monkeypatch):
     assert stats1['misses'] > 0
     assert stats2['hits'] > 0  # Вторая проверка должна использовать кэш
 
-def test_clear_cache_resets_stats(monkeypatch):
-    monkeypatch.setattr("core.memo.normalize", lambda x: x)
-    monkeypatch.setattr("core.memo.tokenize", lambda x: x.split())
-    monkeypatch.setattr("core.memo.ngrams", lambda tokens, n: [tuple(tokens)])
-    monkeypatch.setattr("core.memo.jaccard", lambda a,b: 1.0 if a==b else 0.0)
-
+def test_clear_cache_resets_stats():
     doc = Document(id="d1", title="Doc", text="abc", author="A", ts="ts")
     sub = Submission(id="s1", user_id="u1", text="abc", ts="ts")
 
@@ -61,3 +45,116 @@ def test_clear_cache_resets_stats(monkeypatch):
     assert stats['hits'] == 0
     assert stats['misses'] == 0
     assert stats['size'] == 0
+
+def test_check_submission_uses_fingerprints():
+    from core.index import fingerprint_text
+
+    doc1 = Document(id="d1", title="Doc1", text="", author="Alice", ts="ts")
+    doc2 = Document(id="d2", title="Doc2", text="", author="Bob", ts="ts")
+    fingerprints = {
+        "d1": fingerprint_text("d1", "one two three four five", 3),
+        "d2": fingerprint_text("d2", "six seven eight nine ten", 3),
+    }
+    sub = Submission(id="s1", user_id="u1", text="One, two three four five!", ts="ts")
+
+    clear_cache()
+    result = check_submission_cached(sub, (doc1, doc2), n=3, fingerprints=fingerprints)
+
+    assert result['score'] == 1.0
+    assert result['matches'][0]['doc_id'] == "d1"
+    assert result['stats']['fingerprints_used'] == 2
+    assert get_cache_stats()['misses'] == 1  # обработан только текст submission
+
+def test_check_submission_with_overlaps_uses_set_sizes():
+    from core.index import fingerprint_text
+    from core.transforms import jaccard_hashes
+
+    full = {
+        "d1": fingerprint_text("d1", "a b c d e", 2),
+        "d2": fingerprint_text("d2", "c d e f g", 2),
+    }
+    sub = Submission(id="s1", user_id="u1", text="a b c d x", ts="ts")
+    sub_hashes = fingerprint_text("s1", sub.text, 2).hashes
+    overlaps = {doc_id: len(frozenset(sub_hashes) & frozenset(fp.hashes)) for doc_id, fp in full.items()}
+    sizes_only = {
+        doc_id: fp.__class__(fp.doc_id, fp.n, fp.token_count, fp.ngram_count, fp.unique_count, frozenset())
+        for doc_id, fp in full.items()
+    }
+    docs = tuple(Document(id=d, title=d, text="", author="A", ts="ts") for d in full)
+
+    result = check_submission_cached(sub, docs, n=2, fingerprints=sizes_only, overlaps=overlaps)
+    by_id = {m['doc_id']: m['similarity'] for m in result['matches']}
+
+    assert by_id == {d: jaccard_hashes(sub_hashes, fp.hashes) for d, fp in full.items()}
+
+def test_artifacts_cached_by_content_and_reused_across_pairs():
+    clear_cache()
+    text_artifacts("shared corpus text here", 2)
+    text_artifacts("shared corpus text here", 2)
+    text_artifacts("shared corpus text here", 3)  # другой n - другой ключ
+
+    stats = get_cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+    assert stats['bytes'] > 0
+
+def test_cache_bounded_by_bytes():
+    clear_cache()
+    text_artifacts("first text with several words", 2)
+    one_entry = get_cache_stats()['bytes']
+
+    set_cache_limit(one_entry + 1)
+    try:
+        text_artifacts("second text with other words", 2)
+        stats = get_cache_stats()
+        assert stats['size'] == 1
+    finally:
+        set_cache_limit(64 * 1024 * 1024)
+        clear_cache()
+
+def test_top_k_matches_full_ranking():
+    import random
+    from core.index import fingerprint_text
+    from core.transforms import jaccard_hashes
+
+    rng = random.Random(7)
+    words = [f"w{i}" for i in range(30)]
+    docs = tuple(
+        Document(id=f"d{i}", title=f"T{i}", author="A",
+                 text=" ".join(rng.choices(words, k=rng.randint(3, 60))), ts="ts")
+        for i in range(40)
+    ) + (Document(id="dup", title="Dup", author="A", text="w1 w2 w3 w4", ts="ts"),) * 3
+    sub = Submission(id="s1", user_id="u1", text=" ".join(rng.choices(words, k=25)), ts="ts")
+    sub_hashes = fingerprint_text("s", sub.text, 2).hashes
+    expected = sorted(
+        ((jaccard_hashes(frozenset(sub_hashes), fingerprint_text(d.id, d.text, 2).hashes), -i)
+         for i, d in enumerate(docs)),
+        reverse=True
+    )[:5]
+
+    fingerprints = {d.id: fingerprint_text(d.id, d.text, 2) for d in docs}
+    for kwargs in ({}, {'fingerprints': fingerprints}):
+        clear_cache()
+        result = check_submission_cached(sub, docs, n=2, **kwargs)
+        assert [(m['similarity'], m['doc_id']) for m in result['matches']] == [
+            (similarity, docs[-i].id) for similarity, i in expected
+        ]
+        assert result['score'] == expected[0][0]
+
+def test_size_bound_skips_documents_that_cannot_rank():
+    clear_cache()
+    exact = Document(id="d0", title="T", author="A", text="a b c d e f", ts="ts")
+    long_docs = tuple(
+        Document(id=f"d{i}", title="T", author="A",
+                 text=" ".join(f"x{i}_{j}" for j in range(200)), ts="ts")
+        for i in range(1, 30)
+    )
+    sub = Submission(id="s1", user_id="u1", text="a b c d e f", ts="ts")
+
+    result = check_submission_cached(sub, long_docs + (exact,), n=2, top_k=1)
+
+    assert result['matches'][0]['doc_id'] == "d0"
+    assert result['score'] == 1.0
+    assert result['stats']['documents_checked'] == 30
+    assert result['stats']['documents_scored'] == 1
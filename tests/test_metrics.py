@@ -0,0 +1,73 @@
+import threading
+from core.metrics import Counter, Histogram, Registry
+
+
+def test_histogram_merges_thread_shards():
+    hist = Histogram('stage_seconds', 'Этапы', label_name='stage', buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(100):
+            hist.observe(0.05, 'normalize')
+            hist.observe(0.5, 'scoring')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    values = hist.values()
+    assert values['normalize'][0] == [400, 0, 0]
+    assert values['scoring'][0] == [0, 400, 0]
+    assert values['scoring'][2] == 400
+
+def test_sampled_timer_records_every_nth_call():
+    hist = Histogram('hot_seconds', 'Горячий этап')
+    for _ in range(40):
+        with hist.time(every=10):
+            pass
+    assert hist.values()[None][2] == 4
+
+def test_render_prometheus_text():
+    registry = Registry()
+    hist = registry.histogram('check_seconds', 'Проверка', label_name='stage', buckets=(0.1, 1.0))
+    counter = registry.counter('docs_total', 'Документы')
+    registry.gauge('queue_depth', 'Очередь', lambda: 7)
+    hist.observe(0.5, 'db_fetch')
+    counter.inc(3)
+    counter.inc(2)
+
+    text = registry.render()
+    assert '# TYPE check_seconds histogram' in text
+    assert 'check_seconds_bucket{stage="db_fetch",le="0.1"} 0' in text
+    assert 'check_seconds_bucket{stage="db_fetch",le="1.0"} 1' in text
+    assert 'check_seconds_bucket{stage="db_fetch",le="+Inf"} 1' in text
+    assert 'check_seconds_count{stage="db_fetch"} 1' in text
+    assert 'docs_total 5' in text
+    assert 'queue_depth 7' in text
+
+def test_counter_labels():
+    counter = Counter('pruned_total', 'Отсеяно', label_name='engine')
+    counter.inc(5, 'exact')
+    counter.inc(1, 'minhash')
+    counter.inc(2, 'exact')
+    assert counter.values() == {'exact': 7, 'minhash': 1}
+
+def test_finished_threads_fold_shards():
+    counter = Counter('scanned_total', 'Документы')
+    hist = Histogram('stage_seconds', 'Этапы', buckets=(0.1,))
+
+    def work():
+        counter.inc()
+        hist.observe(0.05)
+
+    for _ in range(50):
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(counter._shards) <= 10 and len(hist._shards) <= 10
+    assert counter.values() == {None: 500}
+    assert hist.values()[None][0] == [500, 0]
@@ -0,0 +1,57 @@
+import sqlite3
+import pytest
+from core.domain import Document
+from core.index import init_index_schema, index_document, fingerprint_text
+from core.parallel import ScoringPool, parallel_progressive_check
+from core.transforms import jaccard_hashes
+
+TEXTS = {
+    1: "the quick brown fox jumps over the lazy dog",
+    2: "the quick brown fox sleeps under the lazy dog",
+    3: "completely unrelated words in this document here",
+    4: "the quick brown fox jumps over the lazy cat",
+}
+
+
+@pytest.fixture(scope="module")
+def pool(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("db") / "corpus.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, text TEXT NOT NULL)')
+    init_index_schema(conn)
+    for doc_id, text in TEXTS.items():
+        conn.execute('INSERT INTO documents (id, text) VALUES (?, ?)', (doc_id, text))
+        index_document(conn, doc_id, text, sizes=(3,))
+    conn.commit()
+    conn.close()
+
+    pool = ScoringPool(db_path, workers=2, chunk_size=1)
+    yield pool
+    pool.shutdown()
+
+
+def expected_scores(query, n=3):
+    sub = fingerprint_text("0", query, n).hashes
+    return {str(d): jaccard_hashes(sub, fingerprint_text(str(d), t, n).hashes) for d, t in TEXTS.items()}
+
+
+def test_score_ordered_preserves_chunk_order(pool):
+    query = TEXTS[1]
+    sub = fingerprint_text("0", query, 3).hashes
+    chunks = list(pool.score(sub, ("4", "3", "2", "1"), n=3, ordered=True))
+
+    assert [doc_id for chunk in chunks for doc_id, _ in chunk] == ["4", "3", "2", "1"]
+    assert dict(pair for chunk in chunks for pair in chunk) == expected_scores(query)
+
+def test_score_all_matches_exact_jaccard(pool):
+    query = TEXTS[2]
+    sub = fingerprint_text("0", query, 3).hashes
+    assert pool.score_all(sub, tuple(str(d) for d in TEXTS), n=3) == expected_scores(query)
+
+def test_parallel_progressive_check_unordered(pool):
+    docs = tuple(Document(id=str(d), title=f"Doc {d}", text="", author="A", ts="ts") for d in TEXTS)
+    results = list(parallel_progressive_check(pool, TEXTS[1], docs, n=3, min_similarity=0.5, ordered=False))
+
+    assert {r['doc_id'] for r in results} == {"1", "4"}
+    assert all(r['ordered'] is False for r in results)
+    assert max(r['progress'] for r in results) <= 100.0
@@ -22,7 +22,7 @@ class Submission:
 # Подменяем jaccard и text_processing_pipeline для тестов
 import core.recursion
 
-core.recursion.jaccard = lambda a, b: 1.0 if a == b else 0.5
+core.recursion.jaccard_hashes = lambda a, b: 1.0 if set(a) == set(b) else 0.5
 core.recursion._text_to_ngrams = lambda text, n=3: tuple(text.split())
 
 # 1. Тест flatten_nested_tuples
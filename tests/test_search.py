@@ -0,0 +1,70 @@
+import sqlite3
+import pytest
+from core.search import (
+    init_search_schema,
+    index_document_search,
+    search_enabled,
+    search_fts,
+    query_words,
+    build_match_query
+)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, full_name TEXT NOT NULL)')
+    conn.execute('''
+        CREATE TABLE documents (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany('INSERT INTO users (id, full_name) VALUES (?, ?)',
+                     ((1, 'Иван Иванов'), (2, 'Donald Knuth')))
+    conn.execute("INSERT INTO documents (id, user_id, title, text) VALUES (1, 1, 'Старый документ', 'до индекса')")
+    if not init_search_schema(conn):
+        pytest.skip('SQLite собран без FTS5')
+    yield conn
+    conn.close()
+
+
+def add_doc(conn, doc_id, user_id, title, text):
+    conn.execute('INSERT INTO documents (id, user_id, title, text) VALUES (?, ?, ?, ?)',
+                 (doc_id, user_id, title, text))
+    index_document_search(conn, doc_id)
+
+
+def test_query_words_strip_fts_syntax():
+    assert query_words('"Hello" OR hello* NEAR(x)') == ('hello', 'or', 'near', 'x')
+    assert build_match_query(('a', 'b'), 'title', 'AND') == 'title : ("a"* AND "b"*)'
+
+def test_backfill_and_insert_sync(conn):
+    assert search_enabled(conn)
+    assert [r['id'] for r in search_fts(conn, 'индекса')] == ['1']
+
+    add_doc(conn, 2, 2, 'Art of Programming', 'algorithms and data structures')
+    assert [r['id'] for r in search_fts(conn, 'algorithms')] == ['2']
+
+def test_relevance_uses_field_weights(conn):
+    add_doc(conn, 2, 1, 'Функциональное программирование', 'лямбда и замыкания')
+    add_doc(conn, 3, 1, 'Котики', 'функциональное программирование для котиков')
+    add_doc(conn, 4, 2, 'Functional', 'knuth wrote about it')
+
+    results = search_fts(conn, 'функциональн')
+    assert [(r['id'], r['relevance']) for r in results] == [('2', 0.5), ('3', 0.2)]
+
+    by_author = search_fts(conn, 'knuth')
+    assert by_author[0]['id'] == '4' and by_author[0]['relevance'] == pytest.approx(0.5)
+
+def test_user_filter_and_snippet(conn):
+    add_doc(conn, 2, 2, 'Doc', 'shared word ' + 'filler ' * 100)
+    add_doc(conn, 3, 1, 'Doc', 'shared word')
+
+    results = search_fts(conn, 'shared', user_id=2)
+    assert [r['id'] for r in results] == ['2']
+    assert results[0]['snippet'].startswith('shared word') and results[0]['snippet'].endswith('...')
+    assert search_fts(conn, '*** ()') == ()
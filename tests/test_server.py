@@ -0,0 +1,83 @@
+import pytest
+import server
+from core.index import fingerprint_text, query_overlaps, query_prefix
+
+WORDS = [f"слово{i:02d}" for i in range(1, 16)]
+
+
+@pytest.fixture
+def app_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'DB_FILE', str(tmp_path / 'test.db'))
+    monkeypatch.setitem(server.app.config, 'TESTING', True)
+    monkeypatch.setitem(server.app.config, 'EVENT_LOG_ENABLED', False)
+    server.init_db()
+    client = server.app.test_client()
+    client.post('/api/login', json={'username': 'user', 'password': 'user123'})
+    yield client
+    # Пул создаётся на путь БД - для следующего теста новый
+    server.event_bus.flush()
+    server.get_db_pool().close_all()
+    server._db_pool = None
+
+
+def upload(client, title, words):
+    response = client.post('/api/documents', json={'title': title, 'text': ' '.join(words)})
+    return response.json['document']['id']
+
+
+# --------------------------
+# Проверка документа админом
+# --------------------------
+def test_document_check_score_ignores_prefix_filter(app_client):
+    # 12 токенов против 15: Жаккар по 3-граммам 10/13 = 0.769 - ниже
+    # порога 0.8, но выше порога ALERT (0.7)
+    stored = upload(app_client, 'Исходный', WORDS)
+    checked = upload(app_client, 'Проверяемый', WORDS[:12])
+
+    conn = server.get_db()
+    hashes = fingerprint_text('0', ' '.join(WORDS[:12]), 3).hashes
+    assert query_prefix(conn, 3, hashes, 0.8, checked) == {}
+    assert str(stored) in query_overlaps(conn, 3, hashes, checked)
+    admin_id = conn.execute("SELECT id FROM users WHERE username = 'admin'").fetchone()[0]
+    conn.close()
+
+    result = server.run_document_check(lambda progress, stage: None, checked, 3, 0.8,
+                                       'exact', False, admin_id, 'Админ')
+
+    assert result['score'] == pytest.approx(10 / 13)
+    assert result['matches'] == []
+    conn = server.get_db()
+    saved = conn.execute('SELECT similarity_score FROM checks WHERE document_id = ?',
+                         (checked,)).fetchone()[0]
+    conn.close()
+    assert saved == pytest.approx(10 / 13)
+    alerts = server.event_bus.get_history('ALERT')
+    assert alerts and alerts[-1].payload['doc_id'] == str(checked)
+
+
+# --------------------------
+# Пакетная проверка
+# --------------------------
+def test_batch_check_saves_before_streaming(app_client):
+    upload(app_client, 'Исходный', WORDS)
+    checked = upload(app_client, 'Проверяемый', WORDS[:12])
+    admin = server.app.test_client()
+    admin.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+
+    response = admin.post('/api/check/batch', json={'doc_ids': [checked], 'threshold': 0.8},
+                          buffered=False)
+    # Поток не читается: записи уже сохранены
+    response.close()
+
+    conn = server.get_db()
+    saved = conn.execute('SELECT similarity_score FROM checks WHERE document_id = ?',
+                         (checked,)).fetchone()[0]
+    conn.close()
+    assert saved == pytest.approx(10 / 13)
+
+
+def test_batch_check_rejects_doc_ids_string(app_client):
+    admin = server.app.test_client()
+    admin.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    response = admin.post('/api/check/batch', json={'doc_ids': '123'})
+    assert response.status_code == 400
@@ -1,5 +1,11 @@
 import pytest
-from core.transforms import normalize, tokenize, ngrams, jaccard
+from core.transforms import normalize, tokenize, ngrams, jaccard, hash_token, hash_ngram, ngram_hashes, jaccard_hashes
+from core.transforms import minhash_signature, minhash_similarity, lsh_bands
+from core.transforms import rolling_ngram_hashes, winnow, match_regions
+from core.transforms import ngram_hash_array, intersection_size, GALLOP_RATIO
+from core.transforms import iter_tokens, stream_ngram_hashes, text_hash_array
+from core.transforms import jaccard_from_counts, jaccard_upper_bound
+from core.compose import text_processing_pipeline
 
 # 1. Тест normalize
 def test_normalize():
@@ -44,3 +50,111 @@ def test_pipeline():
     assert norm == "hello world this is a test"
     assert tokens == ("hello", "world", "this", "is", "a", "test")
     assert grams == (("hello","world"), ("world","this"), ("this","is"), ("is","a"), ("a","test"))
+
+# 6. Тест хэшей n-грамм
+def test_ngram_hashes_and_jaccard_hashes():
+    a = ngram_hashes(("a", "b", "c", "d"), 2)
+    b = ngram_hashes(("b", "c", "d", "e"), 2)
+    assert a == frozenset(hash_ngram(g) for g in ngrams(("a", "b", "c", "d"), 2))
+    assert hash_token("a") == hash_token("a")
+    assert jaccard_hashes(a, b) == jaccard(ngrams(("a", "b", "c", "d"), 2), ngrams(("b", "c", "d", "e"), 2))
+    assert jaccard_hashes(frozenset(), frozenset()) == 1.0
+    assert jaccard_hashes(a, frozenset()) == 0.0
+    assert ngram_hashes(("a",), 2) == frozenset()
+
+# 7. Тест MinHash и LSH
+def test_minhash_estimates_jaccard():
+    a = frozenset(range(0, 400))
+    b = frozenset(range(100, 500))
+    sig_a = minhash_signature(a, 256)
+    sig_b = minhash_signature(b, 256)
+    assert len(sig_a) == 256
+    assert minhash_signature(a, 256) == sig_a  # детерминированность
+    assert minhash_similarity(sig_a, sig_a) == 1.0
+    assert abs(minhash_similarity(sig_a, sig_b) - jaccard_hashes(a, b)) < 0.1
+
+def test_lsh_bands():
+    sig = minhash_signature(frozenset(range(50)), 16)
+    bands = lsh_bands(sig, 4, 4)
+    assert len(bands) == 4
+    assert bands == lsh_bands(tuple(sig), 4, 4)
+    with pytest.raises(ValueError):
+        lsh_bands(sig, 5, 4)
+
+# 8. Тест winnowing
+def test_rolling_ngram_hashes_match_hash_ngram():
+    tokens = tuple("one two three four five six".split())
+    assert rolling_ngram_hashes(tokens, 3) == tuple(hash_ngram(g) for g in ngrams(tokens, 3))
+    assert rolling_ngram_hashes(tokens[:2], 3) == ()
+
+def test_winnow_selects_window_minimums():
+    hashes = (77, 74, 42, 17, 98, 50, 17, 98, 8, 88, 67, 39, 77, 74, 42, 17, 98)
+    selected = winnow(hashes, 4)
+    assert selected == ((17, 3), (17, 6), (8, 8), (39, 11), (17, 15))
+    # в каждом окне есть выбранная позиция
+    positions = {pos for _, pos in selected}
+    assert all(any(p in positions for p in range(i, i + 4)) for i in range(len(hashes) - 3))
+    assert winnow((5, 3, 3), 4) == ((3, 2),)
+    assert winnow((), 4) == ()
+
+def test_match_regions_merges_diagonals():
+    regions = match_regions(((0, 10), (2, 12), (5, 15), (20, 3)), 3, 4)
+    assert regions == ((0, 8, 10, 18), (20, 23, 3, 6))
+
+def test_ngram_hash_array_is_sorted_and_unique():
+    tokens = ("a", "b", "a", "b", "a", "c")
+    packed = ngram_hash_array(tokens, 2)
+    assert packed.typecode == "Q"
+    assert list(packed) == sorted(ngram_hashes(tokens, 2))
+    assert len(ngram_hash_array(("a",), 2)) == 0
+
+def test_intersection_size_mixed_forms():
+    a = ngram_hash_array(tuple("abcdefgh"), 2)
+    b = ngram_hash_array(tuple("defghijk"), 2)
+    expected = len(frozenset(a) & frozenset(b))
+    assert intersection_size(a, b) == expected
+    assert intersection_size(frozenset(a), b) == expected
+    assert intersection_size(a, frozenset(b)) == expected
+    assert jaccard_hashes(a, b) == jaccard_hashes(frozenset(a), frozenset(b))
+
+def test_intersection_size_gallops_on_skewed_sizes():
+    tokens = tuple(str(i) for i in range(GALLOP_RATIO * 4))
+    big = ngram_hash_array(tokens, 1)
+    small = ngram_hash_array(("3", "17", "missing"), 1)
+    assert intersection_size(small, big) == 2
+    assert intersection_size(big, small) == 2
+
+STREAM_TEXTS = (
+    "Hello, world! Hello world again.",
+    "ΟΔΟΣ,ΟΔΟΣ ΑΣ.Β  İstanbul\t\u2003tab\nnew-line ... , !",
+    "one two",
+    "",
+)
+
+def test_stream_matches_pipeline():
+    for text in STREAM_TEXTS:
+        for n in (1, 2, 3):
+            _, tokens, grams = text_processing_pipeline(text, n)
+            for chunk_size in (1, 5, 4096):
+                assert tuple(iter_tokens(text, chunk_size)) == tokens
+            assert set(stream_ngram_hashes(text, n)) == {hash_ngram(g) for g in grams}
+            token_count, packed, ngram_count = text_hash_array(text, n)
+            assert (token_count, ngram_count) == (len(tokens), len(grams))
+            assert list(packed) == sorted({hash_ngram(g) for g in grams})
+
+def test_stream_memory_does_not_grow_with_text():
+    import tracemalloc
+    text = "Съешь же ещё этих мягких французских булок, да выпей чаю. " * 2000
+    tracemalloc.start()
+    count = sum(1 for _ in stream_ngram_hashes(text, 3))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count == len(normalize(text).split()) - 2
+    assert peak < len(text)
+
+def test_jaccard_upper_bound_holds_and_is_tight():
+    assert jaccard_upper_bound(0, 0) == jaccard_from_counts(0, 0, 0)
+    assert jaccard_upper_bound(0, 5) == 0.0
+    assert jaccard_upper_bound(3, 12) == jaccard_from_counts(3, 3, 12)
+    for inter in range(4):
+        assert jaccard_from_counts(inter, 3, 12) <= jaccard_upper_bound(12, 3)
@@ -0,0 +1,74 @@
+from core.index import (
+    fingerprint_text, index_document, ensure_fingerprints,
+    load_fingerprints, ensure_winnow, winnow_ids, winnow_text_tokens
+)
+from core.vocab import (
+    intern_tokens, encode_text, load_document_tokens, load_token_hashes,
+    pack_token_ids, unpack_token_ids, vocabulary_stats
+)
+from core.transforms import normalize, tokenize, id_hash_array, text_hash_array
+from tests.conftest import add_doc
+
+
+# --------------------------
+# Словарь
+# --------------------------
+def test_intern_tokens_is_stable_and_incremental(conn):
+    first = intern_tokens(conn, ['b', 'a', 'b'])
+    assert set(first) == {'a', 'b'}
+    second = intern_tokens(conn, ['c', 'a'])
+    assert second['a'] == first['a']
+    assert second['c'] not in first.values()
+    assert vocabulary_stats(conn)['tokens'] == 3
+
+def test_pack_unpack_token_ids_roundtrip(conn):
+    token_ids, _ = encode_text(conn, "one two one three")
+    assert len(pack_token_ids(token_ids)) == 4 * 4
+    assert unpack_token_ids(pack_token_ids(token_ids)) == token_ids
+    assert token_ids[0] == token_ids[2]
+
+def test_id_hashes_match_text_hashes(conn):
+    text = "Съешь же ещё этих мягких булок, да выпей же чаю. Съешь же ещё!"
+    token_ids, token_hashes = encode_text(conn, text)
+    for n in range(1, 11):
+        assert id_hash_array(token_ids, token_hashes, n) == text_hash_array(text, n)
+    assert id_hash_array(token_ids, load_token_hashes(conn), 3) == text_hash_array(text, 3)
+
+# --------------------------
+# Индекс по id
+# --------------------------
+def test_index_document_stores_token_ids(conn):
+    add_doc(conn, 1, "a b c d")
+    index_document(conn, 1, "a b c d", sizes=(2,))
+    tokens = load_document_tokens(conn)
+    assert set(tokens) == {"1"}
+    assert len(tokens["1"]) == 4
+
+def test_new_ngram_size_is_built_from_token_ids(conn):
+    text = "the quick brown fox jumps over the lazy dog"
+    add_doc(conn, 1, text)
+    index_document(conn, 1, text, sizes=(3,))
+    # Текст больше не читается: отпечаток строится по сохранённым id
+    conn.execute("UPDATE documents SET text = '' WHERE id = 1")
+
+    assert ensure_fingerprints(conn, 5) == 1
+    fp = load_fingerprints(conn, 5)["1"]
+    expected = fingerprint_text("1", text, 5)
+    assert fp.token_count == expected.token_count
+    assert list(fp.hashes) == list(expected.hashes)
+
+def test_documents_without_tokens_are_backfilled(conn):
+    add_doc(conn, 1, "alpha beta gamma delta")
+    assert ensure_fingerprints(conn, 2) == 1
+    assert set(load_document_tokens(conn)) == {"1"}
+    assert len(load_fingerprints(conn, 2)["1"].hashes) == 3
+
+def test_winnow_from_token_ids(conn):
+    text = "a b c d e f g h a b c d"
+    add_doc(conn, 1, text)
+    index_document(conn, 1, text)
+    assert ensure_winnow(conn, 3, 2) == 1
+
+    token_ids, token_hashes = encode_text(conn, text)
+    tokens = tokenize(normalize(text))
+    assert winnow_ids(token_ids, token_hashes, 3, 2) == winnow_text_tokens(tokens, 3, 2)